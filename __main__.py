@@ -35,7 +35,7 @@ def main():
     run_parser.add_argument("--local_llm", help="Modelo LLM principal")
     run_parser.add_argument("--local_llm2", help="Modelo LLM secundario (opcional)")
     run_parser.add_argument("--question", help="Pregunta a responder")
-    run_parser.add_argument("--vector_db_type", default="milvus", choices=["chroma", "milvus"],
+    run_parser.add_argument("--vector_db_type", default="milvus", choices=["chroma", "milvus", "local"],
                            help="Tipo de vectorstore a utilizar (default: milvus)")
     
     # Comando para ejecutar la evaluación
@@ -48,11 +48,27 @@ def main():
     eval_parser.add_argument("--salida", help="Ruta para guardar los resultados")
     eval_parser.add_argument("--verbose", action="store_true", help="Mostrar información detallada")
     eval_parser.add_argument("--casos", help="Archivo JSON con casos de prueba personalizados")
-    eval_parser.add_argument("--vector_db_type", default="milvus", choices=["chroma", "milvus"],
+    eval_parser.add_argument("--vector_db_type", default="milvus", choices=["chroma", "milvus", "local"],
                            help="Tipo de vectorstore a utilizar (default: milvus)")
     eval_parser.add_argument("--batch", action="store_true", help="Ejecutar en modo batch para solo generar respuestas.")
     eval_parser.add_argument("--output_dir", default="batch_results", help="Directorio para guardar los resultados en modo batch.")
     
+    # Comando para cargar los documentos en la vectorstore sin arrancar el agente
+    ingest_parser = subparsers.add_parser("ingest", help="Cargar los documentos en las colecciones")
+    ingest_parser.add_argument("--data_dir", help="Directorio con documentos markdown")
+    ingest_parser.add_argument("--consultas_dir", help="Directorio con consultas guardadas (opcional)")
+    ingest_parser.add_argument("--local_llm", help="Modelo LLM para la generación de contexto")
+    ingest_parser.add_argument("--vector_db_type", choices=["chroma", "milvus", "local"],
+                              help="Tipo de vectorstore a utilizar (default: VECTORSTORE_CONFIG)")
+    ingest_parser.add_argument("--force", action="store_true",
+                              help="Ejecutar la carga aunque no haya cambios desde la última ingesta")
+    
+    # Comando para analizar el tiempo de arranque
+    report_parser = subparsers.add_parser("import-report", help="Mostrar el tiempo de importación por paquete")
+    report_parser.add_argument("--module", nargs="+", default=["langagent.core.lang_chain_agent"],
+                              help="Módulos a importar (default: langagent.core.lang_chain_agent)")
+    report_parser.add_argument("--top", type=int, default=15, help="Número de paquetes y módulos a mostrar")
+    
     # Analizar argumentos
     args = parser.parse_args()
     
@@ -182,6 +198,24 @@ def main():
                 logger.error("Asegúrate de que estás ejecutando el script desde el directorio correcto.")
                 sys.exit(1)
         
+    elif args.command == "ingest":
+        from langagent.core.ingestion import run_ingestion
+        success = run_ingestion(
+            data_dir=args.data_dir,
+            vector_db_type=args.vector_db_type,
+            consultas_dir=args.consultas_dir,
+            force=args.force,
+            local_llm=args.local_llm
+        )
+        if not success:
+            logger.error("La ingesta no se completó correctamente")
+            sys.exit(1)
+        
+    elif args.command == "import-report":
+        from langagent.utils.import_report import measure_import_times, print_import_report
+        for module_name in args.module:
+            print_import_report(measure_import_times(module_name, top=args.top))
+        
     else:
         parser.print_help()
 
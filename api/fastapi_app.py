@@ -5,7 +5,11 @@ Este módulo implementa la API REST utilizando FastAPI para exponer
 las funcionalidades del agente de respuesta a preguntas.
 """
 
+import json
+import re
+
 from fastapi import FastAPI, Depends, HTTPException, status, Request
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer
 from pydantic import BaseModel
 from typing import Dict, Any
@@ -25,6 +29,89 @@ class TokenRequest(BaseModel):
 # Configuración de seguridad
 security = HTTPBearer()
 
+def format_agent_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convierte el resultado del agente en la respuesta de la API.
+    
+    Args:
+        result (Dict[str, Any]): Resultado devuelto por el agente.
+        
+    Returns:
+        dict: Respuesta con formato SQL o texto.
+    """
+    # Verificar si la consulta fue de tipo SQL
+    is_sql_query = result.get("is_consulta", False)
+    sql_query = result.get("sql_query")
+    sql_result = result.get("sql_result")
+    
+    # Si es una consulta SQL con resultados, devolver formato SQL
+    if is_sql_query and sql_query and sql_result:
+        return {
+            "type": "sql",
+            "query": sql_query,
+            "result": sql_result
+        }
+    
+    # Extraer la respuesta de la generación para consultas no SQL
+    answer = None
+    
+    # Intentar extraer la respuesta del campo generation
+    if "generation" in result:
+        generation = result["generation"]
+        
+        # Si generation es un diccionario con el campo answer
+        if isinstance(generation, dict) and "answer" in generation:
+            answer = generation["answer"]
+        # Si generation es un string en formato JSON con el campo answer
+        elif isinstance(generation, str) and '"answer":' in generation:
+            try:
+                # Intenta encontrar el JSON que contiene el campo answer
+                json_match = re.search(r'\{.*"answer":\s*"([^"]*)".*\}', generation)
+                if json_match:
+                    answer = json_match.group(1)
+                else:
+                    # Intenta parsear como JSON completo
+                    try:
+                        if generation.strip().startswith('{') and generation.strip().endswith('}'):
+                            json_data = json.loads(generation)
+                            if "answer" in json_data:
+                                answer = json_data["answer"]
+                    except:
+                        pass
+            except:
+                # Si hay algún error en el parsing, usar la generación completa
+                answer = generation
+        else:
+            # Si generation no tiene un formato reconocible, usarlo directamente
+            answer = generation
+    
+    # Si no se pudo extraer la respuesta del campo generation, intentar con response
+    if answer is None and "response" in result:
+        answer = result["response"]
+        
+    # Si tampoco se encontró en response, devolver un mensaje por defecto
+    if answer is None:
+        answer = "No se pudo generar una respuesta."
+    
+    # Devolver respuesta con formato para texto normal
+    return {
+        "type": "text",
+        "answer": answer
+    }
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """
+    Serializa un evento del agente en formato Server-Sent Events.
+    
+    Args:
+        event (Dict[str, Any]): Evento con campo "type".
+        
+    Returns:
+        str: Evento SSE listo para enviar.
+    """
+    data = {key: value for key, value in event.items() if key != "type"}
+    return f"event: {event['type']}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
 def create_api(agent=None):
     """
     Crea una aplicación FastAPI con las rutas necesarias.
@@ -69,71 +156,10 @@ def create_api(agent=None):
             dict: Respuesta generada, que puede incluir resultados SQL.
         """
         try:
-            # Ejecutar el agente con la pregunta
-            result = agent.run(request.question)
-            
-            # Verificar si la consulta fue de tipo SQL
-            is_sql_query = result.get("is_consulta", False)
-            sql_query = result.get("sql_query")
-            sql_result = result.get("sql_result")
+            # Ejecutar el agente con la pregunta sin bloquear el bucle de eventos
+            result = await agent.arun(request.question)
             
-            # Si es una consulta SQL con resultados, devolver formato SQL
-            if is_sql_query and sql_query and sql_result:
-                return {
-                    "type": "sql",
-                    "query": sql_query,
-                    "result": sql_result
-                }
-            
-            # Extraer la respuesta de la generación para consultas no SQL
-            answer = None
-            
-            # Intentar extraer la respuesta del campo generation
-            if "generation" in result:
-                generation = result["generation"]
-                
-                # Si generation es un diccionario con el campo answer
-                if isinstance(generation, dict) and "answer" in generation:
-                    answer = generation["answer"]
-                # Si generation es un string en formato JSON con el campo answer
-                elif isinstance(generation, str) and '"answer":' in generation:
-                    try:
-                        import json
-                        import re
-                        
-                        # Intenta encontrar el JSON que contiene el campo answer
-                        json_match = re.search(r'\{.*"answer":\s*"([^"]*)".*\}', generation)
-                        if json_match:
-                            answer = json_match.group(1)
-                        else:
-                            # Intenta parsear como JSON completo
-                            try:
-                                if generation.strip().startswith('{') and generation.strip().endswith('}'):
-                                    json_data = json.loads(generation)
-                                    if "answer" in json_data:
-                                        answer = json_data["answer"]
-                            except:
-                                pass
-                    except:
-                        # Si hay algún error en el parsing, usar la generación completa
-                        answer = generation
-                else:
-                    # Si generation no tiene un formato reconocible, usarlo directamente
-                    answer = generation
-            
-            # Si no se pudo extraer la respuesta del campo generation, intentar con response
-            if answer is None and "response" in result:
-                answer = result["response"]
-                
-            # Si tampoco se encontró en response, devolver un mensaje por defecto
-            if answer is None:
-                answer = "No se pudo generar una respuesta."
-            
-            # Devolver respuesta con formato para texto normal
-            return {
-                "type": "text",
-                "answer": answer
-            }
+            return format_agent_result(result)
             
         except Exception as e:
             raise HTTPException(
@@ -141,4 +167,47 @@ def create_api(agent=None):
                 detail=f"Error al generar respuesta: {str(e)}"
             )
     
+    @app.post("/generate/stream")
+    async def generate_stream(request: QuestionRequest, payload: Dict = Depends(verify_token)):
+        """
+        Genera una respuesta emitiendo el progreso del workflow como Server-Sent Events.
+        
+        Emite eventos "ambito", "progress", "generation_start" y "token" mientras
+        se ejecuta el agente, y un evento final "result" con el mismo formato que /generate.
+        
+        Args:
+            request (QuestionRequest): Solicitud con la pregunta.
+            payload (Dict): Payload del token verificado.
+            
+        Returns:
+            StreamingResponse: Flujo de eventos text/event-stream.
+        """
+        async def event_stream():
+            try:
+                async for event in agent.astream(request.question):
+                    if event["type"] == "result":
+                        event = {"type": "result", **format_agent_result(event["result"])}
+                    yield format_sse(event)
+            except Exception as e:
+                yield format_sse({"type": "error", "detail": f"Error al generar respuesta: {str(e)}"})
+        
+        return StreamingResponse(
+            event_stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    
+    @app.get("/cache/stats")
+    async def cache_stats(payload: Dict = Depends(verify_token)):
+        """
+        Devuelve los contadores de aciertos y fallos de las cachés del agente.
+        
+        Args:
+            payload (Dict): Payload del token verificado.
+            
+        Returns:
+            dict: Estadísticas por caché.
+        """
+        return agent.get_cache_stats()
+    
     return app
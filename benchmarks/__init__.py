@@ -0,0 +1,3 @@
+"""
+Scripts de medición de rendimiento de los componentes del agente.
+"""
@@ -0,0 +1,96 @@
+"""
+Rendimiento del modelo de embeddings con cada backend.
+
+Vectoriza los chunks del corpus (documentos por segundo) y mide la latencia
+de consultas individuales (p50/p95) con los backends indicados, sin cachés.
+Los tiempos no incluyen la carga del modelo ni el calentamiento.
+
+Los modelos se cargan directamente con el backend pedido, sin la vuelta a
+"torch" de create_embeddings: un backend que no se puede cargar (o torch_int8
+fuera de la CPU) se omite en lugar de medir el modelo torch con su nombre.
+
+Uso:
+    python -m langagent.benchmarks.embedding_benchmark --backends torch torch_int8 onnx --threads 8
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Asegurarnos que podemos importar desde el directorio raíz
+current_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if current_dir not in sys.path:
+    sys.path.insert(0, current_dir)
+
+from langagent.benchmarks.vectorstore_benchmark import load_questions, percentile
+from langagent.vectorstore.document_uploader import DocumentUploader
+from langagent.vectorstore.embeddings import _load_model, warmup_embeddings
+from langagent.vectorstore.reranker import resolve_device
+from langagent.vectorstore.local import LocalVectorStore
+from langagent.utils.document_loader import load_documents_from_directory
+from langagent.config.config import VECTORSTORE_CONFIG
+from langagent.config.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rendimiento del modelo de embeddings por backend")
+    parser.add_argument("--backends", nargs="+", default=["torch", "torch_int8", "onnx"],
+                        help="Backends a comparar")
+    parser.add_argument("--device", default=None, help="Dispositivo (por defecto, embedding_device)")
+    parser.add_argument("--threads", type=int, default=None, help="Hilos de cálculo (por defecto, embedding_num_threads)")
+    parser.add_argument("--data-dir", default="./output_md", help="Directorio con los documentos markdown")
+    parser.add_argument("--questions", default="./preguntas_eval.json", help="Fichero JSON de preguntas")
+    parser.add_argument("--max-chunks", type=int, default=500, help="Chunks a vectorizar (0 = todos)")
+    parser.add_argument("--limit", type=int, default=50, help="Número máximo de preguntas (0 = todas)")
+    parser.add_argument("--chunk-size", type=int, default=646, help="Tamaño de chunk")
+    args = parser.parse_args()
+
+    if args.threads is not None:
+        VECTORSTORE_CONFIG["embedding_num_threads"] = args.threads
+
+    documents = load_documents_from_directory(args.data_dir)
+    if not documents:
+        logger.error(f"No se encontraron documentos en {args.data_dir}")
+        return
+    # El splitter no depende del backend de vectorstore ni del modelo
+    uploader = DocumentUploader(LocalVectorStore(), None)
+    texts = [chunk.page_content for chunk in uploader.split_documents(uploader.create_text_splitter(args.chunk_size), documents)]
+    if args.max_chunks:
+        texts = texts[:args.max_chunks]
+    questions = load_questions(args.questions, args.limit)
+
+    model_name = VECTORSTORE_CONFIG.get("embedding_model", "intfloat/multilingual-e5-large-instruct")
+    device = resolve_device(args.device or VECTORSTORE_CONFIG.get("embedding_device", "auto"))
+
+    print(f"{'Backend':<12} {'Docs/s':>8} {'p50 (ms)':>10} {'p95 (ms)':>10}")
+    for backend in args.backends:
+        if backend == "torch_int8" and device != "cpu":
+            logger.error(f"[{backend}] La cuantización int8 solo está disponible en CPU (dispositivo: {device}); se omite")
+            continue
+        try:
+            embeddings = _load_model(model_name, device, backend, VECTORSTORE_CONFIG.get("embedding_num_threads", 0),
+                                     VECTORSTORE_CONFIG.get("embedding_batch_size", 32))
+        except Exception as e:
+            logger.error(f"[{backend}] No se pudo cargar el modelo: {e}; se omite")
+            continue
+        warmup_embeddings(embeddings)
+
+        start_time = time.perf_counter()
+        embeddings.embed_documents(texts)
+        docs_per_second = len(texts) / (time.perf_counter() - start_time)
+
+        latencies = []
+        for question in questions:
+            start_time = time.perf_counter()
+            embeddings.embed_query(question)
+            latencies.append((time.perf_counter() - start_time) * 1000)
+
+        print(f"{backend:<12} {docs_per_second:>8.1f} {percentile(latencies, 0.5):>10.1f} "
+              f"{percentile(latencies, 0.95):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Latencia de búsqueda en Milvus con y sin particionamiento por ámbito.
+
+Para cada tamaño de colección crea dos colecciones con el mismo contenido,
+una con el ámbito como partition key y otra sin particionar, y lanza las
+preguntas de evaluación filtrando por ámbito. En la colección particionada el
+filtro se resuelve eligiendo la partición (pruning); en la otra, filtrando
+todos los candidatos. Las colecciones se hacen crecer repitiendo los chunks
+del corpus (los embeddings repetidos salen de la caché de embeddings).
+
+Las preguntas se vectorizan una sola vez antes de medir y las búsquedas se
+lanzan por vector, de modo que ambas colecciones miden solo la búsqueda en
+Milvus (sin el modelo de embeddings ni la caché de consultas).
+
+El particionamiento se fija al crear la colección: las colecciones existentes
+creadas sin partition key deben recrearse para que el filtro por ámbito
+seleccione la partición.
+
+Uso:
+    python -m langagent.benchmarks.partition_benchmark --sizes 2000 10000 50000
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import Dict, List
+
+# Asegurarnos que podemos importar desde el directorio raíz
+current_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if current_dir not in sys.path:
+    sys.path.insert(0, current_dir)
+
+from langchain_core.documents import Document
+from langagent.benchmarks.vectorstore_benchmark import load_questions, percentile
+from langagent.models.constants import AMBITOS_CUBOS
+from langagent.vectorstore.document_uploader import DocumentUploader
+from langagent.vectorstore.embeddings import create_embeddings
+from langagent.vectorstore.milvus import MilvusVectorStore
+from langagent.utils.document_loader import load_documents_from_directory
+from langagent.config.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def grow_chunks(chunks: List[Document], size: int) -> List[Document]:
+    """
+    Repite los chunks del corpus hasta alcanzar el tamaño pedido.
+
+    Args:
+        chunks: Chunks originales
+        size: Número de chunks de la colección
+
+    Returns:
+        List[Document]: Copias de los chunks (con el número de copia en los metadatos)
+    """
+    grown = []
+    for idx in range(size):
+        chunk = chunks[idx % len(chunks)]
+        grown.append(Document(page_content=chunk.page_content,
+                              metadata={**chunk.metadata, "copy": idx // len(chunks)}))
+    return grown
+
+
+def measure(vectorstore, query_vectors: List[List[float]], ambitos: List[str], k: int) -> Dict[str, float]:
+    """
+    Lanza las preguntas (ya vectorizadas) filtrando por ámbito y mide su latencia.
+
+    Args:
+        vectorstore: Colección Milvus
+        query_vectors: Embeddings de las preguntas
+        ambitos: Ámbitos con los que se filtran las preguntas (por turnos)
+        k: Documentos recuperados por pregunta
+
+    Returns:
+        Dict[str, float]: Latencias p50 y p95 en milisegundos
+    """
+    # Calentamiento: la primera búsqueda carga la colección en memoria
+    vectorstore.similarity_search_with_score_by_vector(query_vectors[0], k=k, filter={"ambito": ambitos[0]})
+
+    latencies = []
+    for idx, vector in enumerate(query_vectors):
+        start_time = time.perf_counter()
+        vectorstore.similarity_search_with_score_by_vector(vector, k=k, filter={"ambito": ambitos[idx % len(ambitos)]})
+        latencies.append((time.perf_counter() - start_time) * 1000)
+    return {"p50_ms": percentile(latencies, 0.5), "p95_ms": percentile(latencies, 0.95)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia de Milvus con y sin particionamiento por ámbito")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[2000, 10000, 50000],
+                        help="Tamaños de colección (chunks) a medir")
+    parser.add_argument("--data-dir", default="./output_md", help="Directorio con los documentos markdown")
+    parser.add_argument("--questions", default="./preguntas_eval.json", help="Fichero JSON de preguntas")
+    parser.add_argument("--limit", type=int, default=50, help="Número máximo de preguntas (0 = todas)")
+    parser.add_argument("--chunk-size", type=int, default=646, help="Tamaño de chunk")
+    parser.add_argument("--k", type=int, default=12, help="Documentos recuperados por pregunta")
+    parser.add_argument("--keep", action="store_true", help="No eliminar las colecciones de prueba al terminar")
+    args = parser.parse_args()
+
+    embeddings = create_embeddings()
+    handler = MilvusVectorStore()
+    uploader = DocumentUploader(handler, embeddings)
+
+    documents = load_documents_from_directory(args.data_dir)
+    if not documents:
+        logger.error(f"No se encontraron documentos en {args.data_dir}")
+        return
+    chunks = handler.ensure_filter_metadata(
+        uploader.split_documents(uploader.create_text_splitter(args.chunk_size), documents))
+    questions = load_questions(args.questions, args.limit)
+    query_vectors = [embeddings.embed_query(question) for question in questions]
+    ambitos = [ambito for ambito in AMBITOS_CUBOS if any(c.metadata.get("ambito") == ambito for c in chunks)]
+
+    print(f"{'Chunks':>8} {'Modo':<14} {'p50 (ms)':>10} {'p95 (ms)':>10}")
+    for size in args.sizes:
+        collection_chunks = grow_chunks(chunks, size)
+        for partitioned in (False, True):
+            mode = "particionada" if partitioned else "sin particiones"
+            collection_name = f"benchmark_partition_{size}_{'pk' if partitioned else 'flat'}"
+            vectorstore = handler.create_vectorstore(
+                collection_chunks, embeddings, collection_name, drop_old=True, use_partitioning=partitioned)
+            if vectorstore is None:
+                logger.error(f"No se pudo crear la colección {collection_name}")
+                continue
+            result = measure(vectorstore, query_vectors, ambitos, args.k)
+            print(f"{size:>8} {mode:<14} {result['p50_ms']:>10.1f} {result['p95_ms']:>10.1f}")
+            if not args.keep:
+                vectorstore.col.drop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Comparativa de rendimiento entre vectorstores (local y Milvus).
+
+Indexa el mismo corpus en cada backend con el splitter de las colecciones,
+lanza las preguntas de evaluación y muestra el tiempo de indexación, la
+latencia de consulta (p50/p95) y el solapamiento del top-k de cada backend
+con el del primero de la lista.
+
+Uso:
+    python -m langagent.benchmarks.vectorstore_benchmark --backends local milvus --chunk-size 646
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List
+
+# Asegurarnos que podemos importar desde el directorio raíz
+current_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if current_dir not in sys.path:
+    sys.path.insert(0, current_dir)
+
+from langagent.vectorstore.base import VectorStoreFactory
+from langagent.vectorstore.document_uploader import DocumentUploader
+from langagent.vectorstore.embeddings import create_embeddings
+from langagent.utils.document_loader import load_documents_from_directory
+from langagent.config.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """
+    Calcula un percentil por el método del rango más cercano.
+
+    Args:
+        values: Valores medidos
+        fraction: Percentil en [0, 1]
+
+    Returns:
+        float: Valor del percentil (0 si no hay valores)
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def load_questions(path: str, limit: int) -> List[str]:
+    """
+    Carga las preguntas del fichero de evaluación.
+
+    Args:
+        path: Ruta del JSON de preguntas (lista de objetos con la clave "pregunta")
+        limit: Número máximo de preguntas (0 = todas)
+
+    Returns:
+        List[str]: Preguntas
+    """
+    with open(path, "r", encoding="utf-8") as questions_file:
+        questions = [item["pregunta"] for item in json.load(questions_file) if item.get("pregunta")]
+    return questions[:limit] if limit else questions
+
+
+def run_backend(backend: str, chunks, embeddings, collection_name: str,
+                questions: List[str], k: int) -> Dict[str, object]:
+    """
+    Indexa los chunks en un backend y mide la latencia de las consultas.
+
+    Args:
+        backend: Tipo de vectorstore ("local", "milvus" o "chroma")
+        chunks: Chunks a indexar
+        embeddings: Modelo de embeddings
+        collection_name: Colección de la prueba (se recrea)
+        questions: Preguntas a lanzar
+        k: Documentos recuperados por pregunta
+
+    Returns:
+        Dict[str, object]: Tiempo de indexación, latencias y resultados por pregunta
+    """
+    handler = VectorStoreFactory.get_vectorstore_instance(backend)
+
+    start_time = time.perf_counter()
+    vectorstore = handler.create_vectorstore(list(chunks), embeddings, collection_name, drop_old=True)
+    index_seconds = time.perf_counter() - start_time
+    if vectorstore is None:
+        raise RuntimeError(f"No se pudo crear la colección de prueba en {backend}")
+
+    latencies = []
+    results = []
+    for question in questions:
+        start_time = time.perf_counter()
+        docs = vectorstore.similarity_search_with_score(question, k=k)
+        latencies.append((time.perf_counter() - start_time) * 1000)
+        results.append([(doc.metadata.get("chunk_hash") or doc.page_content) for doc, _ in docs])
+
+    return {
+        "backend": backend,
+        "index_seconds": index_seconds,
+        "p50_ms": percentile(latencies, 0.5),
+        "p95_ms": percentile(latencies, 0.95),
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Comparativa de rendimiento entre vectorstores")
+    parser.add_argument("--backends", nargs="+", default=["local", "milvus"],
+                        help="Backends a comparar; el primero es la referencia del solapamiento")
+    parser.add_argument("--data-dir", default="./output_md", help="Directorio con los documentos markdown")
+    parser.add_argument("--questions", default="./preguntas_eval.json", help="Fichero JSON de preguntas")
+    parser.add_argument("--limit", type=int, default=0, help="Número máximo de preguntas (0 = todas)")
+    parser.add_argument("--chunk-size", type=int, default=646, help="Tamaño de chunk de la colección de prueba")
+    parser.add_argument("--k", type=int, default=12, help="Documentos recuperados por pregunta")
+    args = parser.parse_args()
+
+    embeddings = create_embeddings()
+    documents = load_documents_from_directory(args.data_dir)
+    if not documents:
+        logger.error(f"No se encontraron documentos en {args.data_dir}")
+        return
+
+    reports = []
+    for backend in args.backends:
+        uploader = DocumentUploader(VectorStoreFactory.get_vectorstore_instance(backend), embeddings)
+        chunks = uploader.split_documents(uploader.create_text_splitter(args.chunk_size), documents)
+        questions = load_questions(args.questions, args.limit)
+        logger.info(f"[{backend}] Indexando {len(chunks)} chunks y lanzando {len(questions)} preguntas")
+        try:
+            reports.append(run_backend(backend, chunks, embeddings, f"benchmark_{args.chunk_size}",
+                                       questions, args.k))
+        except Exception as e:
+            logger.error(f"[{backend}] Error en la prueba: {e}")
+
+    if not reports:
+        return
+
+    reference = reports[0]["results"]
+    print(f"{'Backend':<10} {'Indexación (s)':>15} {'p50 (ms)':>10} {'p95 (ms)':>10} {'Solapamiento':>13}")
+    for report in reports:
+        overlaps = [len(set(ref) & set(res)) / len(ref) for ref, res in zip(reference, report["results"]) if ref]
+        overlap = sum(overlaps) / len(overlaps) if overlaps else 0.0
+        print(f"{report['backend']:<10} {report['index_seconds']:>15.2f} {report['p50_ms']:>10.1f} "
+              f"{report['p95_ms']:>10.1f} {overlap:>13.2%}")
+
+
+if __name__ == "__main__":
+    main()
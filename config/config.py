@@ -19,7 +19,10 @@ LLM_CONFIG = {
     "model_format": "json",    # Formato de salida (json, text, etc.)
     "default_model": "mistral-small-3.1:24b",  # Modelo predeterminado para el LLM principal
     "default_model2": "qwen2.5:1.5b", # Modelo predeterminado para el LLM secundario (routing)
-    "default_model3": "llama3.2:3bm" # Modelo predeterminado para el LLM tercero (eavluation)
+    "default_model3": "llama3.2:3bm", # Modelo predeterminado para el LLM tercero (eavluation)
+    "streaming": False,         # Streaming de tokens para los modelos secundarios
+    "stream_main_model": True,  # Streaming de tokens del modelo principal (endpoint /generate/stream)
+    "tokenizer_model": None,    # Tokenizador HF (identificador o ruta local) del modelo principal para el conteo de tokens del contexto; None = estimar caracteres / 4. El repositorio de Mistral-Small-3.1 requiere token de HF
 }
 
 # Configuración de Vector Store
@@ -29,7 +32,7 @@ VECTORSTORE_CONFIG = {
     "k_retrieval": 12,          # Número de documentos a recuperar
     "similarity_threshold": 0.7,  # Umbral mínimo de similitud para considerar un documento relevante
     "max_docs_total": 15,       # Aumentar el límite total de documentos
-    "vector_db_type": "milvus", # Tipo de base de datos vectorial (chroma o milvus)
+    "vector_db_type": "milvus", # Tipo de base de datos vectorial (chroma, milvus o local)
     
     # Configuración para Milvus/Zilliz Cloud
     "milvus_uri": os.getenv("ZILLIZ_CLOUD_URI", "http://localhost:19537"),
@@ -37,8 +40,9 @@ VECTORSTORE_CONFIG = {
     "milvus_secure": os.getenv("ZILLIZ_CLOUD_SECURE", "True").lower() in ("true", "1", "t"),     # Usar conexión segura (para Zilliz Cloud)
     
     # Configuración de particionamiento para Milvus
-    "use_partitioning": False,  # Desactivar particiones, usar filtrado en su lugar
-    "partition_key_field": "ambito",  # Campo para particionamiento (si se activa)
+    "use_partitioning": True,  # Crear las colecciones con partition key: los filtros por ámbito solo buscan en su partición (las colecciones existentes sin partition key deben recrearse)
+    "partition_key_field": "ambito",  # Campo de la partition key
+    "partition_key_num_partitions": 16,  # Particiones físicas entre las que se reparten los ámbitos por hash
     
     # Configuración para enfoque de colección única
     "use_single_collection": True,  # Usar una sola colección para todos los documentos
@@ -48,14 +52,31 @@ VECTORSTORE_CONFIG = {
     
     # Configuración de búsqueda híbrida
     "use_hybrid_search": True,  # Activar búsqueda híbrida (vectorial + texto completo)
+    "hybrid_rrf_k": 60,                 # Constante de Reciprocal Rank Fusion (denso + BM25) en Chroma y local
+    "hybrid_candidates_multiplier": 3,  # Candidatos por ranking antes de la fusión (k * multiplicador)
     
     # Configuración de generación de contexto
     "use_context_generation": True,  # Activar generación de contexto para chunks
     "log_context_generation": True,  # Mostrar logs detallados de la generación de contexto
-    "context_batch_size": 10,        # Chunks por lote (reducido para mejor control)
+    "context_batch_size": 10,        # Chunks de un mismo documento por llamada al LLM (1 = una llamada por chunk)
     "context_max_workers": 2,        # Hilos concurrentes (reducido para evitar problemas)
     "skip_existing_context": True,   # Saltar chunks con contexto existente
     "persist_directory": "./vectordb",  # Directorio para persistir la vectorstore Chroma
+    "manifest_scan_batch_size": 1000,   # Registros por lote al recorrer la colección para construir el manifiesto
+    "incremental_chunk_updates": True,  # Al subir la versión de un cubo, actualizar solo los chunks cuyo hash ha cambiado
+    "adaptive_build_workers": 3,        # Colecciones adaptativas construidas en paralelo
+    "insert_batch_size": 50,            # Chunks por lote de inserción en Milvus
+    "pipeline_embeddings": True,        # Precalcular los embeddings del lote siguiente durante la inserción (requiere la caché de embeddings)
+    "fast_start": True,                 # Omitir la ingesta al construir el agente si los ficheros y la configuración coinciden con el manifiesto de la última ingesta
+    "ingestion_manifest_file": "ingestion_manifest.json",  # Manifiesto de la última ingesta (en PATHS_CONFIG["cache_dir"])
+    "context_generator_self_test": False,  # Llamada de prueba al generador de contexto al configurarlo
+
+    # Configuración de la vectorstore local (en proceso, vector_db_type = "local")
+    "local_persist_directory": "./vectordb/local",  # Directorio de las colecciones locales
+    "local_index_type": "exact",        # "exact" (NumPy) o "hnsw" (requiere hnswlib)
+    "local_hnsw_m": 16,                 # Conexiones por nodo del grafo HNSW
+    "local_hnsw_ef_construction": 200,  # Amplitud de búsqueda al construir el índice HNSW
+    "local_hnsw_ef_search": 64,         # Amplitud de búsqueda en consultas HNSW
       # Configuración de Recuperación Adaptativa - Múltiples Colecciones
     "adaptive_collections": {
         "369": "default_collection_369",   # Chunk size mediano
@@ -63,6 +84,18 @@ VECTORSTORE_CONFIG = {
         "1094": "default_collection_1094", # Chunk size muy grande
     },
     "use_adaptive_retrieval": True,  # Activar recuperación adaptativa
+    "speculative_adaptive_retrieval": False,  # Consultar todas las colecciones en el primer intento y reutilizar en reintentos
+    
+    # Prefiltrado por puntuación antes del evaluador de relevancia (puntuaciones normalizadas 0-1).
+    # Desactivado por defecto: las similitudes de e5 se concentran en valores altos y la
+    # normalización depende del backend (relevancia l2 en Chroma, coseno recortado en local y
+    # en los resultados híbridos de Milvus...), de modo que casi todos los chunks recuperados
+    # superan 0.85. Antes de activarlo hay que
+    # calibrar los umbrales para el backend y la métrica en uso con las puntuaciones de
+    # documentos que el evaluador considera relevantes e irrelevantes.
+    "score_prefilter_enabled": False,     # Aceptar/rechazar documentos por puntuación sin llamar al LLM
+    "score_auto_accept_threshold": 0.85,  # Puntuación a partir de la cual el documento se acepta directamente
+    "score_auto_reject_threshold": 0.3,   # Puntuación por debajo de la cual el documento se descarta directamente
     
     # Configuración de compresión contextual con BGE
     "use_contextual_compression": False,
@@ -70,6 +103,53 @@ VECTORSTORE_CONFIG = {
     "compression_top_k_multiplier": 3,  # Recuperar 36 docs si k=12, luego rerank a 12
     "bge_device": "auto",  # Detectar automáticamente CPU/GPU
     "bge_max_length": 755,
+    "reranker_backend": "torch",   # "torch", "torch_int8" (cuantización dinámica en CPU) u "onnx" (requiere optimum[onnxruntime])
+    "reranker_batch_size": 32,     # Pares (consulta, documento) por lote en el cross encoder
+    "reranker_onnx_file": None,    # Fichero ONNX concreto del modelo (p. ej. "onnx/model_qint8_avx512.onnx")
+    
+    # Configuración del modelo de embeddings
+    "embedding_model": "intfloat/multilingual-e5-large-instruct",
+    "embedding_device": "auto",     # "auto" (CUDA si está disponible), "cpu" o "cuda"
+    "embedding_backend": "torch",   # "torch", "torch_int8" (cuantización dinámica en CPU) u "onnx" (requiere optimum[onnxruntime])
+    "embedding_onnx_file": None,    # Fichero ONNX concreto del modelo (p. ej. "onnx/model_qint8_avx512.onnx")
+    "embedding_num_threads": 0,     # Hilos de cálculo en CPU (0 = valor por defecto de torch/onnxruntime)
+    "embedding_batch_size": 32,     # Textos por lote al vectorizar documentos
+    "embedding_warmup": True,       # Pasada de calentamiento del modelo al arrancar el agente
+}
+
+# Configuración de cachés
+CACHE_CONFIG = {
+    # Caché de recuperación (LRU + TTL delante de los retrievers)
+    "retrieval_cache_enabled": True,   # Cachear resultados de búsqueda por (pregunta, colección, k, filtros)
+    "retrieval_cache_max_size": 512,   # Número máximo de búsquedas cacheadas
+    "retrieval_cache_ttl": 3600,       # Tiempo de vida de cada entrada (segundos)
+    
+    # Caché semántica de respuestas (tras el grafo de ámbito, delante del workflow principal).
+    # Desactivada por defecto: el umbral no está calibrado y, como en el prefiltrado por
+    # puntuación, las similitudes de e5 se concentran en valores altos. Las búsquedas se
+    # limitan al mismo ámbito y a preguntas con las mismas cifras, pero conviene calibrar el
+    # umbral con pares de preguntas reales antes de activarla.
+    "answer_cache_enabled": False,              # Reutilizar respuestas de preguntas muy similares
+    "answer_cache_similarity_threshold": 0.95,  # Similitud coseno mínima para un acierto
+    "answer_cache_max_entries": 256,            # Número máximo de respuestas almacenadas
+    
+    # Caché persistente de veredictos del evaluador de relevancia (SQLite en PATHS_CONFIG["cache_dir"])
+    "verdict_cache_enabled": True,                   # Reutilizar veredictos por (pregunta, ámbito, chunk)
+    "verdict_cache_file": "grader_verdicts.sqlite",  # Nombre del fichero SQLite
+    "verdict_cache_ttl": 0,                          # Antigüedad máxima de un veredicto en segundos (0 = sin límite)
+    
+    # Caché persistente de embeddings de documentos (memory map en PATHS_CONFIG["cache_dir"])
+    "embedding_cache_enabled": True,       # Reutilizar vectores por hash de contenido entre colecciones y recreaciones
+    "embedding_cache_dir": "embeddings",   # Subdirectorio de la caché
+    "embedding_cache_dtype": "float16",    # Tipo de los vectores almacenados ("float16" o "float32")
+    
+    # Caché LRU en memoria de embeddings de consultas (compartida por todos los retrievers)
+    "query_embedding_cache_enabled": True,  # Reutilizar el embedding de una pregunta entre el agente de ámbito, retrieve y reintentos
+    "query_embedding_cache_size": 512,      # Consultas almacenadas
+    
+    # Caché persistente del contexto generado para cada chunk (SQLite en PATHS_CONFIG["cache_dir"])
+    "context_cache_enabled": True,                    # Reutilizar contextos por (documento, chunk, chunk_size)
+    "context_cache_file": "context_generation.sqlite",  # Nombre del fichero SQLite
 }
 
 # Configuración de SQL
@@ -93,6 +173,21 @@ API_CONFIG = {
 WORKFLOW_CONFIG = {
     "max_retries": 3,              # Número máximo de reintentos
     "relevance_threshold": 0.8,    # Umbral para considerar una respuesta relevante
+    "concurrent_grading": True,    # Evaluar la relevancia de los documentos en paralelo
+    "grading_max_concurrency": 4,  # Llamadas simultáneas máximas al evaluador de relevancia
+    "grading_timeout": 30,         # Timeout por llamada al evaluador de relevancia (segundos)
+    "evaluation_mode": "inline",   # "inline": evaluar antes de responder; "deferred": responder y evaluar en segundo plano
+    "deferred_evaluation_workers": 2,  # Hilos para las evaluaciones granulares diferidas
+    
+    # Empaquetado del contexto de generación
+    "context_packing_enabled": True,   # Limitar el contexto a un presupuesto de tokens y eliminar solapes
+    "context_token_budget": {          # Presupuesto de tokens del contexto por estrategia de chunk
+        "369": 3000,
+        "646": 4500,
+        "1094": 6000,
+    },
+    "context_token_budget_default": 4500,  # Presupuesto para estrategias sin valor específico
+    "context_dedup_min_overlap": 20,       # Solape mínimo (caracteres) entre chunks para recortarlo
 }
 
 # Configuración de Chunk Strategies y Recuperación Adaptativa
@@ -135,6 +230,7 @@ PATHS_CONFIG = {
     "default_vectorstore_dir": "./vectordb",  # Directorio base para vectorstores
     "default_chroma_dir": "./vectordb",       # Directorio específico para Chroma
     "log_dir": "./logs",                      # Directorio para archivos de registro
+    "cache_dir": "./cache",                   # Directorio para cachés persistentes
 }
 
 # Configuración de Logging
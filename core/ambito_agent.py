@@ -13,6 +13,7 @@ from langagent.models.constants import (
     AMBITO_EN_ES
 )
 from langagent.models.llm import create_clarification_generator
+from langagent.models.concurrency import RunnableCall, create_step_node
 import re
 
 # Usar el sistema de logging centralizado
@@ -120,7 +121,7 @@ def create_ambito_workflow(retriever: any, llm: any):
         
         try:
             # Recuperar documentos usando el retriever
-            docs = retriever.invoke(question)
+            docs = yield RunnableCall(retriever, question)
             
             if docs:
                 # LÓGICA MEJORADA: Analizar documentos con priorización
@@ -203,7 +204,7 @@ def create_ambito_workflow(retriever: any, llm: any):
                 context_text = "\n".join([doc.page_content for doc in state["context"][:3]])  # Limitar a 3 documentos
             
             # Usar el generador de clarificación con las prompts mejoradas
-            response = clarification_generator.invoke({
+            response = yield RunnableCall(clarification_generator, {
                 "question": state["question"],
                 "context": context_text
             })
@@ -223,8 +224,9 @@ def create_ambito_workflow(retriever: any, llm: any):
     
     # Añadir nodos al grafo
     workflow.add_node("identify_ambito", identify_ambito)
-    workflow.add_node("retrieve_context", retrieve_context)
-    workflow.add_node("generate_clarification", generate_clarification)
+    # Los nodos con llamadas externas son generadores de pasos (invoke o ainvoke según el grafo)
+    workflow.add_node("retrieve_context", create_step_node(retrieve_context, "retrieve_context"))
+    workflow.add_node("generate_clarification", create_step_node(generate_clarification, "generate_clarification"))
     
     # Definir el flujo
     workflow.set_entry_point("identify_ambito")
@@ -0,0 +1,227 @@
+"""
+Caché semántica de respuestas para el agente.
+
+Guarda las respuestas ya generadas junto con el embedding de la pregunta y
+devuelve la respuesta almacenada cuando llega una pregunta suficientemente
+parecida, evitando ejecutar el workflow principal. Solo se admiten respuestas
+RAG cuyas métricas de una evaluación real superan los umbrales de
+CHUNK_STRATEGY_CONFIG["evaluation_thresholds"]: las métricas por defecto
+(evaluación fallida) no cuentan y las consultas SQL no se guardan, ya que
+sus datos cambian con la base de datos.
+
+La búsqueda se hace después del grafo de ámbito: solo se comparan preguntas
+del mismo ámbito y modo consulta y con las mismas cifras (años, cursos...),
+ya que "matriculados en 2023" y "matriculados en 2024" son casi idénticas
+para el modelo de embeddings pero tienen respuestas distintas.
+"""
+
+import copy
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langagent.models.workflow_utils import check_metrics_success
+
+# Usar el sistema de logging centralizado
+from langagent.config.logging_config import get_logger
+logger = get_logger(__name__)
+
+# Campos del estado final que no se guardan en la caché
+_EXCLUDED_FIELDS = ("granularity_history", "speculative_results")
+
+# Cifras de la pregunta (años, cursos, porcentajes...) que deben coincidir en un acierto
+_NUMBER_PATTERN = re.compile(r"\d+(?:[.,]\d+)?")
+
+
+def _extract_numbers(question: str) -> List[str]:
+    """
+    Extrae las cifras de una pregunta, ordenadas, para comparar preguntas.
+
+    Args:
+        question: Pregunta del usuario
+
+    Returns:
+        List[str]: Cifras encontradas en la pregunta
+    """
+    return sorted(number.replace(",", ".") for number in _NUMBER_PATTERN.findall(question or ""))
+
+
+class SemanticAnswerCache:
+    """Índice vectorial pequeño de preguntas respondidas, con expulsión LRU."""
+
+    def __init__(self, embeddings: Embeddings, similarity_threshold: float = 0.95, max_entries: int = 256):
+        """
+        Inicializa la caché semántica de respuestas.
+
+        Args:
+            embeddings: Modelo de embeddings usado para las preguntas
+            similarity_threshold: Similitud coseno mínima para considerar un acierto
+            max_entries: Número máximo de respuestas almacenadas
+        """
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+        self.evictions = 0
+
+    def embed(self, question: str) -> Optional[np.ndarray]:
+        """
+        Calcula el embedding normalizado de una pregunta.
+
+        Args:
+            question: Pregunta del usuario
+
+        Returns:
+            Optional[np.ndarray]: Vector normalizado o None si falla el cálculo
+        """
+        try:
+            vector = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            return vector / norm if norm > 0 else vector
+        except Exception as e:
+            logger.warning(f"No se pudo calcular el embedding para la caché de respuestas: {e}")
+            return None
+
+    def lookup(self, embedding: Optional[np.ndarray], question: str, is_consulta: bool,
+               ambito: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        Busca una respuesta almacenada para una pregunta similar.
+
+        Solo se consideran las entradas de la misma partición (ámbito, is_consulta)
+        cuyas cifras coinciden con las de la pregunta; entre ellas se devuelve
+        la más similar si supera el umbral.
+
+        Args:
+            embedding: Embedding normalizado de la pregunta
+            question: Pregunta original
+            is_consulta: Modo consulta de la pregunta
+            ambito: Ámbito identificado por el grafo de ámbito
+
+        Returns:
+            Optional[Dict[str, Any]]: Copia del resultado almacenado o None
+        """
+        if embedding is None:
+            return None
+
+        numbers = _extract_numbers(question)
+
+        with self._lock:
+            candidates = [(entry_id, entry) for entry_id, entry in self._entries.items()
+                          if entry["is_consulta"] == is_consulta
+                          and entry["ambito"] == ambito
+                          and entry["numbers"] == numbers]
+            if not candidates:
+                self.misses += 1
+                return None
+
+            matrix = np.stack([entry["embedding"] for _, entry in candidates])
+            similarities = matrix @ embedding
+            best = int(np.argmax(similarities))
+            best_similarity = float(similarities[best])
+
+            if best_similarity < self.similarity_threshold:
+                self.misses += 1
+                return None
+
+            entry_id, entry = candidates[best]
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            result = copy.deepcopy(entry["result"])
+
+        logger.info(f"Acierto en caché de respuestas (similitud {best_similarity:.3f}, "
+                    f"ámbito {entry['ambito']}): '{entry['question']}'")
+        result["from_answer_cache"] = True
+        result["answer_cache_similarity"] = best_similarity
+        return result
+
+    def store(self, question: str, embedding: Optional[np.ndarray], is_consulta: bool,
+              result: Dict[str, Any]) -> bool:
+        """
+        Guarda una respuesta RAG si las métricas de una evaluación real superan los umbrales.
+
+        Args:
+            question: Pregunta original
+            embedding: Embedding normalizado de la pregunta
+            is_consulta: Modo consulta de la pregunta
+            result: Estado final devuelto por el workflow
+
+        Returns:
+            bool: True si la respuesta se admitió en la caché
+        """
+        if embedding is None or not result or not result.get("generation"):
+            return False
+
+        # Los resultados de consultas SQL dependen de datos vivos de la base de datos
+        if is_consulta:
+            return False
+
+        evaluation_metrics = result.get("evaluation_metrics") or {}
+        if (not evaluation_metrics or evaluation_metrics.get("default")
+                or not check_metrics_success(evaluation_metrics)):
+            with self._lock:
+                self.rejected += 1
+            logger.debug("Respuesta no admitida en caché: métricas por defecto o por debajo de los umbrales")
+            return False
+
+        stored_result = {key: value for key, value in result.items() if key not in _EXCLUDED_FIELDS}
+
+        with self._lock:
+            self._entries[self._next_id] = {
+                "question": question,
+                "embedding": embedding,
+                "numbers": _extract_numbers(question),
+                "ambito": result.get("ambito"),
+                "is_consulta": is_consulta,
+                "result": copy.deepcopy(stored_result),
+            }
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+        logger.info(f"Respuesta admitida en caché (ámbito {result.get('ambito')}, is_consulta {is_consulta})")
+        return True
+
+    def invalidate(self, collection_name: Optional[str] = None, cubos: Optional[List[str]] = None):
+        """
+        Vacía la caché tras una reingesta de documentos.
+
+        Una respuesta puede depender de cualquier colección, por lo que se
+        descartan todas las entradas independientemente de la colección modificada.
+
+        Args:
+            collection_name: Colección modificada (informativo)
+            cubos: Cubos añadidos o eliminados (informativo)
+        """
+        with self._lock:
+            removed = len(self._entries)
+            self._entries.clear()
+        if removed:
+            logger.info(f"Caché de respuestas invalidada por cambios en '{collection_name}': {removed} entradas eliminadas")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Devuelve los contadores de la caché para monitorización.
+
+        Returns:
+            Dict[str, Any]: Aciertos, fallos, rechazos, tamaño y expulsiones
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "rejected": self.rejected,
+                "size": len(self._entries),
+                "max_size": self.max_entries,
+                "evictions": self.evictions,
+            }
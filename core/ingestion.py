@@ -0,0 +1,358 @@
+"""
+Ingesta de documentos en las colecciones del agente.
+
+La ingesta completa (leer output_md, trocear cada documento para cada colección
+adaptativa y comparar versiones con la vectorstore) se puede ejecutar como
+comando independiente (`python -m langagent ingest`) o al construir el agente.
+
+Tras cada ingesta correcta se guarda un manifiesto local con la fecha de
+modificación, el tamaño y el hash de cada fichero fuente, junto con una huella
+de la configuración que determina el contenido del índice (backend, colecciones,
+tamaños de chunk, modelo de embeddings...) y el número de chunks indexados en
+cada colección. En el arranque rápido (VECTORSTORE_CONFIG["fast_start"]) el
+agente compara los ficheros actuales con ese manifiesto y el número de chunks
+de cada colección con el registrado (un recuento, sin leer los registros); si
+no ha cambiado nada, no vuelve a leer los ficheros ni a analizar la vectorstore.
+Los hashes solo se recalculan para los ficheros cuya fecha o tamaño ha cambiado.
+"""
+
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from langagent.config.config import CACHE_CONFIG, PATHS_CONFIG, VECTORSTORE_CONFIG
+from langagent.utils.document_loader import load_documents_from_directory, load_consultas_guardadas
+
+# Usar el sistema de logging centralizado
+from langagent.config.logging_config import get_logger
+logger = get_logger(__name__)
+
+MANIFEST_VERSION = 2
+
+
+def get_manifest_path() -> str:
+    """Devuelve la ruta del manifiesto local de la última ingesta."""
+    return os.path.join(PATHS_CONFIG.get("cache_dir", "./cache"),
+                        VECTORSTORE_CONFIG.get("ingestion_manifest_file", "ingestion_manifest.json"))
+
+
+def get_target_collections() -> List[str]:
+    """
+    Devuelve las colecciones que construye la ingesta.
+
+    Returns:
+        List[str]: Nombres de las colecciones (las adaptativas o la principal)
+    """
+    if VECTORSTORE_CONFIG.get("use_adaptive_retrieval", False):
+        return sorted(VECTORSTORE_CONFIG.get("adaptive_collections", {}).values())
+    return [VECTORSTORE_CONFIG["collection_name"]]
+
+
+def ingestion_fingerprint(vector_db_type: str) -> Dict[str, Any]:
+    """
+    Configuración que determina el contenido de las colecciones.
+
+    Si cambia cualquiera de estos valores, el índice existente no corresponde
+    a la configuración actual y hay que volver a ejecutar la ingesta.
+
+    Args:
+        vector_db_type: Tipo de vectorstore del agente
+
+    Returns:
+        Dict[str, Any]: Huella de la configuración (serializable en JSON)
+    """
+    if vector_db_type == "milvus":
+        location = VECTORSTORE_CONFIG.get("milvus_uri")
+    elif vector_db_type == "local":
+        location = os.path.abspath(VECTORSTORE_CONFIG.get("local_persist_directory", "./vectordb/local"))
+    else:
+        location = os.path.abspath(VECTORSTORE_CONFIG.get("persist_directory", "./vectordb"))
+
+    return {
+        "vector_db_type": vector_db_type,
+        "location": location,
+        # El tamaño de chunk se deduce del nombre de cada colección (chunk_size si no lo incluye)
+        "collections": get_target_collections(),
+        "chunk_size": VECTORSTORE_CONFIG.get("chunk_size"),
+        "chunk_overlap": VECTORSTORE_CONFIG.get("chunk_overlap"),
+        "embedding_model": VECTORSTORE_CONFIG.get("embedding_model"),
+        "embedding_backend": VECTORSTORE_CONFIG.get("embedding_backend", "torch"),
+        "use_context_generation": VECTORSTORE_CONFIG.get("use_context_generation", False),
+    }
+
+
+def get_collection_counts(vectorstore_handler, embeddings) -> Optional[Dict[str, int]]:
+    """
+    Cuenta los chunks indexados en cada colección de la ingesta.
+
+    Args:
+        vectorstore_handler: Implementación de VectorStoreBase del agente
+        embeddings: Modelo de embeddings con el que se cargan las colecciones
+
+    Returns:
+        Optional[Dict[str, int]]: Colección -> número de chunks, o None si alguna
+        colección no existe o no se puede contar
+    """
+    counts = {}
+    for collection_name in get_target_collections():
+        vectorstore = vectorstore_handler.load_vectorstore(embeddings, collection_name)
+        count = vectorstore_handler.count_chunks(vectorstore) if vectorstore is not None else None
+        if count is None:
+            logger.info(f"No se pudo contar los chunks de la colección '{collection_name}'")
+            return None
+        counts[collection_name] = count
+    return counts
+
+
+def _hash_file(path: str) -> str:
+    """Calcula el SHA-256 del contenido de un fichero."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def scan_sources(directories: List[str], previous: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Recorre los ficheros markdown que carga la ingesta.
+
+    Args:
+        directories: Directorios de documentos (los que no existen se ignoran)
+        previous: Entradas del manifiesto anterior; se reutiliza su hash si la
+            fecha de modificación y el tamaño no han cambiado
+
+    Returns:
+        Dict[str, Dict[str, Any]]: Ruta -> {"mtime_ns", "size", "sha256"}
+    """
+    previous = previous or {}
+    sources = {}
+    for directory in directories:
+        if not directory or not os.path.isdir(directory):
+            continue
+        for root, _, files in os.walk(directory):
+            for file_name in files:
+                if not file_name.endswith(".md"):
+                    continue
+                path = os.path.abspath(os.path.join(root, file_name))
+                stat = os.stat(path)
+                entry = previous.get(path)
+                if entry and entry.get("mtime_ns") == stat.st_mtime_ns and entry.get("size") == stat.st_size:
+                    sha256 = entry["sha256"]
+                else:
+                    sha256 = _hash_file(path)
+                sources[path] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha256": sha256}
+    return sources
+
+
+def load_manifest(path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Carga el manifiesto de la última ingesta.
+
+    Args:
+        path: Ruta del manifiesto (por defecto, get_manifest_path())
+
+    Returns:
+        Optional[Dict[str, Any]]: Manifiesto o None si no existe o no es válido
+    """
+    path = path or get_manifest_path()
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"No se pudo leer el manifiesto de ingesta {path}: {e}")
+        return None
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def save_manifest(sources: Dict[str, Dict[str, Any]], fingerprint: Dict[str, Any],
+                  collections: Optional[Dict[str, int]] = None, path: Optional[str] = None):
+    """
+    Guarda el manifiesto de una ingesta correcta.
+
+    Args:
+        sources: Ficheros fuente ingestados (resultado de scan_sources)
+        fingerprint: Huella de la configuración (resultado de ingestion_fingerprint)
+        collections: Chunks indexados por colección (resultado de get_collection_counts)
+        path: Ruta del manifiesto (por defecto, get_manifest_path())
+    """
+    path = path or get_manifest_path()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "created_at": time.time(),
+        "fingerprint": fingerprint,
+        "sources": sources,
+        "collections": collections,
+    }
+    # Escritura atómica para no dejar un manifiesto a medias si el proceso se interrumpe
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def is_index_current(data_dir: str, vector_db_type: str, vectorstore_handler, embeddings,
+                     consultas_dir: Optional[str] = None) -> bool:
+    """
+    Comprueba si las colecciones corresponden a los ficheros y la configuración actuales.
+
+    Además de los ficheros fuente, compara el número de chunks de cada colección
+    con el del manifiesto, de modo que una colección eliminada o vaciada fuera
+    del agente obliga a ejecutar la ingesta.
+
+    Si solo han cambiado las fechas de modificación (mismo contenido), se
+    actualiza el manifiesto para que el siguiente arranque no recalcule los hashes.
+
+    Args:
+        data_dir: Directorio de documentos
+        vector_db_type: Tipo de vectorstore del agente
+        vectorstore_handler: Implementación de VectorStoreBase del agente
+        embeddings: Modelo de embeddings con el que se cargan las colecciones
+        consultas_dir: Directorio de consultas guardadas (opcional)
+
+    Returns:
+        bool: True si no hace falta ejecutar la ingesta
+    """
+    manifest = load_manifest()
+    if manifest is None:
+        logger.info("No hay manifiesto de ingesta previo")
+        return False
+
+    fingerprint = ingestion_fingerprint(vector_db_type)
+    if manifest.get("fingerprint") != fingerprint:
+        logger.info("La configuración de ingesta ha cambiado desde el último manifiesto")
+        return False
+
+    previous = manifest.get("sources", {})
+    sources = scan_sources([data_dir, consultas_dir], previous)
+    if not sources:
+        logger.info(f"No hay documentos en {data_dir}")
+        return False
+
+    changed = [path for path in sources.keys() | previous.keys()
+               if sources.get(path, {}).get("sha256") != previous.get(path, {}).get("sha256")]
+    if changed:
+        logger.info(f"{len(changed)} ficheros fuente han cambiado desde la última ingesta")
+        return False
+
+    indexed = manifest.get("collections")
+    counts = get_collection_counts(vectorstore_handler, embeddings)
+    if not indexed or counts != indexed:
+        logger.info(f"Las colecciones indexadas no coinciden con el manifiesto "
+                    f"(manifiesto: {indexed}, colecciones: {counts})")
+        return False
+
+    if any(sources[path]["mtime_ns"] != previous[path].get("mtime_ns") for path in sources):
+        save_manifest(sources, fingerprint, indexed)
+    return True
+
+
+def ingest_documents(document_uploader, data_dir: str, vector_db_type: str,
+                     consultas_dir: Optional[str] = None) -> bool:
+    """
+    Carga los documentos en las colecciones del agente y guarda el manifiesto si todo va bien.
+
+    Si la recuperación adaptativa está activada, solo se cargan esas colecciones.
+
+    Args:
+        document_uploader: DocumentUploader del agente
+        data_dir: Directorio de documentos
+        vector_db_type: Tipo de vectorstore del agente
+        consultas_dir: Directorio de consultas guardadas (opcional)
+
+    Returns:
+        bool: True si todas las colecciones se cargaron correctamente
+    """
+    # Escanear antes de cargar: un fichero modificado durante la ingesta se detectará en el siguiente arranque
+    manifest = load_manifest()
+    sources = scan_sources([data_dir, consultas_dir], manifest.get("sources") if manifest else None)
+
+    logger.info("Cargando documentos...")
+    documents = load_documents_from_directory(data_dir)
+
+    # Cargar consultas guardadas si existe el directorio
+    if consultas_dir and os.path.exists(consultas_dir):
+        logger.info("Cargando consultas guardadas...")
+        consultas = load_consultas_guardadas(consultas_dir)
+        documents.extend(consultas)
+
+    # Cargar documentos usando DocumentUploader
+    if VECTORSTORE_CONFIG.get("use_adaptive_retrieval", False):
+        logger.info("Recuperación adaptativa activada. Cargando solo colecciones adaptativas.")
+        results = document_uploader.create_adaptive_collections(documents)
+        success = bool(results) and all(results.values())
+    else:
+        logger.info("Cargando colección principal.")
+        success = document_uploader.load_documents_intelligently(
+            documents,
+            collection_name=VECTORSTORE_CONFIG["collection_name"],
+            force_recreate=False
+        )
+
+    if success and sources:
+        try:
+            collections = get_collection_counts(document_uploader.vectorstore_handler, document_uploader.embeddings)
+            save_manifest(sources, ingestion_fingerprint(vector_db_type), collections)
+        except OSError as e:
+            logger.warning(f"No se pudo guardar el manifiesto de ingesta: {e}")
+    elif not success:
+        logger.warning("La ingesta no se completó correctamente; no se actualiza el manifiesto")
+    return success
+
+
+def run_ingestion(data_dir: Optional[str] = None, vector_db_type: Optional[str] = None,
+                  consultas_dir: Optional[str] = None, force: bool = False, local_llm: Optional[str] = None) -> bool:
+    """
+    Ejecuta la ingesta sin construir el agente (comando `ingest`).
+
+    Args:
+        data_dir: Directorio de documentos (por defecto, PATHS_CONFIG["default_data_dir"])
+        vector_db_type: Tipo de vectorstore (por defecto, VECTORSTORE_CONFIG["vector_db_type"])
+        consultas_dir: Directorio de consultas guardadas (opcional)
+        force: Ejecutar la ingesta aunque el manifiesto indique que no hay cambios
+        local_llm: Modelo para la generación de contexto (por defecto, LLM_CONFIG["default_model"])
+
+    Returns:
+        bool: True si las colecciones quedaron actualizadas
+    """
+    from langagent.vectorstore import VectorStoreFactory, create_embeddings
+    from langagent.vectorstore.document_uploader import DocumentUploader
+    from langagent.config.config import LLM_CONFIG
+
+    data_dir = data_dir or PATHS_CONFIG["default_data_dir"]
+    vector_db_type = vector_db_type or VECTORSTORE_CONFIG["vector_db_type"]
+
+    vectorstore_handler = VectorStoreFactory.get_vectorstore_instance(vector_db_type)
+    embeddings = create_embeddings(use_query_cache=False)
+
+    if not force and is_index_current(data_dir, vector_db_type, vectorstore_handler, embeddings, consultas_dir):
+        logger.info("Las colecciones están al día; no hay nada que ingestar")
+        return True
+
+    document_uploader = DocumentUploader(vectorstore_handler, embeddings)
+
+    # Los veredictos persistentes de los cubos modificados dejan de ser válidos
+    if CACHE_CONFIG.get("verdict_cache_enabled", True):
+        from langagent.core.verdict_cache import GraderVerdictCache
+        verdict_cache = GraderVerdictCache(
+            os.path.join(PATHS_CONFIG.get("cache_dir", "./cache"), CACHE_CONFIG.get("verdict_cache_file", "grader_verdicts.sqlite")),
+            ttl_seconds=CACHE_CONFIG.get("verdict_cache_ttl", 0)
+        )
+        document_uploader.register_change_listener(verdict_cache.invalidate)
+
+    if VECTORSTORE_CONFIG.get("use_context_generation", False):
+        from langagent.models.llm import create_llm, create_context_generator, create_batch_context_generator
+        llm = create_llm(model_name=local_llm or LLM_CONFIG["default_model"])
+        batch_context_generator = None
+        if VECTORSTORE_CONFIG.get("context_batch_size", 1) > 1:
+            batch_context_generator = create_batch_context_generator(llm)
+        vectorstore_handler.set_context_generator(create_context_generator(llm), batch_context_generator)
+
+    return ingest_documents(document_uploader, data_dir, vector_db_type, consultas_dir)
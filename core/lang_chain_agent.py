@@ -6,15 +6,15 @@ Clase LangChainAgent para configurar y ejecutar el agente de respuesta a pregunt
 
 import re
 import os
+import asyncio
+import threading
 from langchain_core.documents import Document
+from langchain_core.utils.json import parse_partial_json
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langagent.utils.document_loader import (
-    load_documents_from_directory,
-    load_consultas_guardadas
-)
 from langagent.vectorstore import (
     VectorStoreFactory,
-    create_embeddings
+    create_embeddings,
+    warmup_embeddings
 )
 from langagent.models.llm import (
     create_llm, 
@@ -23,6 +23,7 @@ from langagent.models.llm import (
     create_granular_evaluator, 
     create_query_rewriter,
     create_context_generator,
+    create_batch_context_generator,
     create_rag_sql_chain,
     create_sql_interpretation
 )
@@ -38,16 +39,23 @@ from langagent.config.config import (
     LLM_CONFIG,
     VECTORSTORE_CONFIG,
     PATHS_CONFIG,
-    SQL_CONFIG
+    SQL_CONFIG,
+    CACHE_CONFIG
 )
 from langagent.vectorstore.document_uploader import DocumentUploader
+from langagent.vectorstore.retrieval_cache import get_retrieval_cache
+from langagent.core.answer_cache import SemanticAnswerCache
+from langagent.core.verdict_cache import GraderVerdictCache
+from langagent.vectorstore.embedding_cache import CachedEmbeddings
+from langagent.vectorstore.query_embedding_cache import QueryEmbeddingCache
+from langagent.core.ingestion import ingest_documents, is_index_current
 
 # Usar el sistema de logging centralizado
 from langagent.config.logging_config import get_logger
 logger = get_logger(__name__)
 
 class LangChainAgent:
-    def __init__(self, data_dir=None, vectorstore_dir=None, vector_db_type=None, local_llm=None, local_llm2=None, local_llm3=None, consultas_dir=None):
+    def __init__(self, data_dir=None, vectorstore_dir=None, vector_db_type=None, local_llm=None, local_llm2=None, local_llm3=None, consultas_dir=None, fast_start=None):
         """
         Inicializa el agente con la configuración especificada.
         
@@ -59,12 +67,14 @@ class LangChainAgent:
             local_llm2: Nombre del modelo de lenguaje local para evaluadores
             local_llm3: Nombre del modelo de lenguaje local para el agente de ámbito
             consultas_dir: Directorio con las consultas guardadas
+            fast_start: Omitir la ingesta si no hay cambios desde la última (por defecto, VECTORSTORE_CONFIG["fast_start"])
         """
         # Configuración de directorios
         self.data_dir = data_dir or PATHS_CONFIG["default_data_dir"]
         self.vectorstore_dir = vectorstore_dir or PATHS_CONFIG["default_vectorstore_dir"]
         self.vector_db_type = vector_db_type or VECTORSTORE_CONFIG["vector_db_type"]
         self.consultas_dir = consultas_dir
+        self.fast_start = VECTORSTORE_CONFIG.get("fast_start", False) if fast_start is None else fast_start
         
         # Configuración de modelos - Usar los modelos por defecto específicos para cada rol
         self.local_llm = local_llm or LLM_CONFIG["default_model"]  # Modelo principal
@@ -91,8 +101,14 @@ class LangChainAgent:
         self.adaptive_retrievers = {}  # Diccionario de retrievers por estrategia
         self.adaptive_vectorstores = {}  # Diccionario de vectorstores por estrategia
         
-        # Historial de granularidades persistente entre ejecuciones
+        # Historial de granularidades persistente entre ejecuciones. El callback de la
+        # evaluación diferida lo actualiza desde otro hilo, así que todo acceso usa el lock.
+        # Cada ejecución recibe un número de secuencia y solo la más reciente que haya
+        # terminado sustituye el historial (una evaluación diferida tardía no lo pisa)
         self.granularity_history = []
+        self._granularity_history_lock = threading.Lock()
+        self._run_sequence = 0
+        self._granularity_history_run = 0
         
         # Obtener la instancia de vectorstore
         self.vectorstore_handler = VectorStoreFactory.get_vectorstore_instance(self.vector_db_type)
@@ -100,6 +116,10 @@ class LangChainAgent:
         # Componente de carga de documentos
         self.document_uploader = None
         
+        # Caché semántica de respuestas
+        self.answer_cache = None
+        self.verdict_cache = None
+        
         self.setup_agent()
 
     def setup_agent(self):
@@ -114,27 +134,57 @@ class LangChainAgent:
         logger.info(f"Modelo secundario (routing): {self.local_llm2}")
         logger.info(f"Modelo terciario (evaluación): {self.local_llm3}")
         
-        self.llm = create_llm(model_name=self.local_llm)
+        self.llm = create_llm(model_name=self.local_llm, streaming=LLM_CONFIG.get("stream_main_model", False))
         self.llm2 = create_llm(model_name=self.local_llm2)
         self.llm3 = create_llm(model_name=self.local_llm3)
         
         # Crear embeddings
         logger.info("Configurando embeddings...")
         self.embeddings = create_embeddings()
+        if VECTORSTORE_CONFIG.get("embedding_warmup", True):
+            warmup_embeddings(self.embeddings)
         
         # Crear DocumentUploader
         self.document_uploader = DocumentUploader(self.vectorstore_handler, self.embeddings)
         
+        # Crear caché de respuestas antes de la carga para que se invalide con la reingesta
+        if CACHE_CONFIG.get("answer_cache_enabled", False):
+            self.answer_cache = SemanticAnswerCache(
+                self.embeddings,
+                similarity_threshold=CACHE_CONFIG.get("answer_cache_similarity_threshold", 0.95),
+                max_entries=CACHE_CONFIG.get("answer_cache_max_entries", 256)
+            )
+            self.document_uploader.register_change_listener(self.answer_cache.invalidate)
+        
+        # Caché persistente de veredictos del evaluador de relevancia
+        if CACHE_CONFIG.get("verdict_cache_enabled", True):
+            self.verdict_cache = GraderVerdictCache(
+                os.path.join(PATHS_CONFIG.get("cache_dir", "./cache"), CACHE_CONFIG.get("verdict_cache_file", "grader_verdicts.sqlite")),
+                ttl_seconds=CACHE_CONFIG.get("verdict_cache_ttl", 0)
+            )
+            self.document_uploader.register_change_listener(self.verdict_cache.invalidate)
+        
         # Configurar generador de contexto si está habilitado
         if VECTORSTORE_CONFIG.get("use_context_generation", False):
             logger.info("Configurando generador de contexto...")
             self._setup_context_generator()
         
-        # Cargar documentos usando DocumentUploader
-        self._load_documents_with_uploader()
+        # Cargar documentos usando DocumentUploader (salvo que el índice ya esté al día)
+        skipped_ingestion = self.fast_start and is_index_current(
+            self.data_dir, self.vector_db_type, self.vectorstore_handler, self.embeddings, self.consultas_dir
+        )
+        if skipped_ingestion:
+            logger.info("Arranque rápido: los documentos no han cambiado desde la última ingesta, se omite la carga")
+        else:
+            self._load_documents_with_uploader()
         
         # Cargar vectorstore principal
         self.vectorstore = self.vectorstore_handler.load_vectorstore(self.embeddings, VECTORSTORE_CONFIG["collection_name"])
+        if self.vectorstore is None and skipped_ingestion:
+            # La colección se eliminó fuera del agente: el manifiesto ya no es válido
+            logger.warning("La colección principal no existe a pesar del manifiesto de ingesta; se ejecuta la carga")
+            self._load_documents_with_uploader()
+            self.vectorstore = self.vectorstore_handler.load_vectorstore(self.embeddings, VECTORSTORE_CONFIG["collection_name"])
         
         # Crear el retriever principal
         self.retriever = self.vectorstore_handler.create_retriever(self.vectorstore)
@@ -167,6 +217,10 @@ class LangChainAgent:
         logger.info("Creando flujos de trabajo...")
         self._create_workflows()
         
+        # Anotar en las métricas de cada workflow los aciertos de las cachés
+        for name, cache in self._iter_caches():
+            self.workflow.metrics_collector.register_cache(name, cache)
+        
         # Compilar workflows
         self.app = self.workflow
         self.ambito_app = self.ambito_workflow.compile()
@@ -178,33 +232,17 @@ class LangChainAgent:
         """
         logger.info("Configurando generador de contexto (chunk_size será dinámico)")
         context_generator = create_context_generator(self.llm)
-        self.vectorstore_handler.set_context_generator(context_generator)
+        batch_context_generator = None
+        if VECTORSTORE_CONFIG.get("context_batch_size", 1) > 1:
+            batch_context_generator = create_batch_context_generator(self.llm)
+        self.vectorstore_handler.set_context_generator(context_generator, batch_context_generator)
     
     def _load_documents_with_uploader(self):
         """
         Carga documentos usando DocumentUploader.
         Si la recuperación adaptativa está activada, solo carga esas colecciones.
         """
-        logger.info("Cargando documentos...")
-        documents = load_documents_from_directory(self.data_dir)
-        
-        # Cargar consultas guardadas si existe el directorio
-        if self.consultas_dir and os.path.exists(self.consultas_dir):
-            logger.info("Cargando consultas guardadas...")
-            consultas = load_consultas_guardadas(self.consultas_dir)
-            documents.extend(consultas)
-        
-        # Cargar documentos usando DocumentUploader
-        if VECTORSTORE_CONFIG.get("use_adaptive_retrieval", False):
-            logger.info("Recuperación adaptativa activada. Cargando solo colecciones adaptativas.")
-            self.document_uploader.create_adaptive_collections(documents)
-        else:
-            logger.info("Cargando colección principal.")
-            self.document_uploader.load_documents_intelligently(
-                documents, 
-                collection_name=VECTORSTORE_CONFIG["collection_name"],
-                force_recreate=False
-            )
+        ingest_documents(self.document_uploader, self.data_dir, self.vector_db_type, self.consultas_dir)
 
     def _create_workflows(self):
         """
@@ -225,7 +263,8 @@ class LangChainAgent:
             query_rewriter=self.query_rewriter,
             sql_interpretation_chain=self.sql_interpretation_chain,
             adaptive_retrievers=adaptive_retrievers_param,  # Pasar retrievers adaptativos solo si está habilitado
-            collection_name=collection_name  # Pasar nombre de colección para extraer estrategia inicial
+            collection_name=collection_name,  # Pasar nombre de colección para extraer estrategia inicial
+            verdict_cache=self.verdict_cache
         )
         
         # Crear el flujo de trabajo del agente de ámbito
@@ -234,13 +273,16 @@ class LangChainAgent:
             llm=self.llm3
         )
     
-    def run(self, query, is_consulta=False):
+    def run(self, query, is_consulta=False, wait_for_evaluation=False):
         """
         Ejecuta el agente con una consulta del usuario.
         
         Args:
             query (str): Consulta del usuario.
             is_consulta (bool): Si está en modo consulta.
+            wait_for_evaluation (bool): Con WORKFLOW_CONFIG["evaluation_mode"] = "deferred",
+                esperar a la evaluación granular y reintentar si no supera los umbrales
+                (para ejecuciones por lotes y evaluaciones).
             
         Returns:
             Dict: Resultado de la ejecución del agente.
@@ -248,62 +290,358 @@ class LangChainAgent:
         print_title(f"Consulta: {query}")
         print(f"is consulta: {is_consulta}")  # Debug para verificar el estado
         
-        # Primero, identificar el ámbito pasando explícitamente is_consulta
-        ambito_initial_state = {
-            "question": query,
-            "is_consulta": is_consulta
-        }
-        ambito_result = self.ambito_app.invoke(ambito_initial_state)
+        # Embedding de la pregunta para la caché semántica de respuestas
+        question_embedding = None
+        if self.answer_cache is not None:
+            question_embedding = self.answer_cache.embed(query)
+        
+        return self._run_workflows(query, is_consulta, question_embedding, wait_for_evaluation)
+    
+    async def arun(self, query, is_consulta=False, wait_for_evaluation=False):
+        """
+        Versión asíncrona de run: ejecuta el grafo de ámbito y el workflow principal con ainvoke.
+        
+        Permite que los servidores (FastAPI, Chainlit) atiendan varias preguntas
+        a la vez sin bloquear el bucle de eventos.
+        
+        Args:
+            query (str): Consulta del usuario.
+            is_consulta (bool): Si está en modo consulta.
+            wait_for_evaluation (bool): Esperar a la evaluación granular en modo diferido.
+            
+        Returns:
+            Dict: Resultado de la ejecución del agente.
+        """
+        print_title(f"Consulta: {query}")
+        
+        # Embedding de la pregunta para la caché semántica de respuestas
+        question_embedding = None
+        if self.answer_cache is not None:
+            loop = asyncio.get_running_loop()
+            question_embedding = await loop.run_in_executor(None, self.answer_cache.embed, query)
+        
+        return await self._arun_workflows(query, is_consulta, question_embedding, wait_for_evaluation)
+    
+    async def astream(self, query, is_consulta=False):
+        """
+        Ejecuta el agente emitiendo eventos de progreso y los tokens de la respuesta.
+        
+        Eventos emitidos (diccionarios con campo "type"):
+            - "ambito": ámbito y cubos identificados
+            - "clarification_needed": pregunta de clarificación (fin del flujo)
+            - "progress": fin de un nodo (documentos recuperados, evaluados, métricas...)
+            - "generation_start": comienza un intento de generación (reiniciar el texto mostrado)
+            - "token": fragmento nuevo de la respuesta
+            - "result": resultado final completo del agente
+        
+        Args:
+            query (str): Consulta del usuario.
+            is_consulta (bool): Si está en modo consulta.
+            
+        Yields:
+            Dict: Eventos de progreso y tokens.
+        """
+        print_title(f"Consulta (streaming): {query}")
+        
+        # Embedding de la pregunta para la caché semántica de respuestas
+        question_embedding = None
+        if self.answer_cache is not None:
+            loop = asyncio.get_running_loop()
+            question_embedding = await loop.run_in_executor(None, self.answer_cache.embed, query)
+        
+        ambito_result = await self.ambito_app.ainvoke({"question": query, "is_consulta": is_consulta})
         
-        # Si necesitamos clarificación, devolver la pregunta
         if ambito_result.get("needs_clarification"):
-            return {
+            yield {
                 "type": "clarification_needed",
                 "question": ambito_result["clarification_question"]
             }
+            return
+        
+        yield {
+            "type": "ambito",
+            "ambito": ambito_result.get("ambito"),
+            "cubos": ambito_result.get("cubos", [])
+        }
+        
+        cached_result = self._lookup_answer_cache(query, question_embedding, is_consulta, ambito_result)
+        if cached_result is not None:
+            yield {"type": "result", "result": cached_result}
+            return
+        
+        initial_state = self._build_workflow_state(query, is_consulta, ambito_result)
+        run_id = self._next_run_id()
+        on_evaluation = self._create_evaluation_callback(query, question_embedding, is_consulta, ambito_result, run_id)
+        result = None
+        emitted_nodes = set()
+        raw_generation = ""
+        streamed_answer = ""
+        
+        async for event in self.app.astream_events_with_metrics(initial_state, on_evaluation=on_evaluation):
+            kind = event["event"]
+            metadata = event.get("metadata", {})
+            node = metadata.get("langgraph_node")
+            
+            if kind == "on_chain_end" and not event.get("parent_ids"):
+                result = event["data"].get("output")
+            
+            elif kind == "on_chain_end" and event.get("name") == node:
+                # Cada nodo puede emitir varios eventos de fin anidados con su nombre
+                node_key = (metadata.get("langgraph_step"), node)
+                if node_key in emitted_nodes:
+                    continue
+                emitted_nodes.add(node_key)
+                progress = self._build_progress_event(node, event["data"].get("output"))
+                if progress:
+                    yield progress
+            
+            elif kind == "on_chat_model_start" and node == "generate":
+                raw_generation = ""
+                streamed_answer = ""
+                yield {"type": "generation_start"}
+            
+            elif kind == "on_chat_model_stream" and node == "generate":
+                chunk = event["data"].get("chunk")
+                raw_generation += getattr(chunk, "content", "") or ""
+                
+                # El modelo responde en JSON: extraer el campo answer del JSON parcial
+                partial = parse_partial_json(raw_generation) if raw_generation.strip().startswith("{") else None
+                answer = partial.get("answer") if isinstance(partial, dict) else None
+                if isinstance(answer, str) and len(answer) > len(streamed_answer):
+                    delta = answer[len(streamed_answer):]
+                    streamed_answer = answer
+                    yield {"type": "token", "text": delta}
+        
+        result = self._finalize_workflow_result(result or {}, is_consulta, ambito_result, run_id)
+        
+        yield {"type": "result", "result": result}
+    
+    def _build_progress_event(self, node, output):
+        """
+        Construye el evento de progreso de un nodo del workflow principal.
+        
+        Args:
+            node (str): Nombre del nodo finalizado.
+            output (Dict): Actualización de estado devuelta por el nodo.
+            
+        Returns:
+            Optional[Dict]: Evento de progreso o None si el nodo no se notifica.
+        """
+        if not isinstance(output, dict):
+            return None
+        
+        if node == "retrieve":
+            return {
+                "type": "progress",
+                "node": node,
+                "documents": len(output.get("documents") or []),
+                "chunk_strategy": output.get("chunk_strategy"),
+                "retry_count": output.get("retry_count", 0)
+            }
+        if node == "grade_relevance":
+            details = output.get("retrieval_details") or {}
+            return {
+                "type": "progress",
+                "node": node,
+                "relevant_documents": details.get("relevant_count", len(output.get("documents") or []))
+            }
+        if node in ("rewrite_query", "evaluate_response_granular", "execute_query", "generate_sql_interpretation"):
+            event = {"type": "progress", "node": node}
+            if node == "rewrite_query":
+                event["rewritten_question"] = output.get("rewritten_question")
+            elif node == "evaluate_response_granular":
+                metrics = output.get("evaluation_metrics") or {}
+                event["evaluation_metrics"] = {key: value for key, value in metrics.items() if key != "diagnosis"}
+            return event
+        return None
+    
+    def _build_workflow_state(self, query, is_consulta, ambito_result, wait_for_evaluation=False):
+        """
+        Construye el estado inicial del workflow principal a partir del resultado del agente de ámbito.
+        
+        Args:
+            query (str): Consulta del usuario.
+            is_consulta (bool): Si está en modo consulta.
+            ambito_result (Dict): Estado final del grafo de ámbito.
+            wait_for_evaluation (bool): Esperar a la evaluación granular en modo diferido.
+            
+        Returns:
+            Dict: Estado inicial del workflow principal.
+        """
+        granularity_history = self.get_granularity_history()
         
         # Si tenemos un ámbito identificado, proceder con el workflow principal
         if ambito_result.get("ambito"):
-            # Crear el estado inicial para el workflow principal
-            initial_state = {
+            return {
                 "question": query,
                 "ambito": ambito_result["ambito"],
                 "cubos": ambito_result["cubos"],
                 "is_consulta": is_consulta,  # Usar el parámetro directamente
                 "retry_count": 0,
                 "evaluation_metrics": {},
-                "granularity_history": self.granularity_history.copy()
+                "granularity_history": granularity_history,
+                "wait_for_evaluation": wait_for_evaluation
             }
-            
-            # Ejecutar el workflow principal con métricas
-            result = self.app.invoke_with_metrics(initial_state)
-            
-            # Actualizar el historial persistente con el resultado
-            if "granularity_history" in result:
-                self.granularity_history = result["granularity_history"]
-            
-            # Añadir información del ámbito al resultado
-            result["ambito"] = ambito_result["ambito"]
-            result["cubos"] = ambito_result["cubos"]
-            result["is_consulta"] = is_consulta  # Usar el parámetro directamente
-            
-            return result
         
         # Si no se pudo identificar el ámbito, ejecutar el workflow principal con la consulta original
-        default_state = {
+        return {
             "question": query,
             "is_consulta": is_consulta,  # Usar el parámetro directamente
             "retry_count": 0,
             "evaluation_metrics": {},
-            "granularity_history": self.granularity_history.copy()
+            "granularity_history": granularity_history,
+            "wait_for_evaluation": wait_for_evaluation
         }
+    
+    def _lookup_answer_cache(self, query, question_embedding, is_consulta, ambito_result):
+        """
+        Consulta la caché semántica de respuestas una vez identificado el ámbito.
         
-        # Ejecutar workflow y actualizar historial persistente
-        result = self.app.invoke_with_metrics(default_state)
-        if "granularity_history" in result:
-            self.granularity_history = result["granularity_history"]
+        Args:
+            query (str): Consulta del usuario.
+            question_embedding: Embedding de la pregunta para la caché de respuestas.
+            is_consulta (bool): Si está en modo consulta.
+            ambito_result (Dict): Estado final del grafo de ámbito.
+            
+        Returns:
+            Optional[Dict]: Resultado almacenado o None si no hay acierto.
+        """
+        if self.answer_cache is None:
+            return None
+        return self.answer_cache.lookup(question_embedding, query, is_consulta, ambito_result.get("ambito"))
+    
+    def _next_run_id(self):
+        """
+        Asigna el número de secuencia de una nueva ejecución del workflow.
+        
+        Returns:
+            int: Número de secuencia, creciente entre ejecuciones.
+        """
+        with self._granularity_history_lock:
+            self._run_sequence += 1
+            return self._run_sequence
+    
+    def _create_evaluation_callback(self, query, question_embedding, is_consulta, ambito_result, run_id):
+        """
+        Crea la función que recibe el estado final ya evaluado del workflow.
+        
+        Con evaluación en línea se llama antes de devolver el resultado; con
+        evaluación diferida, al terminar la evaluación en segundo plano. Actualiza
+        el historial de granularidades y admite la respuesta en la caché si supera
+        los umbrales de evaluación.
+        
+        Args:
+            query (str): Consulta del usuario.
+            question_embedding: Embedding de la pregunta para la caché de respuestas.
+            is_consulta (bool): Si está en modo consulta.
+            ambito_result (Dict): Estado final del grafo de ámbito.
+            run_id (int): Número de secuencia de la ejecución.
+            
+        Returns:
+            Callable: Función on_evaluation(estado_evaluado)
+        """
+        def on_evaluation(evaluated_state):
+            result = self._finalize_workflow_result(dict(evaluated_state), is_consulta, ambito_result, run_id)
+            if self.answer_cache is not None:
+                self.answer_cache.store(query, question_embedding, is_consulta, result)
+        
+        return on_evaluation
+    
+    def _finalize_workflow_result(self, result, is_consulta, ambito_result, run_id):
+        """
+        Actualiza el historial persistente y añade la información del ámbito al resultado.
+        
+        Args:
+            result (Dict): Estado final del workflow principal.
+            is_consulta (bool): Si está en modo consulta.
+            ambito_result (Dict): Estado final del grafo de ámbito.
+            run_id (int): Número de secuencia de la ejecución.
             
+        Returns:
+            Dict: Resultado de la ejecución del agente.
+        """
+        # Actualizar el historial persistente salvo que ya lo haya hecho una ejecución posterior
+        if "granularity_history" in result:
+            with self._granularity_history_lock:
+                if run_id >= self._granularity_history_run:
+                    self.granularity_history = list(result["granularity_history"])
+                    self._granularity_history_run = run_id
+        
+        # Añadir información del ámbito al resultado
+        if ambito_result.get("ambito"):
+            result["ambito"] = ambito_result["ambito"]
+            result["cubos"] = ambito_result["cubos"]
+            result["is_consulta"] = is_consulta  # Usar el parámetro directamente
+        
         return result
+    
+    def _run_workflows(self, query, is_consulta, question_embedding=None, wait_for_evaluation=False):
+        """
+        Ejecuta el grafo de ámbito y el workflow principal para una consulta.
+        
+        Args:
+            query (str): Consulta del usuario.
+            is_consulta (bool): Si está en modo consulta.
+            question_embedding: Embedding de la pregunta para la caché de respuestas.
+            wait_for_evaluation (bool): Esperar a la evaluación granular en modo diferido.
+            
+        Returns:
+            Dict: Resultado de la ejecución del agente.
+        """
+        # Primero, identificar el ámbito pasando explícitamente is_consulta
+        ambito_result = self.ambito_app.invoke({"question": query, "is_consulta": is_consulta})
+        
+        # Si necesitamos clarificación, devolver la pregunta
+        if ambito_result.get("needs_clarification"):
+            return {
+                "type": "clarification_needed",
+                "question": ambito_result["clarification_question"]
+            }
+        
+        # Consultar la caché semántica de respuestas dentro del ámbito identificado
+        cached_result = self._lookup_answer_cache(query, question_embedding, is_consulta, ambito_result)
+        if cached_result is not None:
+            return cached_result
+        
+        # Ejecutar el workflow principal con métricas
+        initial_state = self._build_workflow_state(query, is_consulta, ambito_result, wait_for_evaluation)
+        run_id = self._next_run_id()
+        on_evaluation = self._create_evaluation_callback(query, question_embedding, is_consulta, ambito_result, run_id)
+        result = self.app.invoke_with_metrics(initial_state, on_evaluation=on_evaluation)
+        
+        return self._finalize_workflow_result(result, is_consulta, ambito_result, run_id)
+    
+    async def _arun_workflows(self, query, is_consulta, question_embedding=None, wait_for_evaluation=False):
+        """
+        Versión asíncrona de _run_workflows.
+        
+        Args:
+            query (str): Consulta del usuario.
+            is_consulta (bool): Si está en modo consulta.
+            question_embedding: Embedding de la pregunta para la caché de respuestas.
+            wait_for_evaluation (bool): Esperar a la evaluación granular en modo diferido.
+            
+        Returns:
+            Dict: Resultado de la ejecución del agente.
+        """
+        ambito_result = await self.ambito_app.ainvoke({"question": query, "is_consulta": is_consulta})
+        
+        if ambito_result.get("needs_clarification"):
+            return {
+                "type": "clarification_needed",
+                "question": ambito_result["clarification_question"]
+            }
+        
+        cached_result = self._lookup_answer_cache(query, question_embedding, is_consulta, ambito_result)
+        if cached_result is not None:
+            return cached_result
+        
+        initial_state = self._build_workflow_state(query, is_consulta, ambito_result, wait_for_evaluation)
+        run_id = self._next_run_id()
+        on_evaluation = self._create_evaluation_callback(query, question_embedding, is_consulta, ambito_result, run_id)
+        result = await self.app.ainvoke_with_metrics(initial_state, on_evaluation=on_evaluation)
+        
+        return self._finalize_workflow_result(result, is_consulta, ambito_result, run_id)
 
     def _setup_adaptive_retrievers(self):
         """
@@ -361,7 +699,10 @@ class LangChainAgent:
         Limpia el historial de granularidades. Útil para empezar una nueva sesión
         o resetear el historial de estrategias probadas.
         """
-        self.granularity_history = []
+        with self._granularity_history_lock:
+            self.granularity_history = []
+            # Las evaluaciones diferidas pendientes no deben restaurar el historial
+            self._granularity_history_run = self._run_sequence
         logger.info("Historial de granularidades limpiado")
     
     def get_granularity_history(self):
@@ -371,4 +712,38 @@ class LangChainAgent:
         Returns:
             List[Dict]: Historial de granularidades
         """
-        return self.granularity_history.copy()
\ No newline at end of file
+        with self._granularity_history_lock:
+            return self.granularity_history.copy()
+    
+    def _iter_caches(self):
+        """
+        Recorre las cachés activas del agente.
+        
+        Yields:
+            Tuple[str, Any]: Nombre de la caché y objeto con método stats()
+        """
+        yield "retrieval", get_retrieval_cache()
+        if self.answer_cache is not None:
+            yield "answer", self.answer_cache
+        if self.verdict_cache is not None:
+            yield "verdict", self.verdict_cache
+        # Las cachés de embeddings se envuelven unas a otras (consultas -> documentos -> modelo)
+        embeddings = self.embeddings
+        while embeddings is not None:
+            if isinstance(embeddings, QueryEmbeddingCache):
+                yield "query_embedding", embeddings
+            elif isinstance(embeddings, CachedEmbeddings):
+                yield "embedding", embeddings
+            embeddings = getattr(embeddings, "underlying", None)
+        context_cache = getattr(self.vectorstore_handler, "_context_cache", None)
+        if context_cache is not None:
+            yield "context_generation", context_cache
+    
+    def get_cache_stats(self):
+        """
+        Obtiene los contadores de las cachés del agente para monitorización.
+        
+        Returns:
+            Dict[str, Dict]: Estadísticas por caché
+        """
+        return {name: cache.stats() for name, cache in self._iter_caches()}
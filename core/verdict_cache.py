@@ -0,0 +1,214 @@
+"""
+Caché persistente de veredictos del evaluador de relevancia.
+
+Guarda en SQLite el veredicto (yes/no) del retrieval_grader para cada par
+(pregunta normalizada, ámbito, chunk). El chunk se identifica de forma
+estable por el hash de su contenido y la colección de la que procede, de
+modo que los reintentos del workflow y las preguntas repetidas (por ejemplo,
+las reevaluaciones sobre preguntas_eval.json) no vuelven a llamar al modelo
+secundario. Las entradas de un cubo se invalidan cuando DocumentUploader
+añade o elimina una versión de ese cubo.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from langchain_core.documents import Document
+from langagent.vectorstore.document_uploader import DocumentUploader
+from langagent.vectorstore.retrieval_cache import normalize_query
+
+# Usar el sistema de logging centralizado
+from langagent.config.logging_config import get_logger
+logger = get_logger(__name__)
+
+
+class GraderVerdictCache:
+    """Almacén SQLite de veredictos de relevancia por (pregunta, ámbito, chunk)."""
+
+    def __init__(self, db_path: str, ttl_seconds: float = 0):
+        """
+        Inicializa la caché de veredictos y crea la tabla si no existe.
+
+        Args:
+            db_path: Ruta del fichero SQLite
+            ttl_seconds: Antigüedad máxima de un veredicto (0 = sin límite)
+        """
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS verdicts (
+                    key TEXT PRIMARY KEY,
+                    collection TEXT,
+                    cubo TEXT,
+                    score TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_verdicts_cubo ON verdicts (collection, cubo)")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Abre una conexión nueva por operación (las conexiones SQLite no se comparten entre hilos)."""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(question: str, ambito: Optional[str], doc: Document) -> str:
+        """
+        Construye la clave estable de un par (pregunta, chunk).
+
+        Args:
+            question: Pregunta del usuario (se normaliza)
+            ambito: Ámbito identificado para la pregunta
+            doc: Chunk recuperado
+
+        Returns:
+            str: Hash SHA-256 de la pregunta normalizada, el ámbito y el identificador del chunk
+        """
+        content_hash = hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+        collection = doc.metadata.get("retrieval_collection", "")
+        raw_key = "\x1f".join([normalize_query(question), ambito or "", collection, content_hash])
+        return hashlib.sha256(raw_key.encode("utf-8")).hexdigest()
+
+    def get_many(self, question: str, ambito: Optional[str], documents: List[Document]) -> Dict[int, str]:
+        """
+        Busca los veredictos almacenados para varios chunks.
+
+        Args:
+            question: Pregunta del usuario
+            ambito: Ámbito identificado para la pregunta
+            documents: Chunks a evaluar
+
+        Returns:
+            Dict[int, str]: Veredicto ("yes"/"no") por índice de documento encontrado en la caché
+        """
+        if not documents:
+            return {}
+
+        keys = [self.make_key(question, ambito, doc) for doc in documents]
+        placeholders = ",".join("?" for _ in keys)
+        query = f"SELECT key, score FROM verdicts WHERE key IN ({placeholders})"
+        params: List[Any] = list(keys)
+        if self.ttl_seconds:
+            query += " AND created_at >= ?"
+            params.append(time.time() - self.ttl_seconds)
+
+        try:
+            with self._lock, self._connect() as conn:
+                stored = dict(conn.execute(query, params).fetchall())
+        except sqlite3.Error as e:
+            logger.warning(f"No se pudo consultar la caché de veredictos: {e}")
+            return {}
+
+        verdicts = {idx: stored[key] for idx, key in enumerate(keys) if key in stored}
+        with self._lock:
+            self.hits += len(verdicts)
+            self.misses += len(keys) - len(verdicts)
+        return verdicts
+
+    def put_many(self, question: str, ambito: Optional[str], verdicts: List[tuple]):
+        """
+        Guarda los veredictos del evaluador.
+
+        Args:
+            question: Pregunta del usuario
+            ambito: Ámbito identificado para la pregunta
+            verdicts: Pares (documento, "yes"/"no")
+        """
+        if not verdicts:
+            return
+
+        now = time.time()
+        rows = []
+        for doc, score in verdicts:
+            cubo, _ = DocumentUploader.extract_cubo_and_version(doc.metadata.get("source", ""))
+            rows.append((
+                self.make_key(question, ambito, doc),
+                doc.metadata.get("retrieval_collection", ""),
+                cubo or "",
+                score,
+                now
+            ))
+
+        try:
+            with self._lock, self._connect() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO verdicts (key, collection, cubo, score, created_at) VALUES (?, ?, ?, ?, ?)",
+                    rows
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"No se pudieron guardar los veredictos en caché: {e}")
+
+    def invalidate(self, collection_name: Optional[str] = None, cubos: Optional[List[str]] = None):
+        """
+        Elimina los veredictos de los cubos modificados en una colección.
+
+        Args:
+            collection_name: Colección modificada (None = todas)
+            cubos: Cubos añadidos o eliminados (None = todos los de la colección)
+        """
+        query = "DELETE FROM verdicts"
+        conditions = []
+        params: List[Any] = []
+        if collection_name:
+            conditions.append("collection = ?")
+            params.append(collection_name)
+        if cubos:
+            conditions.append(f"cubo IN ({','.join('?' for _ in cubos)})")
+            params.extend(cubos)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+
+        try:
+            with self._lock, self._connect() as conn:
+                removed = conn.execute(query, params).rowcount
+        except sqlite3.Error as e:
+            logger.error(f"No se pudo invalidar la caché de veredictos: {e}")
+            return
+
+        if removed:
+            logger.info(f"Caché de veredictos invalidada ('{collection_name}', cubos {cubos}): {removed} entradas eliminadas")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Devuelve los contadores de la caché para monitorización.
+
+        Returns:
+            Dict[str, Any]: Aciertos, fallos, tasa de acierto y tamaño
+        """
+        try:
+            with self._connect() as conn:
+                size = conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+        except sqlite3.Error:
+            size = None
+
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "size": size,
+                "path": self.db_path,
+            }
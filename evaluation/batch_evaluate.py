@@ -54,7 +54,7 @@ def run_batch_evaluation(preguntas_file, output_dir, agent_config):
         logger.info(f"Procesando pregunta {i+1}/{len(preguntas)}: {pregunta}")
         try:
             # Ejecutar la consulta a través del agente
-            result = agent.run(pregunta)
+            result = agent.run(pregunta, wait_for_evaluation=True)
 
             # Capturar metadatos
             # El método 'run' ya devuelve un diccionario con toda la información.
@@ -100,7 +100,7 @@ def main():
     parser.add_argument("--output_dir", default="batch_results", help="Directorio para guardar los resultados.")
     parser.add_argument("--data_dir", help="Directorio con documentos")
     parser.add_argument("--vectorstore_dir", help="Directorio de bases vectoriales")
-    parser.add_argument("--vector_db_type", default="milvus", choices=["chroma", "milvus"], help="Tipo de vectorstore a utilizar.")
+    parser.add_argument("--vector_db_type", default="milvus", choices=["chroma", "milvus", "local"], help="Tipo de vectorstore a utilizar.")
     parser.add_argument("--modelo", help="Nombre del modelo LLM principal")
     parser.add_argument("--modelo2", help="Nombre del segundo modelo LLM")
     parser.add_argument("--modelo3", help="Nombre del tercer modelo LLM")
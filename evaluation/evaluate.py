@@ -53,7 +53,7 @@ class AgentEvaluator:
         Args:
             data_dir (str, optional): Directorio con los documentos markdown.
             vectorstore_dir (str, optional): Directorio base para las bases de datos vectoriales.
-            vector_db_type (str, optional): Tipo de vectorstore a utilizar ('chroma' o 'milvus').
+            vector_db_type (str, optional): Tipo de vectorstore a utilizar ('chroma', 'milvus' o 'local').
             local_llm (str, optional): Nombre del modelo LLM principal.
             local_llm2 (str, optional): Nombre del segundo modelo LLM.
             local_llm3 (str, optional): Nombre del tercer modelo LLM.
@@ -465,7 +465,7 @@ class AgentEvaluator:
             
             # Ejecutar el agente para obtener la respuesta
             pregunta = golden.input
-            resultado = self.agent.run(pregunta)
+            resultado = self.agent.run(pregunta, wait_for_evaluation=True)
             
             # Calcular tiempo de completado
             tiempo_completado = time.time() - tiempo_inicio
@@ -694,7 +694,7 @@ def main():
     parser.add_argument("--modelo2", help="Nombre del segundo modelo LLM")
     parser.add_argument("--modelo3", help="Nombre del tercer modelo LLM")
     parser.add_argument("--casos", help="Archivo JSON con casos de prueba")
-    parser.add_argument("--vector_db_type", default="milvus", choices=["chroma", "milvus"],
+    parser.add_argument("--vector_db_type", default="milvus", choices=["chroma", "milvus", "local"],
                        help="Tipo de vectorstore a utilizar (default: milvus)")
     
     args = parser.parse_args()
@@ -18,8 +18,7 @@ current_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if current_dir not in sys.path:
     sys.path.insert(0, current_dir)
 
-# Importar desde el módulo local
-from langagent.evaluation.evaluate import AgentEvaluator
+# Importar desde el módulo local (AgentEvaluator carga deepeval y solo se importa fuera del modo batch)
 from langagent.core.lang_chain_agent import LangChainAgent
 from langagent.config.logging_config import get_logger
 
@@ -100,7 +99,7 @@ def run_batch_evaluation(preguntas_file, output_dir, agent_config):
         logger.info(f"Procesando pregunta {i+1}/{len(preguntas)}: {pregunta}")
         try:
             # Ejecutar la consulta a través del agente
-            result = agent.run(pregunta)
+            result = agent.run(pregunta, wait_for_evaluation=True)
 
             # Capturar metadatos
             serializable_result = {}
@@ -149,7 +148,7 @@ def main():
     parser.add_argument("--salida", help="Ruta para guardar los resultados (modo deepeval)")
     parser.add_argument("--verbose", action="store_true", help="Mostrar información detallada")
     parser.add_argument("--casos", help="Archivo JSON con casos de prueba")
-    parser.add_argument("--vector_db_type", default="milvus", choices=["chroma", "milvus"],
+    parser.add_argument("--vector_db_type", default="milvus", choices=["chroma", "milvus", "local"],
                        help="Tipo de vectorstore a utilizar (default: milvus)")
     parser.add_argument("--batch", action="store_true", help="Ejecutar en modo batch para solo generar respuestas.")
     parser.add_argument("--output_dir", default="batch_results", help="Directorio para guardar los resultados en modo batch.")
@@ -172,6 +171,7 @@ def main():
         run_batch_evaluation(args.casos, args.output_dir, agent_config)
     else:
         # Lógica original de deepeval
+        from langagent.evaluation.evaluate import AgentEvaluator
         evaluador = AgentEvaluator(
             data_dir=args.data_dir,
             vectorstore_dir=args.chroma_dir,
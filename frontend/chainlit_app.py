@@ -519,8 +519,8 @@ async def on_message(message: cl.Message):
     processing_task = asyncio.create_task(update_task())
     
     try:
-        # Procesar la consulta con el agente
-        result = agent.run(user_message, is_consulta=temp_consulta_mode)
+        # Procesar la consulta con el agente sin bloquear el bucle de eventos
+        result = await agent.arun(user_message, is_consulta=temp_consulta_mode)
         
         # Detener la tarea de actualización y remover el mensaje
         processing_task.cancel()
@@ -60,7 +60,7 @@ def main():
     parser.add_argument("--local_llm", default=None, help="Modelo LLM principal")
     parser.add_argument("--local_llm2", default=None, help="Modelo LLM secundario (opcional)")
     parser.add_argument("--question", help="Pregunta a responder")
-    parser.add_argument("--vector_db_type", default="milvus", choices=["chroma", "milvus"],
+    parser.add_argument("--vector_db_type", default="milvus", choices=["chroma", "milvus", "local"],
                        help="Tipo de vectorstore a utilizar (default: milvus)")
     
     args = parser.parse_args()
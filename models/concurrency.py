@@ -0,0 +1,211 @@
+"""
+Utilidades de ejecución concurrente de cadenas LLM.
+
+Este módulo agrupa las funciones que permiten lanzar varias invocaciones de
+una misma cadena (por ejemplo, el evaluador de relevancia) de forma
+concurrente, con un límite de concurrencia y un timeout por llamada.
+
+También define los nodos "por pasos": un nodo del grafo se escribe como un
+generador que emite peticiones RunnableCall/RunnableBatch y recibe sus
+respuestas. El mismo generador se ejecuta con invoke (run_steps) o con
+ainvoke (arun_steps), de forma que cada nodo tiene una versión síncrona y
+otra asíncrona sin duplicar su lógica.
+"""
+
+import asyncio
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Generator, List, NamedTuple, Optional
+
+from langchain_core.runnables import RunnableLambda
+
+# Usar el sistema de logging centralizado
+from langagent.config.logging_config import get_logger
+logger = get_logger(__name__)
+
+
+def invoke_concurrently(runnable, inputs: List[Any], max_workers: int = 4, timeout: float = None) -> List[Any]:
+    """
+    Invoca una cadena sobre varias entradas de forma concurrente.
+
+    Cada elemento del resultado es la respuesta de la cadena o la excepción
+    producida en esa llamada (incluido un TimeoutError si la llamada supera
+    el timeout), de forma que el llamante decide cómo tratar los fallos.
+
+    El timeout se aplica como un único plazo contado desde el envío de las
+    llamadas: timeout segundos por cada tanda de max_workers llamadas. Las
+    llamadas que no terminan en ese plazo se abandonan, no se cancelan: las
+    que ya están en ejecución siguen ocupando su hilo hasta que terminan,
+    aunque nadie espera su resultado; las que aún no han empezado se descartan.
+
+    Args:
+        runnable: Cadena o runnable con método invoke.
+        inputs (List[Any]): Entradas a evaluar, una por llamada.
+        max_workers (int): Número máximo de llamadas simultáneas.
+        timeout (float): Tiempo máximo en segundos para cada llamada (None = sin límite).
+
+    Returns:
+        List[Any]: Respuestas o excepciones, en el mismo orden que las entradas.
+    """
+    if not inputs:
+        return []
+
+    max_workers = max(1, min(max_workers, len(inputs)))
+    results: List[Any] = [None] * len(inputs)
+
+    # No se usa el executor como context manager: al salir esperaría a las
+    # llamadas colgadas y el timeout no tendría efecto
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-batch")
+    try:
+        submitted_at = time.time()
+        futures = [executor.submit(runnable.invoke, item) for item in inputs]
+
+        # Las llamadas que esperan hilo libre empiezan más tarde: una tanda de timeout por cada max_workers
+        deadline = timeout * math.ceil(len(inputs) / max_workers) if timeout else None
+        _, not_done = wait(futures, timeout=deadline)
+
+        for idx, future in enumerate(futures):
+            if future in not_done:
+                future.cancel()
+                results[idx] = TimeoutError(f"La llamada superó el timeout de {timeout}s")
+                logger.warning(f"Llamada {idx + 1}/{len(inputs)} abandonada por timeout "
+                               f"(plazo de {deadline:.1f}s, transcurridos {time.time() - submitted_at:.1f}s)")
+                continue
+            try:
+                results[idx] = future.result()
+            except Exception as e:
+                results[idx] = e
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return results
+
+
+async def ainvoke_concurrently(runnable, inputs: List[Any], max_workers: int = 4, timeout: float = None) -> List[Any]:
+    """
+    Versión asíncrona de invoke_concurrently basada en ainvoke.
+
+    Args:
+        runnable: Cadena o runnable con método ainvoke.
+        inputs (List[Any]): Entradas a evaluar, una por llamada.
+        max_workers (int): Número máximo de llamadas simultáneas.
+        timeout (float): Tiempo máximo en segundos para cada llamada (None = sin límite).
+
+    Returns:
+        List[Any]: Respuestas o excepciones, en el mismo orden que las entradas.
+    """
+    if not inputs:
+        return []
+
+    semaphore = asyncio.Semaphore(max(1, max_workers))
+
+    async def call(idx, item):
+        async with semaphore:
+            try:
+                if timeout:
+                    return await asyncio.wait_for(runnable.ainvoke(item), timeout=timeout)
+                return await runnable.ainvoke(item)
+            except asyncio.TimeoutError:
+                logger.warning(f"Llamada {idx + 1}/{len(inputs)} cancelada por timeout ({timeout}s)")
+                return TimeoutError(f"La llamada superó el timeout de {timeout}s")
+            except Exception as e:
+                return e
+
+    return list(await asyncio.gather(*(call(idx, item) for idx, item in enumerate(inputs))))
+
+
+class RunnableCall(NamedTuple):
+    """Petición de invocar un runnable (cadena o retriever) emitida por un nodo por pasos."""
+    runnable: Any
+    input: Any
+    kwargs: Optional[Dict[str, Any]] = None
+
+
+class RunnableBatch(NamedTuple):
+    """Petición de invocar un runnable sobre varias entradas de forma concurrente."""
+    runnable: Any
+    inputs: List[Any]
+    max_concurrency: int = 4
+    timeout: Optional[float] = None
+
+
+def run_steps(steps: Generator) -> Any:
+    """
+    Ejecuta de forma síncrona un generador de pasos de nodo.
+
+    Las excepciones de cada petición se lanzan dentro del generador para que
+    el propio nodo las gestione con su try/except habitual.
+
+    Args:
+        steps (Generator): Generador que emite RunnableCall/RunnableBatch.
+
+    Returns:
+        Any: Valor devuelto por el generador (estado actualizado del nodo).
+    """
+    try:
+        request = next(steps)
+        while True:
+            try:
+                if isinstance(request, RunnableBatch):
+                    response = invoke_concurrently(
+                        request.runnable, request.inputs,
+                        max_workers=request.max_concurrency, timeout=request.timeout
+                    )
+                else:
+                    response = request.runnable.invoke(request.input, **(request.kwargs or {}))
+            except Exception as e:
+                request = steps.throw(e)
+            else:
+                request = steps.send(response)
+    except StopIteration as stop:
+        return stop.value
+
+
+async def arun_steps(steps: Generator) -> Any:
+    """
+    Ejecuta de forma asíncrona un generador de pasos de nodo usando ainvoke.
+
+    Args:
+        steps (Generator): Generador que emite RunnableCall/RunnableBatch.
+
+    Returns:
+        Any: Valor devuelto por el generador (estado actualizado del nodo).
+    """
+    try:
+        request = next(steps)
+        while True:
+            try:
+                if isinstance(request, RunnableBatch):
+                    response = await ainvoke_concurrently(
+                        request.runnable, request.inputs,
+                        max_workers=request.max_concurrency, timeout=request.timeout
+                    )
+                else:
+                    response = await request.runnable.ainvoke(request.input, **(request.kwargs or {}))
+            except Exception as e:
+                request = steps.throw(e)
+            else:
+                request = steps.send(response)
+    except StopIteration as stop:
+        return stop.value
+
+
+def create_step_node(steps_fn: Callable[[Dict[str, Any]], Generator], name: str) -> RunnableLambda:
+    """
+    Crea un nodo de LangGraph con versión síncrona y asíncrona a partir de un generador de pasos.
+
+    Args:
+        steps_fn (Callable): Función que recibe el estado y devuelve el generador de pasos.
+        name (str): Nombre del nodo.
+
+    Returns:
+        RunnableLambda: Nodo que usa invoke con graph.invoke y ainvoke con graph.ainvoke.
+    """
+    def sync_node(state):
+        return run_steps(steps_fn(state))
+
+    async def async_node(state):
+        return await arun_steps(steps_fn(state))
+
+    return RunnableLambda(sync_node, afunc=async_node, name=name)
@@ -0,0 +1,310 @@
+"""
+Empaquetado del contexto de generación con presupuesto de tokens.
+
+Este módulo construye el contexto que recibe el nodo generate a partir de los
+documentos relevantes. Los documentos se recorren en el orden de
+recuperación (fusión híbrida o reranking incluidos) y se añaden mientras
+quepan en el presupuesto de tokens de la estrategia de chunk actual. Antes de añadir un documento se elimina el texto
+que ya aparece en los documentos seleccionados de la misma fuente: el solape
+del 10% que introduce el text splitter entre chunks consecutivos y los chunks
+contenidos en otros de mayor granularidad.
+"""
+
+import functools
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from langagent.config.config import LLM_CONFIG, WORKFLOW_CONFIG
+
+# Usar el sistema de logging centralizado
+from langagent.config.logging_config import get_logger
+logger = get_logger(__name__)
+
+
+class PackedContext(NamedTuple):
+    """Resultado del empaquetado del contexto."""
+    context_docs: List[str]   # Bloques de texto de cada documento incluido
+    token_count: int          # Tokens del contexto empaquetado
+    dropped: int              # Documentos descartados por presupuesto o duplicados
+    trimmed_chars: int        # Caracteres eliminados por solape entre chunks
+
+
+@functools.lru_cache(maxsize=4)
+def _load_tokenizer(tokenizer_model: str):
+    """
+    Carga el tokenizador de Hugging Face del modelo principal.
+
+    Args:
+        tokenizer_model (str): Identificador del tokenizador en Hugging Face o ruta local
+
+    Returns:
+        Tokenizador o None si no se puede cargar
+    """
+    try:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(tokenizer_model)
+        logger.info(f"Tokenizador cargado para el empaquetado de contexto: {tokenizer_model}")
+        return tokenizer
+    except Exception as e:
+        logger.warning(f"No se pudo cargar el tokenizador '{tokenizer_model}': {e}")
+        return None
+
+
+def _estimate_tokens(text: str) -> int:
+    """Estimación de 4 caracteres por token que usa MetricsCollector."""
+    return len(text) // 4
+
+
+def create_token_counter(tokenizer_model: Optional[str] = None) -> Callable[[str], int]:
+    """
+    Crea la función de conteo de tokens del contexto.
+
+    Usa el tokenizador del modelo principal (LLM_CONFIG["tokenizer_model"]) y,
+    si no está configurado o no se puede cargar, la estimación de 4 caracteres
+    por token que usa MetricsCollector. El tokenizador se carga en el primer
+    conteo, no al crear el workflow, para no retrasar el arranque del agente.
+
+    Args:
+        tokenizer_model (str, optional): Identificador del tokenizador en Hugging Face o ruta local
+
+    Returns:
+        Callable[[str], int]: Función que devuelve el número de tokens de un texto
+    """
+    tokenizer_model = tokenizer_model or LLM_CONFIG.get("tokenizer_model")
+    state = {}
+
+    def count_tokens(text: str) -> int:
+        if "counter" not in state:
+            tokenizer = _load_tokenizer(tokenizer_model) if tokenizer_model else None
+            if tokenizer is None:
+                logger.warning("Empaquetado de contexto sin tokenizador (LLM_CONFIG['tokenizer_model']): "
+                               "los tokens se estiman como caracteres / 4")
+                state["counter"] = _estimate_tokens
+            else:
+                state["counter"] = lambda value: len(tokenizer.encode(value, add_special_tokens=False))
+        return state["counter"](text)
+
+    return count_tokens
+
+
+def _overlap_length(left: str, right: str, min_overlap: int) -> int:
+    """
+    Calcula el solape más largo entre el final de un texto y el inicio de otro.
+
+    Usa la función de fallos de KMP sobre el inicio de right y recorre el final
+    de left una sola vez, de modo que el coste es lineal en la longitud de los
+    textos en lugar de probar cada longitud de solape posible.
+
+    Args:
+        left (str): Texto cuyo final se compara
+        right (str): Texto cuyo inicio se compara
+        min_overlap (int): Longitud mínima para considerar que hay solape
+
+    Returns:
+        int: Longitud del solape (0 si es menor que min_overlap)
+    """
+    max_overlap = min(len(left), len(right)) // 2
+    if max_overlap < max(min_overlap, 1):
+        return 0
+
+    pattern = right[:max_overlap]
+    failure = [0] * len(pattern)
+    matched = 0
+    for i in range(1, len(pattern)):
+        while matched and pattern[i] != pattern[matched]:
+            matched = failure[matched - 1]
+        if pattern[i] == pattern[matched]:
+            matched += 1
+        failure[i] = matched
+
+    # Al terminar, matched es el prefijo más largo de right que es sufijo de left
+    matched = 0
+    for char in left[-max_overlap:]:
+        if matched == len(pattern):
+            matched = failure[matched - 1]
+        while matched and char != pattern[matched]:
+            matched = failure[matched - 1]
+        if char == pattern[matched]:
+            matched += 1
+
+    return matched if matched >= min_overlap else 0
+
+
+def format_document(idx: int, doc: Any, content: Optional[str] = None) -> str:
+    """
+    Da formato a un documento para incluirlo en el contexto de generación.
+
+    Args:
+        idx (int): Posición del documento en el contexto (empezando en 0)
+        doc: Document de LangChain o texto de reintento
+        content (str, optional): Contenido a usar en lugar de page_content (tras recortar solapes)
+
+    Returns:
+        str: Bloque de texto del documento
+    """
+    if isinstance(doc, str):
+        return f"\n[DOCUMENTO {idx+1} - Contenido de reintento]\n{content if content is not None else doc}\n"
+
+    if hasattr(doc, 'metadata') and hasattr(doc, 'page_content'):
+        doc_source = doc.metadata.get('cubo_source', 'Desconocido')
+        doc_id = doc.metadata.get('doc_id', f'doc_{idx}')
+        doc_content = content if content is not None else doc.page_content
+        generated_context = doc.metadata.get('context_generation', '')
+        ambito_doc = doc.metadata.get('ambito', 'Desconocido')
+
+        # Si existe context_generation y no está vacío, añadirlo antes del contenido
+        context_info = ""
+        if generated_context.strip():
+            context_info = f"\n[CONTEXTO: {generated_context}]\n"
+
+        return f"\n[DOCUMENTO {idx+1} - {doc_source} - ID: {doc_id} - Ambito: {ambito_doc}]{context_info}\n{doc_content}\n"
+
+    logger.warning(f"Advertencia: Documento {idx+1} tiene tipo inesperado: {type(doc)}")
+    return f"\n[DOCUMENTO {idx+1} - Tipo inesperado]\n{str(doc)}\n"
+
+
+class ContextPacker:
+    """Selecciona y deduplica documentos para el contexto dentro de un presupuesto de tokens."""
+
+    def __init__(self, token_counter: Optional[Callable[[str], int]] = None,
+                 budgets: Optional[Dict[str, int]] = None, default_budget: Optional[int] = None,
+                 min_overlap: Optional[int] = None):
+        """
+        Inicializa el empaquetador de contexto.
+
+        Args:
+            token_counter: Función de conteo de tokens (por defecto, la del modelo principal)
+            budgets: Presupuesto de tokens por estrategia de chunk
+            default_budget: Presupuesto para estrategias sin valor específico
+            min_overlap: Longitud mínima en caracteres para recortar un solape entre chunks
+        """
+        self.count_tokens = token_counter or create_token_counter()
+        self.budgets = budgets if budgets is not None else WORKFLOW_CONFIG.get("context_token_budget", {})
+        self.default_budget = default_budget or WORKFLOW_CONFIG.get("context_token_budget_default", 4500)
+        self.min_overlap = min_overlap or WORKFLOW_CONFIG.get("context_dedup_min_overlap", 20)
+
+    def get_budget(self, chunk_strategy: Optional[str]) -> int:
+        """
+        Obtiene el presupuesto de tokens de una estrategia de chunk.
+
+        Args:
+            chunk_strategy (str): Estrategia de chunk actual
+
+        Returns:
+            int: Presupuesto de tokens
+        """
+        return self.budgets.get(str(chunk_strategy), self.default_budget)
+
+    @staticmethod
+    def _rank(documents: List[Any]) -> List[Any]:
+        """
+        Ordena los documentos por su posición en la recuperación.
+
+        Solo se ordena por puntuación de relevancia cuando todos los documentos
+        vienen de una búsqueda densa pura sin reordenar (retrieval_order "score");
+        con búsqueda híbrida o cross encoder la puntuación es la densa y no
+        refleja el orden de la fusión o del reranking, que se conserva.
+        """
+        metadatas = [doc.metadata if hasattr(doc, "metadata") else {} for doc in documents]
+        if documents and all(metadata.get("retrieval_score_type") == "relevance"
+                             and metadata.get("retrieval_order") == "score" for metadata in metadatas):
+            order = sorted(range(len(documents)), key=lambda idx: metadatas[idx]["retrieval_score"], reverse=True)
+        else:
+            # Orden estable: los documentos sin posición (reintentos) mantienen su lugar relativo al final
+            order = sorted(range(len(documents)), key=lambda idx: metadatas[idx].get("retrieval_rank", float("inf")))
+        return [documents[idx] for idx in order]
+
+    def _dedup(self, content: str, source: Optional[str], selected: List[Dict[str, Any]]):
+        """
+        Elimina del contenido el texto ya presente en los documentos seleccionados de la misma fuente.
+
+        Args:
+            content (str): Contenido del documento candidato
+            source (str): Fuente del documento candidato
+            selected (List[Dict]): Documentos ya seleccionados
+
+        Returns:
+            Tuple[Optional[str], List[Dict]]: Contenido recortado (None si está contenido en otro
+            documento) y documentos seleccionados que el candidato contiene por completo
+        """
+        replaced = []
+        for entry in selected:
+            if entry["source"] != source:
+                continue
+            existing = entry["content"]
+            if content.strip() in existing:
+                return None, []
+
+            # Un chunk de menor granularidad contenido en el candidato se sustituye por este
+            if existing.strip() in content:
+                replaced.append(entry)
+                continue
+
+            # Solape entre el final de un chunk seleccionado y el inicio del candidato
+            overlap = _overlap_length(existing, content, self.min_overlap)
+            if overlap:
+                content = content[overlap:]
+
+            # Solape entre el final del candidato y el inicio de un chunk seleccionado
+            overlap = _overlap_length(content, existing, self.min_overlap)
+            if overlap:
+                content = content[:-overlap]
+
+            if not content.strip():
+                return None, []
+        return content, replaced
+
+    def pack(self, documents: List[Any], chunk_strategy: Optional[str] = None) -> PackedContext:
+        """
+        Empaqueta los documentos en el contexto de generación.
+
+        Args:
+            documents (List): Documentos relevantes (Document o texto de reintento)
+            chunk_strategy (str): Estrategia de chunk actual (determina el presupuesto)
+
+        Returns:
+            PackedContext: Bloques de contexto, tokens totales y estadísticas del empaquetado
+        """
+        budget = self.get_budget(chunk_strategy)
+        selected: List[Dict[str, Any]] = []
+        used_tokens = 0
+        dropped = 0
+        trimmed_chars = 0
+
+        for doc in self._rank(documents):
+            is_document = hasattr(doc, "metadata") and hasattr(doc, "page_content")
+            original = doc.page_content if is_document else str(doc)
+            source = doc.metadata.get("source") if is_document else None
+
+            content, replaced = self._dedup(original, source, selected)
+            if content is None:
+                logger.debug("Documento descartado: su contenido ya está en el contexto")
+                dropped += 1
+                continue
+
+            block = format_document(len(selected), doc, content)
+            block_tokens = self.count_tokens(block)
+            freed_tokens = sum(entry["tokens"] for entry in replaced)
+
+            # El primer documento se incluye siempre para no dejar el contexto vacío
+            if selected and used_tokens - freed_tokens + block_tokens > budget:
+                dropped += 1
+                continue
+
+            for entry in replaced:
+                selected.remove(entry)
+                trimmed_chars -= entry["trimmed"]
+                dropped += 1
+            selected.append({
+                "doc": doc, "source": source, "content": content,
+                "tokens": block_tokens, "trimmed": len(original) - len(content)
+            })
+            trimmed_chars += len(original) - len(content)
+            used_tokens += block_tokens - freed_tokens
+
+        # Renumerar los bloques en el orden final
+        context_docs = [format_document(idx, entry["doc"], entry["content"]) for idx, entry in enumerate(selected)]
+
+        logger.info(f"Contexto empaquetado: {len(context_docs)}/{len(documents)} documentos, "
+                    f"{used_tokens}/{budget} tokens, {trimmed_chars} caracteres de solape eliminados")
+
+        return PackedContext(context_docs, used_tokens, dropped, trimmed_chars)
@@ -9,7 +9,6 @@ from langchain_ollama import ChatOllama
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.prompts import PromptTemplate
 from langchain_core.runnables import RunnablePassthrough
-from langchain_community.utilities import SQLDatabase
 from langchain_core.runnables import RunnableParallel, RunnablePassthrough
 from langagent.prompts import get_prompt, PROMPTS
 from langagent.config.config import LLM_CONFIG, SQL_CONFIG
@@ -29,7 +28,8 @@ def _get_prompt_template(llm, prompt_key: str):
     except KeyError:
         raise ValueError(f"No prompt found for model '{model_name}' and key '{prompt_key}'")
 
-def create_llm(model_name: str = None, temperature: float = None, format: str = None, max_tokens: int = None):
+def create_llm(model_name: str = None, temperature: float = None, format: str = None, max_tokens: int = None,
+               streaming: bool = None):
     """
     Crea un modelo de lenguaje basado en Ollama.
     
@@ -38,6 +38,8 @@ def create_llm(model_name: str = None, temperature: float = None, format: str =
         temperature (float, optional): Temperatura para la generación (0-1).
         format (str, optional): Formato de salida ('json' u otro).
         max_tokens (int, optional): Número máximo de tokens para la generación.
+        streaming (bool, optional): Permitir la emisión de tokens en streaming (astream/astream_events).
+            Con invoke el resultado es el mismo; solo cambia si hay un consumidor de streaming.
         
     Returns:
         ChatOllama: Modelo de lenguaje configurado.
@@ -47,6 +49,7 @@ def create_llm(model_name: str = None, temperature: float = None, format: str =
     temperature = temperature if temperature is not None else LLM_CONFIG["model_temperature"]
     format = format or LLM_CONFIG["model_format"]
     max_tokens = max_tokens if max_tokens is not None else LLM_CONFIG["max_tokens"]
+    streaming = streaming if streaming is not None else LLM_CONFIG.get("streaming", False)
     
     return ChatOllama(
         model=model_name, 
@@ -54,7 +57,7 @@ def create_llm(model_name: str = None, temperature: float = None, format: str =
         temperature=temperature,
         max_tokens=max_tokens,
         timeout=10,  # Timeout de 60 segundos para evitar bloqueos
-        streaming=False  # Desactivar streaming para evitar problemas de compatibilidad
+        streaming=streaming  # Desactivado por defecto para evitar problemas de compatibilidad
     )
 
 
@@ -73,6 +76,9 @@ def create_rag_sql_chain(llm, db_uri=SQL_CONFIG["db_uri"], dialect=SQL_CONFIG["d
     Returns:
         dict: Diccionario con dos cadenas - 'answer_chain' para RAG y 'sql_query_chain' para generar SQL.
     """
+    # SQLAlchemy y el driver de la base de datos solo se cargan si se usa la cadena SQL
+    from langchain_community.utilities import SQLDatabase
+    
     # Crear la conexión a la base de datos
     db = SQLDatabase.from_uri(db_uri)
     # Obtener información del esquema
@@ -150,6 +156,52 @@ def create_context_generator(llm):
     
     return context_generator_chain
 
+def format_context_batch_chunks(chunks: list) -> str:
+    """
+    Da formato numerado a los chunks de una petición de contexto por lotes.
+    
+    Args:
+        chunks (list): Textos de los chunks
+        
+    Returns:
+        str: Chunks numerados desde 1
+    """
+    return "\n\n".join(f"[CHUNK {idx}]\n{chunk}" for idx, chunk in enumerate(chunks, start=1))
+
+def create_batch_context_generator(llm):
+    """
+    Crea un generador de contexto que procesa varios chunks de un documento en una sola llamada.
+    
+    El documento completo se envía una única vez junto con los chunks numerados
+    y el modelo devuelve un array JSON con un contexto por chunk, de modo que
+    el coste de procesar el documento se reparte entre todos los chunks.
+    
+    Args:
+        llm: Modelo de lenguaje a utilizar.
+        
+    Returns:
+        Chain: Cadena que recibe {"document", "chunks", "chunk_size"} y devuelve {"contexts": [...]}.
+    """
+    prompt_template = _get_prompt_template(llm, "context_generator_batch")
+    prompt = PromptTemplate(
+        template=prompt_template,
+        input_variables=["document", "chunks", "chunk_count", "chunk_size"],
+    )
+    
+    batch_context_generator_chain = (
+        {
+            "document": lambda x: x["document"],
+            "chunks": lambda x: format_context_batch_chunks(x["chunks"]),
+            "chunk_count": lambda x: len(x["chunks"]),
+            "chunk_size": lambda x: x.get("chunk_size", 512)
+        }
+        | prompt 
+        | llm 
+        | JsonOutputParser()
+    )
+    
+    return batch_context_generator_chain
+
 def create_rag_chain(llm):
     """
     Crea una cadena de RAG (Retrieval Augmented Generation).
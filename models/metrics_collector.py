@@ -12,6 +12,7 @@ import json
 import time
 import uuid
 import psutil  # Para obtener información de memoria
+from contextvars import ContextVar
 from typing import Dict, Any, Optional, List
 from pathlib import Path
 from threading import Lock
@@ -21,6 +22,26 @@ from langagent.config.config import CHUNK_STRATEGY_CONFIG
 
 logger = get_logger(__name__)
 
+
+def _run_attribute(name: str) -> property:
+    """
+    Crea una propiedad que lee y escribe un campo de la ejecución de workflow en curso.
+    
+    Args:
+        name: Nombre del campo en el estado de la ejecución
+        
+    Returns:
+        property: Propiedad asociada al campo
+    """
+    def getter(self):
+        return self._current_run()[name]
+    
+    def setter(self, value):
+        self._current_run()[name] = value
+    
+    return property(getter, setter)
+
+
 class MetricsCollector:
     """
     Recolector de métricas para el workflow de LangGraph.
@@ -40,6 +61,15 @@ class MetricsCollector:
         # Agrega más mapeos según sea necesario
     }
     
+    # Estado de la ejecución en curso. Se guarda en una variable de contexto para
+    # que varias ejecuciones concurrentes (LangChainAgent.arun) no se mezclen.
+    question_id = _run_attribute("question_id")
+    workflow_start_time = _run_attribute("workflow_start_time")
+    workflow_data = _run_attribute("workflow_data")
+    node_executions = _run_attribute("node_executions")
+    llm_calls = _run_attribute("llm_calls")
+    cache_snapshots = _run_attribute("cache_snapshots")
+    
     def __init__(self, base_metrics_dir: str = "metrics"):
         """
         Inicializa el recolector de métricas.
@@ -48,11 +78,17 @@ class MetricsCollector:
             base_metrics_dir: Directorio base para almacenar métricas
         """
         self.base_metrics_dir = Path(base_metrics_dir)
+        self._run_state = ContextVar(f"metrics_run_{id(self)}", default=None)
+        self._default_run = self._new_run_state()
         self.question_id = None
         self.workflow_start_time = None
         self.workflow_data = {}
         self.node_executions = []
         self.llm_calls = []  # Lista para almacenar llamadas a LLM
+        self.cache_snapshots = {}  # Contadores de las cachés al inicio del workflow
+        
+        # Cachés registradas (nombre -> objeto con stats())
+        self._caches: Dict[str, Any] = {}
         
         # Lock para operaciones thread-safe
         self._lock = Lock()
@@ -79,12 +115,34 @@ class MetricsCollector:
             'memory_mb', 'success'
         ]
         
+        # Headers de las métricas de caché (aciertos y fallos durante cada workflow)
+        self.cache_metrics_headers = [
+            'timestamp', 'question_id', 'cache_name', 'hits', 'misses', 'hit_rate'
+        ]
+        
         # Crear directorios base
         self._ensure_directories()
         
         logger.info(f"MetricsCollector inicializado con directorio base: {self.base_metrics_dir}")
         logger.info(f"Mapeo de modelos disponible: {self.get_model_mapping()}")
     
+    @staticmethod
+    def _new_run_state() -> Dict[str, Any]:
+        """Crea el estado vacío de una ejecución de workflow."""
+        return {
+            "question_id": None,
+            "workflow_start_time": None,
+            "workflow_data": {},
+            "node_executions": [],
+            "llm_calls": [],
+            "cache_snapshots": {},
+        }
+    
+    def _current_run(self) -> Dict[str, Any]:
+        """Devuelve el estado de la ejecución asociada al contexto actual."""
+        run = self._run_state.get()
+        return run if run is not None else self._default_run
+    
     def _ensure_directories(self):
         """Crea los directorios necesarios para las métricas."""
         
@@ -106,6 +164,7 @@ class MetricsCollector:
             node_metrics_file = strategy_dir / 'node_metrics.csv'
             workflow_metrics_file = strategy_dir / 'workflow_metrics.csv'
             llm_metrics_file = strategy_dir / 'llm_metrics.csv'
+            cache_metrics_file = strategy_dir / 'cache_metrics.csv'
             
             if not node_metrics_file.exists():
                 with open(node_metrics_file, 'w', newline='', encoding='utf-8') as f:
@@ -121,6 +180,11 @@ class MetricsCollector:
                 with open(llm_metrics_file, 'w', newline='', encoding='utf-8') as f:
                     writer = csv.writer(f)
                     writer.writerow(self.llm_metrics_headers)
+            
+            if not cache_metrics_file.exists():
+                with open(cache_metrics_file, 'w', newline='', encoding='utf-8') as f:
+                    writer = csv.writer(f)
+                    writer.writerow(self.cache_metrics_headers)
         
         logger.info(f"Directorios creados exitosamente para {len(all_strategies)} estrategias")
     
@@ -140,6 +204,7 @@ class MetricsCollector:
             node_metrics_file = strategy_dir / 'node_metrics.csv'
             workflow_metrics_file = strategy_dir / 'workflow_metrics.csv'
             llm_metrics_file = strategy_dir / 'llm_metrics.csv'
+            cache_metrics_file = strategy_dir / 'cache_metrics.csv'
             
             if not node_metrics_file.exists():
                 with open(node_metrics_file, 'w', newline='', encoding='utf-8') as f:
@@ -155,6 +220,11 @@ class MetricsCollector:
                 with open(llm_metrics_file, 'w', newline='', encoding='utf-8') as f:
                     writer = csv.writer(f)
                     writer.writerow(self.llm_metrics_headers)
+            
+            if not cache_metrics_file.exists():
+                with open(cache_metrics_file, 'w', newline='', encoding='utf-8') as f:
+                    writer = csv.writer(f)
+                    writer.writerow(self.cache_metrics_headers)
     
     def start_workflow(self, question: str, chunk_strategy: str = "512", is_adaptive: bool = False):
         """
@@ -166,10 +236,13 @@ class MetricsCollector:
             is_adaptive: Si se está usando estrategia adaptativa
         """
         with self._lock:
+            # Cada workflow tiene su propio estado en el contexto de ejecución actual
+            self._run_state.set(self._new_run_state())
             self.question_id = str(uuid.uuid4())
             self.workflow_start_time = time.time()
             self.node_executions = []
             self.llm_calls = []
+            self.cache_snapshots = self._snapshot_caches()
             
             # Determinar la estrategia correcta con prefijo si es adaptativa
             if is_adaptive and not chunk_strategy.startswith('E'):
@@ -324,7 +397,8 @@ class MetricsCollector:
             'timestamp': time.time()
         }
     
-    def end_node(self, node_context: Dict[str, Any], state: Dict[str, Any], success: bool = True):
+    def end_node(self, node_context: Dict[str, Any], state: Dict[str, Any], success: bool = True,
+                 context_tokens: Optional[int] = None):
         """
         Finaliza la medición de un nodo y registra las métricas.
         
@@ -332,6 +406,7 @@ class MetricsCollector:
             node_context: Contexto devuelto por start_node
             state: Estado actual del workflow
             success: Indica si el nodo se ejecutó correctamente
+            context_tokens: Tokens del contexto medidos con el tokenizador (sustituye a la estimación)
         """
         try:
             end_time = time.time()
@@ -359,6 +434,9 @@ class MetricsCollector:
                 # Estimación simple de tokens (aproximadamente 4 caracteres por token)
                 context_size_tokens = context_size_chars // 4
             
+            if context_tokens is not None:
+                context_size_tokens = context_tokens
+            
             retry_attempt = state.get('retry_count', 0)
             chunk_strategy = state.get('chunk_strategy', '512')
             
@@ -459,6 +537,7 @@ class MetricsCollector:
             # Escribir métricas finales del workflow
             strategy_dir = self._get_current_strategy_dir()
             self._write_workflow_metrics(strategy_dir)
+            self._write_cache_metrics(strategy_dir)
             
             logger.info(f"Workflow {self.question_id} finalizado en {total_execution_time_ms:.2f}ms")
             
@@ -472,6 +551,77 @@ class MetricsCollector:
                 self.workflow_data = {}
                 self.node_executions = []
                 self.llm_calls = []
+                self.cache_snapshots = {}
+    
+    def register_cache(self, name: str, cache: Any):
+        """
+        Registra una caché para anotar sus aciertos y fallos en cada workflow.
+        
+        Args:
+            name: Nombre de la caché en cache_metrics.csv
+            cache: Objeto con contadores hits y misses
+        """
+        with self._lock:
+            self._caches[name] = cache
+        logger.info(f"Caché '{name}' registrada en las métricas")
+    
+    def _snapshot_caches(self) -> Dict[str, Dict[str, int]]:
+        """
+        Lee los contadores de aciertos y fallos de las cachés registradas.
+        
+        Solo se leen los contadores en memoria: stats() de las cachés persistentes
+        cuenta las filas de SQLite y no debe ejecutarse en cada workflow (el
+        tamaño de las cachés se consulta en /cache/stats).
+        
+        Returns:
+            Dict[str, Dict[str, int]]: Aciertos y fallos por caché
+        """
+        return {
+            name: {'hits': getattr(cache, 'hits', 0), 'misses': getattr(cache, 'misses', 0)}
+            for name, cache in list(self._caches.items())
+        }
+    
+    def _write_cache_metrics(self, chunk_strategy: str):
+        """
+        Escribe los aciertos y fallos de cada caché registrada durante el workflow.
+        
+        Con varios workflows concurrentes los contadores de las cachés
+        compartidas incluyen también la actividad de los demás.
+        
+        Args:
+            chunk_strategy: Estrategia de chunking final
+        """
+        if not self._caches:
+            return
+        
+        try:
+            self._ensure_strategy_directory(chunk_strategy)
+            cache_metrics_file = self.base_metrics_dir / chunk_strategy / 'cache_metrics.csv'
+            
+            start_snapshots = self.cache_snapshots or {}
+            rows = []
+            for name, current in self._snapshot_caches().items():
+                start = start_snapshots.get(name, {})
+                hits = current.get('hits', 0) - start.get('hits', 0)
+                misses = current.get('misses', 0) - start.get('misses', 0)
+                rows.append({
+                    'timestamp': self.workflow_start_time,
+                    'question_id': self.question_id,
+                    'cache_name': name,
+                    'hits': hits,
+                    'misses': misses,
+                    'hit_rate': round(hits / (hits + misses), 4) if hits + misses else 0.0
+                })
+            
+            write_header = not cache_metrics_file.exists()
+            with open(cache_metrics_file, 'a', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=self.cache_metrics_headers)
+                if write_header:
+                    writer.writeheader()
+                writer.writerows(rows)
+                
+        except Exception as e:
+            logger.error(f"Error al escribir métricas de caché: {str(e)}")
     
     def _write_node_metrics(self, metrics: Dict[str, Any], chunk_strategy: str):
         """
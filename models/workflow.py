@@ -10,10 +10,10 @@ from typing import List, Dict, Any, Optional, Tuple
 from typing_extensions import TypedDict
 from langchain_core.documents import Document
 from langgraph.graph import StateGraph, END
-from langchain_community.utilities import SQLDatabase
-from langchain_community.tools.sql_database.tool import QuerySQLDatabaseTool
 import json
 import re
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from contextvars import copy_context
 from langagent.config.config import WORKFLOW_CONFIG, VECTORSTORE_CONFIG, SQL_CONFIG
 from langagent.models.constants import (
     AMBITOS_CUBOS, CUBO_TO_AMBITO, AMBITO_KEYWORDS, 
@@ -29,6 +29,10 @@ from langagent.models.workflow_utils import (
     extract_sql_query_from_response, check_metrics_success, should_terminate_workflow,
     execute_sql_query
 )
+from langagent.models.concurrency import RunnableCall, RunnableBatch, create_step_node, run_steps
+from langagent.vectorstore.retrieval_cache import CachedRetriever
+from langagent.vectorstore.scored_retriever import ScoredRetriever
+from langagent.models.context_packer import ContextPacker, format_document
 from langagent.models.query_analysis import (
     analyze_segeda_query_complexity, suggest_alternative_strategy_mog,
     update_granularity_history_entry
@@ -63,6 +67,8 @@ class GraphState(TypedDict):
         evaluation_metrics: métricas granulares del evaluador
         came_from_clarification: indica si la pregunta viene de una clarificación previa
         granularity_history: histórico de granularidades probadas
+        speculative_results: documentos recuperados especulativamente por estrategia
+        wait_for_evaluation: en modo de evaluación diferida, evaluar y reintentar dentro del workflow
     """
     question: str
     rewritten_question: str
@@ -84,12 +90,14 @@ class GraphState(TypedDict):
     evaluation_metrics: Dict[str, Any]  # Nuevo campo para métricas granulares
     came_from_clarification: bool  # Nuevo campo para query rewriting condicional
     granularity_history: List[Dict[str, Any]]
+    speculative_results: Dict[str, Any]  # Resultados de recuperación especulativa por estrategia
+    wait_for_evaluation: bool  # Opt-in para evaluación síncrona con reintentos en modo diferido
 
 
 
 
 
-def create_workflow(retriever, retrieval_grader, granular_evaluator, query_rewriter=None, rag_sql_chain=None, sql_interpretation_chain=None, adaptive_retrievers=None, metrics_collector=None, collection_name=None):
+def create_workflow(retriever, retrieval_grader, granular_evaluator, query_rewriter=None, rag_sql_chain=None, sql_interpretation_chain=None, adaptive_retrievers=None, metrics_collector=None, collection_name=None, verdict_cache=None):
     """
     Crea un flujo de trabajo para el agente utilizando LangGraph con recuperación adaptativa y recolección de métricas.
     
@@ -103,6 +111,7 @@ def create_workflow(retriever, retrieval_grader, granular_evaluator, query_rewri
         adaptive_retrievers: Diccionario de retrievers por estrategia {"256": retriever, "512": retriever, "1024": retriever}.
         metrics_collector: Recolector de métricas para análisis de rendimiento.
         collection_name: Nombre de la colección para extraer la estrategia inicial (debe contener _256, _512, o _1024).
+        verdict_cache: Caché persistente de veredictos del evaluador de relevancia (opcional).
         
     Returns:
         StateGraph: Grafo de estado configurado con recuperación adaptativa y métricas.
@@ -111,6 +120,9 @@ def create_workflow(retriever, retrieval_grader, granular_evaluator, query_rewri
     if metrics_collector is None:
         metrics_collector = MetricsCollector()
     
+    # Empaquetador del contexto de generación (presupuesto de tokens y deduplicación)
+    context_packer = ContextPacker() if WORKFLOW_CONFIG.get("context_packing_enabled", True) else None
+    
     # Extraer estrategia inicial del nombre de la colección
     initial_chunk_strategy = CHUNK_STRATEGY_CONFIG["default_strategy"]  # Fallback por defecto
     if collection_name:
@@ -147,7 +159,7 @@ def create_workflow(retriever, retrieval_grader, granular_evaluator, query_rewri
         try:
             if query_rewriter:
                 # Ejecutar el rewriter
-                rewrite_result = query_rewriter.invoke({"question": question})
+                rewrite_result = yield RunnableCall(query_rewriter, {"question": question})
                 
                 # Registrar llamada LLM si el resultado tiene metadatos
                 metrics_collector.log_llm_call("rewrite_query", rewrite_result, question, success=True)
@@ -212,6 +224,136 @@ def create_workflow(retriever, retrieval_grader, granular_evaluator, query_rewri
                 state["rewritten_question"] = state["question"]
             return "retrieve"
 
+    def invoke_retriever(current_retriever, query, filters):
+        """
+        Ejecuta un retriever aplicando los filtros de metadatos.
+        
+        Args:
+            current_retriever: Retriever a utilizar.
+            query (str): Consulta de búsqueda.
+            filters (dict): Filtros de metadatos (ámbito, is_consulta).
+            
+        Returns:
+            List[Document]: Documentos recuperados.
+        """
+        if filters:
+            logger.info(f"Aplicando filtros para {VECTORSTORE_CONFIG.get('vector_db_type', 'chroma')}: {filters}")
+            return current_retriever.invoke(query, filter=filters)
+        return current_retriever.invoke(query)
+    
+    def search_with_embedding(current_retriever, query, query_embedding, filters):
+        """
+        Busca con un embedding de consulta ya calculado cuando el retriever lo permite.
+        
+        Solo los retrievers vectoriales simples (sin compresión contextual) admiten
+        búsqueda por vector; para el resto, o si la búsqueda por vector falla (por
+        ejemplo en colecciones híbridas que necesitan el texto para BM25), se usa
+        la invocación normal del retriever.
+        
+        Args:
+            current_retriever: Retriever a utilizar.
+            query (str): Consulta de búsqueda.
+            query_embedding (List[float]): Embedding de la consulta (o None).
+            filters (dict): Filtros de metadatos.
+            
+        Returns:
+            List[Document]: Documentos recuperados.
+        """
+        # Los retrievers cacheados consultan la caché antes de buscar
+        if isinstance(current_retriever, CachedRetriever):
+            return current_retriever.get_or_compute(
+                query,
+                filters or None,
+                lambda: search_with_embedding(current_retriever.retriever, query, query_embedding, filters)
+            )
+        
+        vectorstore = getattr(current_retriever, "vectorstore", None)
+        search_kwargs = getattr(current_retriever, "search_kwargs", None)
+        
+        if query_embedding is not None and vectorstore is not None and search_kwargs is not None:
+            try:
+                use_filters = bool(filters)
+                
+                # Los retrievers con puntuación conservan el score en los metadatos
+                if isinstance(current_retriever, ScoredRetriever):
+                    if use_filters:
+                        return current_retriever.search_by_vector(query_embedding, filter=filters)
+                    return current_retriever.search_by_vector(query_embedding)
+                
+                k = search_kwargs.get("k", VECTORSTORE_CONFIG.get("k_retrieval", 4))
+                if use_filters:
+                    return vectorstore.similarity_search_by_vector(query_embedding, k=k, filter=filters)
+                return vectorstore.similarity_search_by_vector(query_embedding, k=k)
+            except Exception as e:
+                logger.debug(f"Búsqueda por vector no disponible, usando invoke: {e}")
+        
+        return invoke_retriever(current_retriever, query, filters)
+    
+    def mark_retrieval_order(docs, current_retriever):
+        """
+        Guarda en los metadatos la posición final de cada documento recuperado.
+        
+        El orden que devuelve el retriever (fusión híbrida o reordenación del
+        cross encoder) es el que respeta el empaquetado del contexto. Con
+        compresión contextual el orden ya no es el de la puntuación densa.
+        
+        Args:
+            docs (List[Document]): Documentos en el orden devuelto por el retriever.
+            current_retriever: Retriever utilizado.
+        """
+        base_retriever = current_retriever.retriever if isinstance(current_retriever, CachedRetriever) else current_retriever
+        reranked = hasattr(base_retriever, "base_compressor")
+        for rank, doc in enumerate(docs):
+            if not hasattr(doc, "metadata"):
+                continue
+            doc.metadata["retrieval_rank"] = rank
+            if reranked:
+                doc.metadata["retrieval_order"] = "rank"
+    
+    def speculative_retrieve(query, filters):
+        """
+        Consulta en paralelo todas las colecciones adaptativas con un único embedding de la consulta.
+        
+        Args:
+            query (str): Consulta de búsqueda.
+            filters (dict): Filtros de metadatos.
+            
+        Returns:
+            Dict[str, List[Document]]: Documentos recuperados por estrategia.
+        """
+        strategies = list(adaptive_retrievers.keys())
+        logger.info(f"Recuperación especulativa en {len(strategies)} colecciones: {strategies}")
+        
+        # Calcular el embedding de la consulta una sola vez
+        query_embedding = None
+        for strategy_retriever in adaptive_retrievers.values():
+            if isinstance(strategy_retriever, CachedRetriever):
+                strategy_retriever = strategy_retriever.retriever
+            embeddings = getattr(getattr(strategy_retriever, "vectorstore", None), "embeddings", None)
+            if embeddings is not None:
+                try:
+                    query_embedding = embeddings.embed_query(query)
+                except Exception as e:
+                    logger.warning(f"No se pudo calcular el embedding compartido: {e}")
+                break
+        
+        results = {}
+        with ThreadPoolExecutor(max_workers=len(strategies)) as executor:
+            futures = {
+                executor.submit(search_with_embedding, adaptive_retrievers[strategy], query, query_embedding, filters): strategy
+                for strategy in strategies
+            }
+            for future in as_completed(futures):
+                strategy = futures[future]
+                try:
+                    results[strategy] = future.result()
+                    logger.info(f"Estrategia {strategy}: {len(results[strategy])} documentos")
+                except Exception as e:
+                    # La estrategia fallida se volverá a consultar si llega a usarse
+                    logger.error(f"Error en recuperación especulativa para {strategy}: {e}")
+        
+        return results
+
     def retrieve(state):
         """
         Recupera documentos relevantes para la pregunta.
@@ -260,17 +402,34 @@ def create_workflow(retriever, retrieval_grader, granular_evaluator, query_rewri
             if is_consulta:
                 filters["is_consulta"] = "true"
             
-            vector_db_type = VECTORSTORE_CONFIG.get("vector_db_type", "chroma")
-            
-            # Solo aplicar filtros si no es Chroma
-            if vector_db_type.lower() == "chroma" and filters:
-                logger.info(f"⚠️  Vector DB es Chroma - filtros omitidos para mejor compatibilidad: {filters}")
-                docs = current_retriever.invoke(rewritten_question)
-            elif filters:
-                logger.info(f"Aplicando filtros para {vector_db_type}: {filters}")
-                docs = current_retriever.invoke(rewritten_question, filter=filters)
+            speculative_results = state.get("speculative_results") or {}
+            speculative_enabled = (
+                VECTORSTORE_CONFIG.get("speculative_adaptive_retrieval", False)
+                and bool(adaptive_retrievers)
+            )
+            speculative_status = None
+            
+            # Reutilizar los resultados especulativos si corresponden a la misma búsqueda
+            if (speculative_enabled
+                    and speculative_results.get("query") == rewritten_question
+                    and speculative_results.get("filters") == filters
+                    and chunk_strategy in speculative_results.get("results", {})):
+                docs = list(speculative_results["results"][chunk_strategy])
+                speculative_status = "reused"
+                logger.info(f"Reutilizando resultados especulativos para la estrategia {chunk_strategy} tokens")
+            elif speculative_enabled and retry_count == 0:
+                speculative_results = {
+                    "query": rewritten_question,
+                    "filters": filters,
+                    "results": speculative_retrieve(rewritten_question, filters)
+                }
+                speculative_status = "computed"
+                if chunk_strategy in speculative_results["results"]:
+                    docs = list(speculative_results["results"][chunk_strategy])
+                else:
+                    docs = invoke_retriever(current_retriever, rewritten_question, filters)
             else:
-                docs = current_retriever.invoke(rewritten_question)
+                docs = invoke_retriever(current_retriever, rewritten_question, filters)
                 
             logger.info(f"Documentos recuperados: {len(docs)}")
             
@@ -280,11 +439,15 @@ def create_workflow(retriever, retrieval_grader, granular_evaluator, query_rewri
                 logger.info(f"Limitando a {max_docs} documentos (de {len(docs)} recuperados)")
                 docs = docs[:max_docs]
             
+            mark_retrieval_order(docs, current_retriever)
+            
             retrieval_details = {
                 "count": len(docs),
                 "ambito": ambito,
                 "first_doc_snippet": docs[0].page_content[:100] + "..." if docs else "No documents retrieved"
             }
+            if speculative_status:
+                retrieval_details["speculative"] = speculative_status
             
             result_state = {
                 "documents": docs,
@@ -295,6 +458,8 @@ def create_workflow(retriever, retrieval_grader, granular_evaluator, query_rewri
                 "retrieval_details": retrieval_details,
                 "chunk_strategy": chunk_strategy
             }
+            if speculative_status == "computed":
+                result_state["speculative_results"] = speculative_results
             
             # Finalizar medición del nodo
             metrics_collector.end_node(node_context, result_state, success=True)
@@ -318,6 +483,55 @@ def create_workflow(retriever, retrieval_grader, granular_evaluator, query_rewri
             
             return error_state
 
+    def build_grader_input(doc, question, ambito):
+        """
+        Construye la entrada del evaluador de relevancia para un documento.
+        
+        Args:
+            doc (Document): Documento a evaluar.
+            question (str): Pregunta del usuario.
+            ambito (str): Ámbito identificado para la pregunta.
+            
+        Returns:
+            dict: Entrada para el retrieval_grader.
+        """
+        metadata = doc.metadata
+        return {
+            "content": doc.page_content,
+            "ambito_document": str(metadata[ambito]) if ambito in metadata else "",
+            "source": metadata.get("source", "unknown"),
+            "question": question,
+            "ambito": ambito,
+        }
+
+    def prefilter_by_score(doc):
+        """
+        Decide si un documento puede aceptarse o rechazarse sin consultar al evaluador LLM.
+        
+        Usa la puntuación de relevancia normalizada que el retriever guarda en
+        metadata["retrieval_score"]. Las búsquedas híbridas de Chroma y Milvus
+        guardan la similitud densa de cada resultado; las puntuaciones sin
+        normalizar no se comparan con los umbrales.
+        
+        Args:
+            doc (Document): Documento recuperado.
+            
+        Returns:
+            Optional[str]: "accept", "reject" o None si debe evaluarlo el LLM.
+        """
+        if not VECTORSTORE_CONFIG.get("score_prefilter_enabled", False):
+            return None
+        
+        score = doc.metadata.get("retrieval_score")
+        if score is None or doc.metadata.get("retrieval_score_type") != "relevance":
+            return None
+        
+        if score >= VECTORSTORE_CONFIG.get("score_auto_accept_threshold", 0.85):
+            return "accept"
+        if score < VECTORSTORE_CONFIG.get("score_auto_reject_threshold", 0.3):
+            return "reject"
+        return None
+
     def grade_relevance(state):
         """
         Evalúa la relevancia de los documentos recuperados.
@@ -345,57 +559,86 @@ def create_workflow(retriever, retrieval_grader, granular_evaluator, query_rewri
             relevant_docs = []
             logger.info(f"Evaluando relevancia de {len(documents)} documentos...")
             
+            # Prefiltrado por puntuación de similitud: solo la banda intermedia pasa por el LLM
+            decisions = [prefilter_by_score(doc) for doc in documents]
+            graded_indices = [idx for idx, decision in enumerate(decisions) if decision is None]
+            auto_accepted = decisions.count("accept")
+            auto_rejected = decisions.count("reject")
+            if auto_accepted or auto_rejected:
+                logger.info(f"Prefiltrado por puntuación: {auto_accepted} aceptados, {auto_rejected} rechazados, "
+                            f"{len(graded_indices)} enviados al evaluador")
+            
+            # Reutilizar los veredictos ya emitidos para los mismos pares (pregunta, chunk)
+            cached_verdicts = {}
+            if verdict_cache is not None and graded_indices:
+                found = verdict_cache.get_many(question, ambito, [documents[idx] for idx in graded_indices])
+                cached_verdicts = {graded_indices[position]: score for position, score in found.items()}
+                if cached_verdicts:
+                    logger.info(f"Caché de veredictos: {len(cached_verdicts)} documentos sin llamar al evaluador")
+                    graded_indices = [idx for idx in graded_indices if idx not in cached_verdicts]
+            
+            grader_inputs = [build_grader_input(documents[idx], question, ambito) for idx in graded_indices]
+            
+            if WORKFLOW_CONFIG.get("concurrent_grading", True) and len(grader_inputs) > 1:
+                max_concurrency = WORKFLOW_CONFIG.get("grading_max_concurrency", 4)
+                logger.info(f"Evaluación concurrente con hasta {max_concurrency} llamadas simultáneas")
+                relevances = yield RunnableBatch(
+                    retrieval_grader,
+                    grader_inputs,
+                    max_concurrency=max_concurrency,
+                    timeout=WORKFLOW_CONFIG.get("grading_timeout", 30)
+                )
+            else:
+                relevances = []
+                for position, grader_input in enumerate(grader_inputs):
+                    logger.info(f"Evaluando documento {graded_indices[position] + 1}/{len(documents)}")
+                    try:
+                        relevances.append((yield RunnableCall(retrieval_grader, grader_input)))
+                    except Exception as doc_error:
+                        relevances.append(doc_error)
+            
+            graded = dict(zip(graded_indices, relevances))
+            
+            if verdict_cache is not None:
+                verdict_cache.put_many(question, ambito, [
+                    (documents[idx], relevance["score"].lower())
+                    for idx, relevance in graded.items()
+                    if isinstance(relevance, dict) and str(relevance.get("score", "")).lower() in ("yes", "no")
+                ])
+            
             for idx, doc in enumerate(documents):
-                logger.info(f"Evaluando documento {idx + 1}/{len(documents)}")
-                
-                try:
-                    document_data = {
-                        "content": doc.page_content,
-                        "metadata": doc.metadata,
-                        "source": doc.metadata.get("source", "unknown")
-                    }
-                    
-                    # Añadir timeout/protección para evitar recursión infinita
-                    logger.debug(f"Llamando a retrieval_grader para documento {idx + 1}")
-                    
-                    grader_input = {
-                        "content": document_data["content"],
-                        "ambito_document": str(document_data["metadata"][ambito]) if ambito in document_data["metadata"] else "",
-                        "source": document_data["source"],
-                        "question": question,
-                        "ambito": ambito,
-                    }
-                    
-                    logger.debug(f"=== INPUT PARA RETRIEVAL GRADER ===")
-                    logger.debug(f"Tipo de grader_input: {type(grader_input)}")
-                    logger.debug(f"Claves en grader_input: {list(grader_input.keys())}")
-                    
-                    relevance = retrieval_grader.invoke(grader_input)
-                    
-                    logger.debug(f"=== OUTPUT DEL RETRIEVAL GRADER ===")
-                    logger.debug(f"Tipo de relevance: {type(relevance)}")
-                    logger.debug(f"Contenido de relevance: {relevance}")
-                    if hasattr(relevance, '__dict__'):
-                        logger.debug(f"Dict de relevance: {relevance.__dict__}")
-                    if hasattr(relevance, 'response_metadata'):
-                        logger.debug(f"response_metadata de relevance: {relevance.response_metadata}")
-                    
-                    # Registrar llamada LLM para el grader de relevancia
-                    metrics_collector.log_llm_call("grade_relevance", relevance, f"Documento {idx + 1}", success=True)
-                    
-                    logger.debug(f"Relevancia evaluada para documento {idx + 1}: {relevance}")
-                    
-                    if isinstance(relevance, dict) and relevance.get("score", "").lower() == "yes":
+                if decisions[idx] == "accept":
+                    logger.debug(f"Documento {idx + 1} aceptado por puntuación ({doc.metadata.get('retrieval_score'):.3f})")
+                    relevant_docs.append(doc)
+                    continue
+                if decisions[idx] == "reject":
+                    logger.debug(f"Documento {idx + 1} rechazado por puntuación ({doc.metadata.get('retrieval_score'):.3f})")
+                    continue
+                if idx in cached_verdicts:
+                    if cached_verdicts[idx] == "yes":
                         relevant_docs.append(doc)
-                        logger.debug(f"Documento {idx + 1} marcado como relevante")
-                    else:
-                        logger.debug(f"Documento {idx + 1} marcado como no relevante")
-                        
-                except Exception as doc_error:
-                    logger.error(f"Error al evaluar relevancia del documento {idx + 1}: {str(doc_error)}")
+                    logger.debug(f"Documento {idx + 1}: veredicto en caché '{cached_verdicts[idx]}'")
+                    continue
+                
+                relevance = graded[idx]
+                if isinstance(relevance, Exception):
+                    logger.error(f"Error al evaluar relevancia del documento {idx + 1}: {str(relevance)}")
+                    metrics_collector.log_llm_call("grade_relevance", {}, f"Documento {idx + 1}", success=False)
                     # En caso de error, incluir el documento (enfoque conservativo)
                     relevant_docs.append(doc)
                     logger.info(f"Documento {idx + 1} incluido por defecto debido a error en evaluación")
+                    continue
+                
+                # Registrar llamada LLM para el grader de relevancia
+                metrics_collector.log_llm_call("grade_relevance", relevance, f"Documento {idx + 1}", success=True)
+                
+                logger.debug(f"Relevancia evaluada para documento {idx + 1}: {relevance}")
+                
+                if isinstance(relevance, dict) and relevance.get("score", "").lower() == "yes":
+                    relevant_docs.append(doc)
+                    logger.debug(f"Documento {idx + 1} marcado como relevante")
+                else:
+                    logger.debug(f"Documento {idx + 1} marcado como no relevante")
             
             # Si no hay documentos relevantes, usar todos
             if not relevant_docs and documents:
@@ -405,7 +648,11 @@ def create_workflow(retriever, retrieval_grader, granular_evaluator, query_rewri
             # Actualizar detalles de recuperación
             retrieval_details.update({
                 "relevant_count": len(relevant_docs),
-                "relevance_checked": True
+                "relevance_checked": True,
+                "score_auto_accepted": auto_accepted,
+                "score_auto_rejected": auto_rejected,
+                "cached_verdicts": len(cached_verdicts),
+                "llm_graded_count": len(graded_indices)
             })
             
             result_state = {
@@ -481,36 +728,21 @@ def create_workflow(retriever, retrieval_grader, granular_evaluator, query_rewri
         try:
             logger.info("Creando contexto a partir de los documentos recuperados...")
             # Crear contexto a partir de los documentos
-            context_docs = []
-            for idx, doc in enumerate(documents):
-                # Verificar si doc es un Document o un string
-                if isinstance(doc, str):
-                    # Si es un string, usarlo directamente como contexto
-                    doc_string = f"\n[DOCUMENTO {idx+1} - Contenido de reintento]\n{doc}\n"
-                    context_docs.append(doc_string)
-                elif hasattr(doc, 'metadata') and hasattr(doc, 'page_content'):
-                    # Si es un Document válido, procesar normalmente
-                    doc_source = doc.metadata.get('cubo_source', 'Desconocido')
-                    doc_id = doc.metadata.get('doc_id', f'doc_{idx}')
-                    
-                    # Usar el contexto generado si está disponible, de lo contrario usar el contenido original
-                    doc_content = doc.page_content
-                    generated_context = doc.metadata.get('context_generation', '')
-                    ambito_doc = doc.metadata.get('ambito', 'Desconocido')
-                    
-                    # Si existe context_generation y no está vacío, añadirlo antes del contenido
-                    context_info = ""
-                    if generated_context.strip():
-                        context_info = f"\n[CONTEXTO: {generated_context}]\n"
-                    
-                    # Crear string con la info del documento
-                    doc_string = f"\n[DOCUMENTO {idx+1} - {doc_source} - ID: {doc_id} - Ambito: {ambito_doc}]{context_info}\n{doc_content}\n"
-                    context_docs.append(doc_string)
-                else:
-                    # Si no es ni string ni Document válido, convertir a string
-                    logger.warning(f"Advertencia: Documento {idx+1} tiene tipo inesperado: {type(doc)}")
-                    doc_string = f"\n[DOCUMENTO {idx+1} - Tipo inesperado]\n{str(doc)}\n"
-                    context_docs.append(doc_string)
+            context_tokens = None
+            if context_packer is not None:
+                # Seleccionar en orden de recuperación dentro del presupuesto de tokens y eliminar solapes
+                packed = context_packer.pack(documents, state.get("chunk_strategy"))
+                context_docs = packed.context_docs
+                context_tokens = packed.token_count
+                retrieval_details = {
+                    **retrieval_details,
+                    "packed_documents": len(context_docs),
+                    "packed_tokens": packed.token_count,
+                    "packing_dropped": packed.dropped,
+                    "packing_trimmed_chars": packed.trimmed_chars
+                }
+            else:
+                context_docs = [format_document(idx, doc) for idx, doc in enumerate(documents)]
             
             # Crear el contexto completo como string
             context = "\n".join(context_docs)
@@ -539,7 +771,7 @@ def create_workflow(retriever, retrieval_grader, granular_evaluator, query_rewri
                 }
                 logger.info(f"Input para SQL query chain: context length={len(clean_context)}, question='{clean_question}'")
                 
-                sql_query = rag_sql_chain["sql_query_chain"].invoke(sql_input)
+                sql_query = yield RunnableCall(rag_sql_chain["sql_query_chain"], sql_input)
                 
                 # Registrar llamada LLM para SQL query generation
                 metrics_collector.log_llm_call("generate", sql_query, clean_context[:500] + "...", success=True)
@@ -577,7 +809,7 @@ def create_workflow(retriever, retrieval_grader, granular_evaluator, query_rewri
                 logger.debug(f"Claves en rag_input: {list(rag_input.keys())}")
                 logger.debug(f"Contenido de rag_input: {rag_input}")
                 
-                response = rag_sql_chain["answer_chain"].invoke(rag_input)
+                response = yield RunnableCall(rag_sql_chain["answer_chain"], rag_input)
                 
                 logger.debug(f"=== OUTPUT DEL RAG ANSWER CHAIN ===")
                 logger.debug(f"Tipo de response: {type(response)}")
@@ -616,7 +848,7 @@ def create_workflow(retriever, retrieval_grader, granular_evaluator, query_rewri
             }
             
             # Finalizar medición del nodo
-            metrics_collector.end_node(node_context, result_state, success=True)
+            metrics_collector.end_node(node_context, result_state, success=True, context_tokens=context_tokens)
             
             return result_state
             
@@ -691,7 +923,7 @@ def create_workflow(retriever, retrieval_grader, granular_evaluator, query_rewri
                 logger.debug(f"Tipo de evaluator_input: {type(evaluator_input)}")
                 logger.debug(f"Claves en evaluator_input: {list(evaluator_input.keys())}")
                 
-                evaluation_result = granular_evaluator.invoke(evaluator_input)
+                evaluation_result = yield RunnableCall(granular_evaluator, evaluator_input)
                 
                 logger.debug(f"=== OUTPUT DEL GRANULAR EVALUATOR ===")
                 logger.debug(f"Tipo de evaluation_result: {type(evaluation_result)}")
@@ -714,8 +946,10 @@ def create_workflow(retriever, retrieval_grader, granular_evaluator, query_rewri
                     evaluation_metrics = evaluation_result
                 else:
                     logger.warning(f"Advertencia: Evaluación granular no válida: {evaluation_result}")
-                    # Valores por defecto si falla la evaluación
+                    # Valores por defecto si falla la evaluación ("default" los distingue de
+                    # una evaluación real, p. ej. para no admitir la respuesta en la caché)
                     evaluation_metrics = {
+                        "default": True,
                         "faithfulness": 0.8,
                         "context_precision": 0.8,
                         "context_recall": 0.8,
@@ -731,6 +965,7 @@ def create_workflow(retriever, retrieval_grader, granular_evaluator, query_rewri
                 # Para consultas SQL, asumimos métricas altas
                 logger.info("Consulta SQL - usando métricas por defecto altas")
                 evaluation_metrics = {
+                    "default": True,
                     "faithfulness": 0.9,
                     "context_precision": 0.9,
                     "context_recall": 0.9,
@@ -762,6 +997,7 @@ def create_workflow(retriever, retrieval_grader, granular_evaluator, query_rewri
             error_state = {
                 **state,
                 "evaluation_metrics": {
+                    "default": True,
                     "faithfulness": 0.5,
                     "context_precision": 0.5,
                     "context_recall": 0.5,
@@ -856,7 +1092,7 @@ def create_workflow(retriever, retrieval_grader, granular_evaluator, query_rewri
                 }
                 logger.info(f"Input para interpretación SQL: context length={len(clean_context)}")
                 
-                response = sql_interpretation_chain.invoke(interpretation_input)
+                response = yield RunnableCall(sql_interpretation_chain, interpretation_input)
                 
                 # Registrar llamada LLM para interpretación SQL
                 metrics_collector.log_llm_call("generate_sql_interpretation", response, clean_question, success=True)
@@ -1232,6 +1468,22 @@ def create_workflow(retriever, retrieval_grader, granular_evaluator, query_rewri
             "chunk_strategy": new_strategy
         }
 
+    def needs_deferred_evaluation(state):
+        """
+        Indica si la evaluación granular de un estado debe ejecutarse en segundo plano.
+        
+        Args:
+            state (dict): Estado del grafo tras generate.
+            
+        Returns:
+            bool: True si la respuesta se devuelve sin esperar a la evaluación
+        """
+        if WORKFLOW_CONFIG.get("evaluation_mode", "inline") != "deferred" or state.get("wait_for_evaluation"):
+            return False
+        if state.get("is_consulta", False) and rag_sql_chain:
+            return False
+        return not state.get("evaluation_metrics")
+
     def increment_retry_count(state):
         """
         Incrementa el contador de reintentos antes de volver a retrieve.
@@ -1361,16 +1613,18 @@ def create_workflow(retriever, retrieval_grader, granular_evaluator, query_rewri
             
             return error_state    # Añadir nodos al grafo
     workflow.add_node("entry_point", lambda state: state)  # Nodo dummy para entrada condicional
-    workflow.add_node("rewrite_query", rewrite_query)
+    # Los nodos con llamadas a LLM son generadores de pasos: se ejecutan con invoke
+    # o con ainvoke según se use compiled_workflow.invoke o compiled_workflow.ainvoke
+    workflow.add_node("rewrite_query", create_step_node(rewrite_query, "rewrite_query"))
     workflow.add_node("retrieve", retrieve)
-    workflow.add_node("grade_relevance", grade_relevance)
-    workflow.add_node("generate", generate)
-    workflow.add_node("evaluate_response_granular", evaluate_response_granular)
+    workflow.add_node("grade_relevance", create_step_node(grade_relevance, "grade_relevance"))
+    workflow.add_node("generate", create_step_node(generate, "generate"))
+    workflow.add_node("evaluate_response_granular", create_step_node(evaluate_response_granular, "evaluate_response_granular"))
     workflow.add_node("update_granularity_history", update_granularity_history)
     workflow.add_node("update_chunk_strategy", update_chunk_strategy)
     workflow.add_node("increment_retry_count", increment_retry_count)
     workflow.add_node("execute_query", execute_query_with_metrics)
-    workflow.add_node("generate_sql_interpretation", generate_sql_interpretation)
+    workflow.add_node("generate_sql_interpretation", create_step_node(generate_sql_interpretation, "generate_sql_interpretation"))
 
     # Definir entrada condicional - flujo con query rewriting condicional
     workflow.set_entry_point("entry_point")
@@ -1385,7 +1639,35 @@ def create_workflow(retriever, retrieval_grader, granular_evaluator, query_rewri
     workflow.add_edge("rewrite_query", "retrieve")
     workflow.add_edge("retrieve", "grade_relevance")
     workflow.add_edge("grade_relevance", "generate")
-    workflow.add_edge("generate", "evaluate_response_granular")
+    
+    def route_after_generate(state):
+        """
+        Decide si la evaluación granular se ejecuta dentro del workflow o en segundo plano.
+        
+        En modo "deferred" las respuestas RAG terminan tras generate y se evalúan
+        después de devolverlas, salvo que el llamante pida esperar a la evaluación
+        (wait_for_evaluation), en cuyo caso se mantienen la evaluación y los reintentos.
+        Las consultas SQL siempre siguen el camino completo.
+        
+        Args:
+            state (dict): Estado actual del grafo.
+            
+        Returns:
+            str: Siguiente nodo a ejecutar
+        """
+        if needs_deferred_evaluation(state):
+            logger.info("Evaluación granular diferida: devolviendo la primera generación")
+            return "END"
+        return "evaluate_response_granular"
+    
+    workflow.add_conditional_edges(
+        "generate",
+        route_after_generate,
+        {
+            "evaluate_response_granular": "evaluate_response_granular",
+            "END": END
+        }
+    )
     workflow.add_edge("evaluate_response_granular", "update_granularity_history")
     workflow.add_edge("update_chunk_strategy", "increment_retry_count")
     workflow.add_edge("increment_retry_count", "retrieve")
@@ -1476,16 +1758,15 @@ def create_workflow(retriever, retrieval_grader, granular_evaluator, query_rewri
         interrupt_after=None
     )
     
-    # Crear función wrapper para el workflow que maneje las métricas
-    def workflow_with_metrics(input_data):
+    # Configuración de ejecución con límite de recursión más alto para permitir reintentos
+    run_config = {"recursion_limit": 50}
+    
+    def start_workflow_run(input_data):
         """
-        Ejecuta el workflow con recolección de métricas integrada.
+        Completa el estado inicial e inicia la recolección de métricas del workflow.
         
         Args:
-            input_data: Datos de entrada del workflow
-            
-        Returns:
-            Resultado del workflow con métricas recopiladas
+            input_data: Datos de entrada del workflow (se completan en el sitio)
         """
         # Extraer datos iniciales
         question = input_data.get("question", "")
@@ -1510,27 +1791,186 @@ def create_workflow(retriever, retrieval_grader, granular_evaluator, query_rewri
         
         # Iniciar recolección de métricas con detección de estrategia adaptativa
         metrics_collector.start_workflow(question, chunk_strategy, is_adaptive=is_adaptive)
+    
+    def fail_workflow_run(input_data, e):
+        """
+        Registra en las métricas un workflow terminado con error.
+        
+        Args:
+            input_data: Datos de entrada del workflow
+            e: Excepción producida
+        """
+        logger.error(f"Error en la ejecución del workflow: {str(e)}")
+        error_state = input_data.copy()
+        error_state.update({"generation": f"Error en workflow: {str(e)}", "success": False})
+        metrics_collector.end_workflow(error_state, success=False)
+    
+    # Evaluaciones granulares diferidas pendientes
+    evaluation_executor = ThreadPoolExecutor(
+        max_workers=WORKFLOW_CONFIG.get("deferred_evaluation_workers", 2),
+        thread_name_prefix="deferred-eval"
+    )
+    pending_evaluations = set()
+    
+    def run_deferred_evaluation(state, on_evaluation):
+        """
+        Evalúa en segundo plano una respuesta ya devuelta y cierra sus métricas.
+        
+        Se ejecuta dentro de una copia del contexto de la ejecución original, de
+        modo que las métricas del nodo y de la llamada LLM se asocian a la pregunta
+        correcta aunque el llamante ya haya empezado otra.
         
+        Args:
+            state (dict): Estado final devuelto al llamante (se trabaja sobre una copia)
+            on_evaluation (Callable, optional): Función que recibe el estado evaluado
+        """
+        evaluated_state = dict(state)
         try:
-            # Ejecutar el workflow con configuración explícita de recursión
-            config = {"recursion_limit": 50}  # Límite de recursión más alto para permitir reintentos
-            result = compiled_workflow.invoke(input_data, config=config)
+            evaluated_state = run_steps(evaluate_response_granular(evaluated_state))
+            evaluated_state = update_granularity_history(evaluated_state)
             
-            # Finalizar métricas con éxito
-            metrics_collector.end_workflow(result, success=True)
+            if route_next_strategy(evaluated_state) == "UPDATE_HISTORY_AND_RETRY":
+                logger.info("Evaluación diferida por debajo de los umbrales: no se reintenta (wait_for_evaluation desactivado)")
             
+            metrics_collector.end_workflow(evaluated_state, success=True)
+        except Exception as e:
+            logger.error(f"Error en la evaluación granular diferida: {str(e)}")
+            metrics_collector.end_workflow(evaluated_state, success=False)
+            return evaluated_state
+        
+        if on_evaluation is not None:
+            try:
+                on_evaluation(evaluated_state)
+            except Exception as e:
+                logger.error(f"Error al notificar la evaluación diferida: {str(e)}")
+        
+        return evaluated_state
+    
+    def finish_workflow_run(result, on_evaluation=None):
+        """
+        Cierra las métricas de una ejecución o lanza su evaluación diferida.
+        
+        Args:
+            result (dict): Estado final del workflow
+            on_evaluation (Callable, optional): Función que recibe el estado evaluado
+            
+        Returns:
+            dict: Estado final con evaluation_pending si la evaluación sigue en curso
+        """
+        if not needs_deferred_evaluation(result):
+            metrics_collector.end_workflow(result, success=True)
+            if on_evaluation is not None:
+                on_evaluation(result)
             return result
+        
+        context = copy_context()
+        future = evaluation_executor.submit(context.run, run_deferred_evaluation, result, on_evaluation)
+        pending_evaluations.add(future)
+        future.add_done_callback(pending_evaluations.discard)
+        
+        return {**result, "evaluation_pending": True}
+    
+    def wait_for_evaluations(timeout=None):
+        """
+        Espera a que terminen las evaluaciones diferidas pendientes.
+        
+        Args:
+            timeout (float, optional): Tiempo máximo de espera en segundos
+            
+        Returns:
+            int: Número de evaluaciones que siguen pendientes
+        """
+        _, not_done = wait(list(pending_evaluations), timeout=timeout)
+        return len(not_done)
+    
+    # Crear función wrapper para el workflow que maneje las métricas
+    def workflow_with_metrics(input_data, on_evaluation=None):
+        """
+        Ejecuta el workflow con recolección de métricas integrada.
+        
+        Args:
+            input_data: Datos de entrada del workflow
+            on_evaluation: Función que recibe el estado final una vez evaluado
+                (inmediatamente o al terminar la evaluación diferida)
+            
+        Returns:
+            Resultado del workflow con métricas recopiladas
+        """
+        start_workflow_run(input_data)
+        
+        try:
+            result = compiled_workflow.invoke(input_data, config=run_config)
+            
+            # Finalizar métricas con éxito (o tras la evaluación diferida)
+            return finish_workflow_run(result, on_evaluation)
+            
+        except Exception as e:
+            fail_workflow_run(input_data, e)
+            raise e
+    
+    async def aworkflow_with_metrics(input_data, on_evaluation=None):
+        """
+        Versión asíncrona de workflow_with_metrics basada en ainvoke.
+        
+        Las métricas de cada ejecución se guardan en el contexto de la tarea,
+        por lo que varias ejecuciones concurrentes no se mezclan.
+        
+        Args:
+            input_data: Datos de entrada del workflow
+            on_evaluation: Función que recibe el estado final una vez evaluado
+            
+        Returns:
+            Resultado del workflow con métricas recopiladas
+        """
+        start_workflow_run(input_data)
+        
+        try:
+            result = await compiled_workflow.ainvoke(input_data, config=run_config)
+            
+            # Finalizar métricas con éxito (o tras la evaluación diferida)
+            return finish_workflow_run(result, on_evaluation)
             
         except Exception as e:
-            logger.error(f"Error en la ejecución del workflow: {str(e)}")
-            # Finalizar métricas con error
-            error_state = input_data.copy()
-            error_state.update({"generation": f"Error en workflow: {str(e)}", "success": False})
-            metrics_collector.end_workflow(error_state, success=False)
+            fail_workflow_run(input_data, e)
+            raise e
+    
+    async def astream_events_with_metrics(input_data, on_evaluation=None):
+        """
+        Ejecuta el workflow con astream_events y recolección de métricas integrada.
+        
+        Reenvía todos los eventos de LangGraph (inicio/fin de nodos, tokens del LLM...)
+        y cierra las métricas con el estado final del grafo.
+        
+        Args:
+            input_data: Datos de entrada del workflow
+            on_evaluation: Función que recibe el estado final una vez evaluado
+            
+        Yields:
+            Dict: Eventos de astream_events (versión v2)
+        """
+        start_workflow_run(input_data)
+        finished = False
+        
+        try:
+            async for event in compiled_workflow.astream_events(input_data, config=run_config, version="v2"):
+                # El evento de fin sin padres corresponde al grafo completo
+                if event["event"] == "on_chain_end" and not event.get("parent_ids"):
+                    event["data"]["output"] = finish_workflow_run(event["data"].get("output") or {}, on_evaluation)
+                    finished = True
+                yield event
             
+            if not finished:
+                metrics_collector.end_workflow(input_data, success=False)
+            
+        except Exception as e:
+            fail_workflow_run(input_data, e)
             raise e
-      # Retornar el workflow compilado con la función de métricas
+    
+    # Retornar el workflow compilado con las funciones de métricas
     compiled_workflow.invoke_with_metrics = workflow_with_metrics
+    compiled_workflow.ainvoke_with_metrics = aworkflow_with_metrics
+    compiled_workflow.astream_events_with_metrics = astream_events_with_metrics
+    compiled_workflow.wait_for_evaluations = wait_for_evaluations
     compiled_workflow.metrics_collector = metrics_collector
     
     return compiled_workflow
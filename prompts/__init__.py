@@ -50,7 +50,7 @@ def list_prompt_types(model_name: str) -> list:
 def validate_prompt_structure():
     """Valida que todos los modelos tienen los tipos de prompt esperados."""
     expected_types = {
-        'rag', 'context_generator', 'retrieval_grader', 
+        'rag', 'context_generator', 'context_generator_batch', 'retrieval_grader', 
         'hallucination_grader', 'answer_grader', 'query_rewriter',
         'clarification_generator', 'sql_generator', 'sql_interpretation'
     }
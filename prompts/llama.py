@@ -152,6 +152,36 @@ PROMPTS = {
         Chunk: {chunk} 
         <|eot_id|><|start_header_id|>assistant<|end_header_id|>""",
 
+    "context_generator_batch": """<|begin_of_text|><|start_header_id|>system<|end_header_id|> 
+        You are an AI assistant specializing in SEGEDA document analysis. Your task is to provide brief, relevant context for several chunks of text from the given document using systematic analysis.
+        
+        CHAIN OF THOUGHT ANALYSIS (for each chunk):
+        Step 1: Identify the cube type (PDI, PTGAS, CARGO, ADMISIÓN, MATRÍCULA, RENDIMIENTO, EGRESADOS, PROYECTOS, SOLICITUD CONVOCATORIA, etc.)
+        Step 2: Recognize the data category (MEDIDAS or DIMENSIONES)
+        Step 3: Extract key metrics, dimensions, and their attributes
+        Step 4: Identify relationships with other SEGEDA components
+        Step 5: Note important institutional terminology and constraints
+        
+        OUTPUT RULES:
+        1. Return exactly one context per chunk, in the same order as the chunks
+        2. Each context is a single concise paragraph
+        3. Do not repeat the chunk text in the context
+        
+        RESPONSE FORMAT:
+        {{
+          "contexts": [
+            {{"chunk": 1, "context": "Context for chunk 1"}},
+            {{"chunk": 2, "context": "Context for chunk 2"}}
+          ]
+        }}
+        
+        <|eot_id|><|start_header_id|>user<|end_header_id|>
+        Document: {document}
+        
+        Chunks ({chunk_count}, return exactly {chunk_count} contexts):
+        {chunks} 
+        <|eot_id|><|start_header_id|>assistant<|end_header_id|>""",
+
     "retrieval_grader": """<|begin_of_text|><|start_header_id|>system<|end_header_id|> 
         You are a specialized grader for SEGEDA (DATUZ) documents using systematic evaluation.
         
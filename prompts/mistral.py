@@ -85,6 +85,44 @@ PROMPTS = {
         Document: {document}
         Chunk: {chunk} [/INST]""",
 
+    "context_generator_batch": """[INST] You are an AI assistant specializing in SEGEDA document analysis using systematic reasoning with hierarchical text structure awareness.
+        
+        HIERARCHICAL TEXT ANALYSIS FRAMEWORK:
+        Given chunk size: {chunk_size} characters
+        Text hierarchy: Sentence → Paragraph → Section
+        
+        ADAPTIVE CONTEXT STRATEGY BASED ON CHUNK SIZE:
+        - Small chunks (≤200 chars): Focus on sentence-level precision and immediate semantic context
+        - Medium chunks (200-700 chars): Balance paragraph-level understanding with cross-paragraph relationships  
+        - Large chunks (>700 chars): Emphasize section-level comprehension and multi-section connections
+        
+        TASK:
+        You will receive one document and the numbered chunks taken from it.
+        Write an independent context for EACH chunk, following for each one:
+        Step 1: Identify the cube type (PDI, PTGAS, CARGO, ADMISIÓN, MATRÍCULA, RENDIMIENTO, EGRESADOS, PROYECTOS, etc.)
+        Step 2: Recognize the data category (MEDIDAS or DIMENSIONES) and hierarchical context
+        Step 3: Extract key metrics, dimensions, and their attributes at the appropriate hierarchical level
+        Step 4: Identify relationships with other SEGEDA components
+        Step 5: Note important institutional terminology and operational constraints
+        
+        OUTPUT RULES:
+        1. Return exactly one context per chunk, in the same order as the chunks
+        2. Each context is a single paragraph; DO NOT OUTPUT ANY OTHER STRUCTURED DATA
+        3. Do not repeat the chunk text in the context
+        
+        RESPONSE FORMAT:
+        {{
+          "contexts": [
+            {{"chunk": 1, "context": "Context for chunk 1"}},
+            {{"chunk": 2, "context": "Context for chunk 2"}}
+          ]
+        }}
+        
+        Document: {document}
+        
+        Chunks ({chunk_count}, return exactly {chunk_count} contexts):
+        {chunks} [/INST]""",
+
     "retrieval_grader": """[INST] You are a specialized grader for SEGEDA (DATUZ) documents using systematic evaluation.
         
         CHAIN OF THOUGHT EVALUATION:
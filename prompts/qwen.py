@@ -157,6 +157,36 @@ PROMPTS = {
         <|im_start|>user
         Document: {document}
         Chunk: {chunk}<|im_end|>
+        <|im_start|>assistant""",
+    "context_generator_batch": """<|im_start|>system
+        You are an AI assistant specializing in SEGEDA document analysis using systematic reasoning.
+        
+        CHAIN OF THOUGHT ANALYSIS (for each chunk):
+        Step 1: Identify the cube type (PDI, PTGAS, CARGO, ADMISIÓN, MATRÍCULA, RENDIMIENTO, EGRESADOS, PROYECTOS, etc.)
+        Step 2: Recognize the data category (MEDIDAS or DIMENSIONES)
+        Step 3: Extract key metrics, dimensions, and their attributes systematically
+        Step 4: Identify relationships with other SEGEDA components through logical analysis
+        Step 5: Note important institutional terminology and operational constraints
+        
+        CRITICAL OUTPUT REQUIREMENTS:
+        - You MUST respond with ONLY the JSON format shown below
+        - Return exactly one context per chunk, in the same order as the chunks
+        - Each context is a single concise paragraph
+        - Do NOT include any additional text, explanations, or content
+        - Do NOT repeat the document or the chunks in your response
+        
+        RESPONSE FORMAT:
+        {{
+          "contexts": [
+            {{"chunk": 1, "context": "Context for chunk 1"}},
+            {{"chunk": 2, "context": "Context for chunk 2"}}
+          ]
+        }}<|im_end|>
+        <|im_start|>user
+        Document: {document}
+        
+        Chunks ({chunk_count}, return exactly {chunk_count} contexts):
+        {chunks}<|im_end|>
         <|im_start|>assistant""",    "retrieval_grader": """<|im_start|>system
         You are a specialized grader for SEGEDA (DATUZ) documents using systematic evaluation with enhanced guardrails for institutional accuracy.
         
@@ -0,0 +1,108 @@
+"""
+Informe del tiempo de importación de los módulos del agente.
+
+Ejecuta la importación en un intérprete nuevo con `python -X importtime`
+(para que no influyan los módulos ya cargados en el proceso actual) y agrega
+los tiempos por paquete de primer nivel, de forma que se vea qué
+dependencias (torch, langchain_milvus, deepeval...) dominan el arranque.
+"""
+
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Any, Dict, List
+
+# Usar el sistema de logging centralizado
+from langagent.config.logging_config import get_logger
+logger = get_logger(__name__)
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def parse_importtime(output: str) -> List[Dict[str, Any]]:
+    """
+    Interpreta la salida de `python -X importtime`.
+
+    Args:
+        output: Salida de error del intérprete
+
+    Returns:
+        List[Dict[str, Any]]: Un registro por módulo (nombre, tiempo propio y acumulado en segundos, profundidad)
+    """
+    records = []
+    for line in output.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, module = match.groups()
+        records.append({
+            "module": module,
+            "self": int(self_us) / 1e6,
+            "cumulative": int(cumulative_us) / 1e6,
+            # El intérprete sangra dos espacios por nivel a partir de un espacio
+            "depth": (len(indent) - 1) // 2,
+        })
+    return records
+
+
+def measure_import_times(module_name: str, top: int = 15) -> Dict[str, Any]:
+    """
+    Mide el tiempo de importación de un módulo en un intérprete nuevo.
+
+    Args:
+        module_name: Módulo a importar (p. ej. "langagent.core.lang_chain_agent")
+        top: Número de paquetes y módulos a incluir en los rankings
+
+    Returns:
+        Dict[str, Any]: Tiempo total, tiempo por paquete de primer nivel y módulos más lentos
+    """
+    # El directorio padre del paquete debe estar en el path para importar "langagent.*"
+    package_parent = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [package_parent, env.get("PYTHONPATH")]))
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+        capture_output=True, text=True, env=env
+    )
+    records = parse_importtime(result.stderr)
+    if result.returncode != 0:
+        # Se informa igualmente de lo importado hasta el fallo
+        error_lines = [line for line in result.stderr.splitlines() if not line.startswith("import time:")]
+        logger.warning(f"La importación de {module_name} ha fallado: {error_lines[-1] if error_lines else result.returncode}")
+
+    packages = defaultdict(float)
+    for record in records:
+        packages[record["module"].split(".")[0]] += record["self"]
+
+    return {
+        "module": module_name,
+        "ok": result.returncode == 0,
+        "total": sum(record["self"] for record in records),
+        "modules_imported": len(records),
+        "packages": sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top],
+        "slowest": sorted(records, key=lambda record: record["cumulative"], reverse=True)[:top],
+    }
+
+
+def print_import_report(report: Dict[str, Any]):
+    """
+    Muestra el informe de measure_import_times por consola.
+
+    Args:
+        report: Informe a mostrar
+    """
+    status = "" if report["ok"] else " (con errores)"
+    print(f"\nImportación de {report['module']}{status}: {report['total']:.2f}s, "
+          f"{report['modules_imported']} módulos")
+
+    print(f"\n{'Paquete':<40} {'Tiempo (s)':>10} {'%':>6}")
+    for package, seconds in report["packages"]:
+        share = 100 * seconds / report["total"] if report["total"] else 0.0
+        print(f"{package:<40} {seconds:>10.3f} {share:>6.1f}")
+
+    print(f"\n{'Módulo (acumulado)':<60} {'Tiempo (s)':>10}")
+    for record in report["slowest"]:
+        print(f"{record['module']:<60} {record['cumulative']:>10.3f}")
@@ -0,0 +1,37 @@
+"""
+Importación diferida de los componentes de un paquete.
+
+Los paquetes que reexportan clases que dependen de librerías pesadas (torch,
+langchain_milvus, chromadb...) usan lazy_exports para definir los
+__getattr__ y __dir__ del módulo (PEP 562): el submódulo se importa la primera
+vez que se accede al nombre, no al importar el paquete.
+"""
+
+import importlib
+from typing import Callable, Dict, List, Tuple
+
+
+def lazy_exports(package_name: str, exports: Dict[str, str]) -> Tuple[Callable[[str], object], Callable[[], List[str]]]:
+    """
+    Crea las funciones __getattr__ y __dir__ de un paquete con exportaciones diferidas.
+
+    Args:
+        package_name: Nombre del paquete (normalmente __name__)
+        exports: Nombre exportado -> módulo que lo define
+
+    Returns:
+        Tuple: Funciones __getattr__ y __dir__ para asignar en el paquete
+    """
+    def __getattr__(name: str):
+        module_name = exports.get(name)
+        if module_name is None:
+            raise AttributeError(f"module {package_name!r} has no attribute {name!r}")
+        value = getattr(importlib.import_module(module_name), name)
+        # Guardar el valor en el paquete para que los siguientes accesos no pasen por aquí
+        setattr(importlib.import_module(package_name), name, value)
+        return value
+
+    def __dir__() -> List[str]:
+        return sorted(set(vars(importlib.import_module(package_name))) | set(exports))
+
+    return __getattr__, __dir__
@@ -3,17 +3,24 @@ Paquete vectorstore para la gestión de bases de datos vectoriales.
 
 Este paquete proporciona interfaces e implementaciones para diferentes
 bases de datos vectoriales, manteniendo una API común para su uso en la aplicación.
+
+Las implementaciones se importan al acceder a ellas por primera vez, para no
+cargar los clientes de todas las bases de datos ni el modelo de embeddings al
+importar cualquier submódulo del paquete.
 """
 
-from langagent.vectorstore.base import VectorStoreBase, VectorStoreFactory
-from langagent.vectorstore.chroma import ChromaVectorStore
-from langagent.vectorstore.milvus import MilvusVectorStore
-from langagent.vectorstore.embeddings import create_embeddings
+from langagent.utils.lazy_import import lazy_exports
+
+_EXPORTS = {
+    'VectorStoreBase': 'langagent.vectorstore.base',
+    'VectorStoreFactory': 'langagent.vectorstore.base',
+    'ChromaVectorStore': 'langagent.vectorstore.chroma',
+    'MilvusVectorStore': 'langagent.vectorstore.milvus',
+    'LocalVectorStore': 'langagent.vectorstore.local',
+    'create_embeddings': 'langagent.vectorstore.embeddings',
+    'warmup_embeddings': 'langagent.vectorstore.embeddings',
+}
+
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
 
-__all__ = [
-    'VectorStoreBase',
-    'VectorStoreFactory',
-    'ChromaVectorStore',
-    'MilvusVectorStore',
-    'create_embeddings'
-] 
\ No newline at end of file
+__all__ = list(_EXPORTS)
@@ -5,8 +5,9 @@ Proporciona una clase abstracta base y una factoría para crear instancias
 de diferentes implementaciones de vectorstores de forma transparente.
 """
 
+import hashlib
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable, Set, Tuple
 from langchain_core.documents import Document
 from langchain_core.embeddings import Embeddings
 from langchain_core.retrievers import BaseRetriever
@@ -81,7 +82,8 @@ class VectorStoreBase(ABC):
     
     @abstractmethod
     def load_documents(self, documents: List[Document], embeddings: Embeddings = None, 
-                     source_documents: Dict[str, Document] = None) -> bool:
+                     source_documents: Dict[str, Document] = None,
+                     collection_name: Optional[str] = None) -> bool:
         """
         Carga documentos en la vectorstore.
         
@@ -89,6 +91,7 @@ class VectorStoreBase(ABC):
             documents: Lista de documentos a cargar
             embeddings: Modelo de embeddings a utilizar (opcional)
             source_documents: Diccionario con los documentos originales completos (opcional)
+            collection_name: Colección de destino (por defecto, la de la configuración)
             
         Returns:
             bool: True si los documentos se cargaron correctamente
@@ -123,6 +126,156 @@ class VectorStoreBase(ABC):
         """
         pass
     
+    def get_collection_manifest(self, vectorstore) -> Optional[Dict[str, Dict[str, Any]]]:
+        """
+        Obtiene el manifiesto exacto de la colección: número de chunks y hash de contenido por fuente.
+        
+        Las implementaciones lo construyen recorriendo todos los registros de la
+        colección (sin búsquedas de similitud), de modo que ninguna fuente indexada
+        queda fuera.
+        
+        Args:
+            vectorstore: Instancia de vectorstore
+            
+        Returns:
+            Optional[Dict[str, Dict[str, Any]]]: source -> {"chunk_count", "content_hash"},
+            o None si la implementación no soporta recorrer la colección
+        """
+        return None
+    
+    def count_chunks(self, vectorstore) -> Optional[int]:
+        """
+        Cuenta los chunks de la colección sin leer sus registros.
+        
+        Args:
+            vectorstore: Instancia de vectorstore
+            
+        Returns:
+            Optional[int]: Número de chunks o None si no está soportado
+        """
+        return None
+    
+    def get_chunk_index(self, vectorstore, cubos: List[str]) -> Optional[Dict[str, Dict[str, List[Any]]]]:
+        """
+        Obtiene los identificadores de los chunks almacenados de cada cubo agrupados por hash de contenido.
+        
+        Args:
+            vectorstore: Instancia de vectorstore
+            cubos: Cubos a consultar
+            
+        Returns:
+            Optional[Dict[str, Dict[str, List[Any]]]]: cubo -> {chunk_hash: [ids]},
+            o None si la implementación no soporta actualizaciones por chunk
+        """
+        return None
+    
+    def remove_documents_by_ids(self, vectorstore, ids: List[Any]) -> bool:
+        """
+        Elimina chunks concretos de la vectorstore por su identificador.
+        
+        Args:
+            vectorstore: Instancia de vectorstore
+            ids: Identificadores de los chunks a eliminar
+            
+        Returns:
+            bool: True si se eliminaron correctamente (False si no está soportado)
+        """
+        return False
+    
+    def update_chunk_sources(self, vectorstore, sources: Dict[Any, str]) -> Set[Any]:
+        """
+        Actualiza el source de chunks conservados tras subir la versión de su cubo.
+        
+        Los chunks cuyo contenido no cambia entre versiones no se vuelven a
+        insertar, pero su source debe pasar a la nueva versión para que el
+        manifiesto de la colección refleje la versión cargada.
+        
+        Args:
+            vectorstore: Instancia de vectorstore
+            sources: Identificador del chunk -> nuevo source
+            
+        Returns:
+            Set[Any]: Identificadores de los chunks actualizados (vacío si no está soportado);
+                los que falten deben sustituirse volviendo a insertarlos
+        """
+        return set()
+    
+    @staticmethod
+    def compute_chunk_hash(text: Optional[str]) -> str:
+        """
+        Calcula el hash de contenido de un chunk.
+        
+        Args:
+            text: Texto del chunk
+            
+        Returns:
+            str: Hash SHA-256 del texto
+        """
+        return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def ensure_filter_metadata(documents: List[Document]) -> List[Document]:
+        """
+        Completa los metadatos que usan los filtros del workflow (ambito, cubo_source, is_consulta).
+
+        Los documentos sin ámbito lo obtienen del cubo de su source; los que no
+        pertenecen a un cubo conocido quedan en "general". is_consulta se guarda
+        como texto ("true"/"false"), que es como lo filtra el workflow.
+
+        Args:
+            documents: Documentos a indexar
+
+        Returns:
+            List[Document]: Los mismos documentos con los metadatos completados
+        """
+        # Importaciones locales para evitar dependencias circulares
+        from langagent.vectorstore.document_uploader import DocumentUploader
+        from langagent.models.constants import CUBO_TO_AMBITO
+
+        for doc in documents:
+            if doc.metadata is None:
+                doc.metadata = {}
+            doc.metadata.setdefault("source", "general")
+            if not doc.metadata.get("ambito") or not doc.metadata.get("cubo_source"):
+                cubo, _ = DocumentUploader.extract_cubo_and_version(doc.metadata["source"])
+                known_cubo = cubo if cubo in CUBO_TO_AMBITO else "general"
+                doc.metadata["cubo_source"] = doc.metadata.get("cubo_source") or known_cubo
+                doc.metadata["ambito"] = doc.metadata.get("ambito") or CUBO_TO_AMBITO.get(known_cubo, "general")
+            doc.metadata.setdefault("context_generation", "")
+            if isinstance(doc.metadata.get("is_consulta"), bool):
+                doc.metadata["is_consulta"] = str(doc.metadata["is_consulta"]).lower()
+        return documents
+
+    @staticmethod
+    def build_manifest(records: Iterable[Tuple[str, Optional[str]]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Construye el manifiesto de una colección a partir de sus registros.
+        
+        Usa el hash de cada chunk guardado en sus metadatos, sin leer el texto.
+        El hash de contenido de cada fuente no depende del orden de los chunks y
+        es None si algún chunk de la fuente no tiene hash almacenado.
+        
+        Args:
+            records: Pares (source, chunk_hash del chunk o None)
+            
+        Returns:
+            Dict[str, Dict[str, Any]]: source -> {"chunk_count", "content_hash"}
+        """
+        chunk_hashes: Dict[str, List[Optional[str]]] = {}
+        for source, chunk_hash in records:
+            if not source:
+                continue
+            chunk_hashes.setdefault(source, []).append(chunk_hash)
+        
+        return {
+            source: {
+                "chunk_count": len(hashes),
+                "content_hash": (hashlib.sha256("".join(sorted(hashes)).encode("utf-8")).hexdigest()
+                                 if all(hashes) else None)
+            }
+            for source, hashes in chunk_hashes.items()
+        }
+    
     @staticmethod
     def add_metadata_to_documents(documents: List[Document], cubo: str, ambito: Optional[str] = None) -> List[Document]:
         """
@@ -151,7 +304,7 @@ class VectorStoreFactory:
         Obtiene una instancia de vectorstore según el tipo especificado.
         
         Args:
-            vector_db_type: Tipo de vectorstore ('chroma' o 'milvus')
+            vector_db_type: Tipo de vectorstore ('chroma', 'milvus' o 'local')
             
         Returns:
             VectorStoreBase: Instancia de la implementación específica
@@ -160,13 +313,16 @@ class VectorStoreFactory:
         if vector_db_type is None:
             vector_db_type = VECTORSTORE_CONFIG.get("vector_db_type", "chroma")
         
-        # Importar las clases específicas aquí para evitar dependencias circulares
-        from langagent.vectorstore.chroma import ChromaVectorStore
-        from langagent.vectorstore.milvus import MilvusVectorStore
-        
-        if vector_db_type.lower() == "chroma":
+        # Importar solo la implementación elegida: cada una arrastra el cliente de su base de datos
+        vector_db_type = vector_db_type.lower()
+        if vector_db_type == "chroma":
+            from langagent.vectorstore.chroma import ChromaVectorStore
             return ChromaVectorStore()
-        elif vector_db_type.lower() == "milvus":
+        elif vector_db_type == "milvus":
+            from langagent.vectorstore.milvus import MilvusVectorStore
             return MilvusVectorStore()
+        elif vector_db_type == "local":
+            from langagent.vectorstore.local import LocalVectorStore
+            return LocalVectorStore()
         else:
             raise ValueError(f"Tipo de vectorstore no soportado: {vector_db_type}")
\ No newline at end of file
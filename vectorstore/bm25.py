@@ -0,0 +1,146 @@
+"""
+Índice BM25 en memoria para la búsqueda híbrida de las vectorstores sin BM25 nativo
+(local y Chroma).
+
+Implementa Okapi BM25 sobre una tokenización sencilla (minúsculas, sin
+tildes, palabras alfanuméricas), equivalente en la práctica a la función
+BM25 integrada de Milvus que usa la colección remota.
+"""
+
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Divide un texto en términos normalizados (minúsculas y sin tildes).
+
+    Args:
+        text: Texto a tokenizar
+
+    Returns:
+        List[str]: Términos del texto
+    """
+    normalized = unicodedata.normalize("NFKD", (text or "").lower())
+    normalized = "".join(char for char in normalized if not unicodedata.combining(char))
+    return _TOKEN_PATTERN.findall(normalized)
+
+
+class BM25Index:
+    """Índice invertido BM25 con altas y bajas por identificador de documento."""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        """
+        Inicializa un índice vacío.
+
+        Args:
+            k1: Saturación de la frecuencia de término
+            b: Normalización por longitud del documento
+        """
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._lengths: Dict[str, int] = {}
+        self._doc_terms: Dict[str, List[str]] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def add(self, items: Iterable[Tuple[str, str]]):
+        """
+        Indexa documentos.
+
+        Args:
+            items: Pares (identificador, texto)
+        """
+        with self._lock:
+            for doc_id, text in items:
+                if doc_id in self._lengths:
+                    self._remove_one(doc_id)
+                terms = Counter(tokenize(text))
+                for term, frequency in terms.items():
+                    self._postings.setdefault(term, {})[doc_id] = frequency
+                length = sum(terms.values())
+                self._lengths[doc_id] = length
+                self._doc_terms[doc_id] = list(terms)
+                self._total_length += length
+
+    def _remove_one(self, doc_id: str):
+        """Elimina un documento del índice (requiere el bloqueo)."""
+        length = self._lengths.pop(doc_id, None)
+        if length is None:
+            return
+        self._total_length -= length
+        for term in self._doc_terms.pop(doc_id, []):
+            postings = self._postings.get(term)
+            if postings is not None and postings.pop(doc_id, None) is not None and not postings:
+                del self._postings[term]
+
+    def remove(self, doc_ids: Iterable[str]):
+        """
+        Elimina documentos del índice.
+
+        Args:
+            doc_ids: Identificadores a eliminar
+        """
+        with self._lock:
+            for doc_id in doc_ids:
+                self._remove_one(doc_id)
+
+    def search(self, query: str, k: int, allowed: Optional[set] = None) -> List[Tuple[str, float]]:
+        """
+        Busca los documentos con mayor puntuación BM25 para una consulta.
+
+        Args:
+            query: Consulta en texto libre
+            k: Número máximo de resultados
+            allowed: Identificadores permitidos (filtro de metadatos); None = todos
+
+        Returns:
+            List[Tuple[str, float]]: Pares (identificador, puntuación) ordenados de mayor a menor
+        """
+        with self._lock:
+            total_docs = len(self._lengths)
+            if not total_docs:
+                return []
+            average_length = self._total_length / total_docs
+
+            scores: Dict[str, float] = {}
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (total_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, frequency in postings.items():
+                    if allowed is not None and doc_id not in allowed:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / average_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Combina varios rankings con Reciprocal Rank Fusion.
+
+    Args:
+        rankings: Rankings de identificadores, del más al menos relevante
+        k: Constante de suavizado de RRF
+
+    Returns:
+        List[Tuple[str, float]]: Pares (identificador, puntuación RRF) de mayor a menor
+    """
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
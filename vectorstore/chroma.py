@@ -3,29 +3,488 @@ Implementación de VectorStoreBase para ChromaDB.
 
 Este módulo proporciona una implementación concreta de la interfaz VectorStoreBase
 para la base de datos vectorial ChromaDB.
+
+Chroma no tiene búsqueda por texto completo integrada: HybridChroma mantiene
+un índice BM25 en memoria junto a la colección (se construye en la primera
+búsqueda y se actualiza en cada alta o baja) y combina su ranking con el
+denso mediante Reciprocal Rank Fusion, aplicando los mismos filtros de
+metadatos (ámbito, is_consulta) que la colección de Milvus. Para esos filtros
+mantiene, junto al índice BM25, un mapa valor -> ids por campo, de modo que
+una búsqueda filtrada no evalúa los metadatos de toda la colección.
+
+Además mantiene un índice source/cubo_source -> ids persistido junto a la
+colección (metadata_index.json), de modo que las bajas por cubo y la consulta
+de fuentes existentes no recorren la colección completa. El índice se
+actualiza en memoria en cada alta, baja o cambio de metadatos y se guarda una
+vez al final de cada operación de ChromaVectorStore (persist_metadata_index).
+Si otro proceso (el comando ingest) modifica el fichero, se vuelve a cargar;
+si modifica la colección sin tener el índice cargado, elimina el fichero y el
+índice se reconstruye.
 """
 
+import json
+import math
 import os
+import threading
 import time
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Set, Tuple
 from langchain_core.documents import Document
 from langchain_core.embeddings import Embeddings
 from langchain_core.retrievers import BaseRetriever
 from langchain_core.vectorstores import VectorStore
 from langchain_chroma import Chroma
 from langagent.vectorstore.base import VectorStoreBase
+from langagent.vectorstore.bm25 import BM25Index, reciprocal_rank_fusion
+from langagent.vectorstore.retrieval_cache import with_retrieval_cache
+from langagent.vectorstore.scored_retriever import ScoredRetriever
 from langagent.config.config import VECTORSTORE_CONFIG
 
 # Usar el sistema de logging centralizado
 from langagent.config.logging_config import get_logger
 logger = get_logger(__name__)
 
+
+def to_chroma_where(filter: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Convierte un filtro de metadatos del workflow en una cláusula where de Chroma.
+
+    Chroma exige un único operador por nivel, así que los filtros con varios
+    campos ({"ambito": ..., "is_consulta": "true"}) se combinan con $and.
+
+    Args:
+        filter: Filtro campo -> valor (o campo -> {"$in": [...]})
+
+    Returns:
+        Optional[Dict[str, Any]]: Cláusula where o None si no hay filtro
+    """
+    if not filter:
+        return None
+    if len(filter) == 1 or any(key.startswith("$") for key in filter):
+        return dict(filter)
+    return {"$and": [{key: value} for key, value in filter.items()]}
+
+
+def metadata_matches(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """
+    Comprueba si unos metadatos cumplen una cláusula where (igualdad, $eq, $in, $and, $or).
+
+    Args:
+        metadata: Metadatos del chunk
+        where: Cláusula where de Chroma
+
+    Returns:
+        bool: True si los metadatos cumplen la cláusula
+    """
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(metadata_matches(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(metadata_matches(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            if "$in" in condition and value not in condition["$in"]:
+                return False
+            if "$eq" in condition and value != condition["$eq"]:
+                return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+# Campos de metadatos con índice valor -> ids
+INDEXED_FIELDS = ("source", "cubo_source")
+
+# Campos de filtrado con mapa valor -> ids junto al índice BM25
+FILTER_FIELDS = ("ambito", "is_consulta")
+
+
+def iterate_collection(vectorstore: Chroma, where: Optional[Dict[str, Any]] = None,
+                       include: Optional[List[str]] = None,
+                       batch_size: Optional[int] = None) -> Iterator[Tuple[str, Dict[str, Any], Optional[str]]]:
+    """
+    Recorre una colección Chroma por páginas, opcionalmente filtrada.
+
+    Args:
+        vectorstore: Instancia de Chroma vectorstore
+        where: Cláusula where de Chroma
+        include: Campos a recuperar ("metadatas", "documents"); vacío = solo ids
+        batch_size: Registros por página (por defecto, manifest_scan_batch_size)
+
+    Yields:
+        Tuple[str, Dict, Optional[str]]: (id, metadatos, documento) de cada registro
+    """
+    include = list(include or [])
+    batch_size = batch_size or VECTORSTORE_CONFIG.get("manifest_scan_batch_size", 1000)
+    offset = 0
+    while True:
+        page = vectorstore.get(where=where, include=include, limit=batch_size, offset=offset)
+        ids = page.get("ids") or []
+        if not ids:
+            return
+        metadatas = page.get("metadatas") or [None] * len(ids)
+        documents = page.get("documents") or [None] * len(ids)
+        for chunk_id, metadata, document in zip(ids, metadatas, documents):
+            yield chunk_id, metadata or {}, document
+        if len(ids) < batch_size:
+            return
+        offset += batch_size
+
+
+class HybridChroma(Chroma):
+    """Colección Chroma con búsqueda híbrida (densa + BM25) y filtros de metadatos del workflow."""
+
+    def __init__(self, *args: Any, use_hybrid_search: bool = False, **kwargs: Any):
+        """
+        Inicializa la colección.
+
+        Args:
+            use_hybrid_search: Combinar la búsqueda densa con el índice BM25
+            *args, **kwargs: Argumentos de Chroma
+        """
+        super().__init__(*args, **kwargs)
+        self.use_hybrid_search = use_hybrid_search
+        self._bm25: Optional[BM25Index] = None
+        self._bm25_metadata: Dict[str, Dict[str, Any]] = {}
+        self._bm25_filter_index: Dict[str, Dict[Any, Set[str]]] = {field: {} for field in FILTER_FIELDS}
+        self._bm25_lock = threading.RLock()
+        self._metadata_index: Optional[Dict[str, Dict[str, Set[str]]]] = None
+        self._metadata_index_lock = threading.RLock()
+        self._metadata_index_dirty = False
+        self._metadata_index_stamp: Optional[Tuple[int, int]] = None
+
+    def count(self) -> int:
+        """Número de chunks de la colección (sin leer los registros)."""
+        return self._collection.count()
+
+    @property
+    def _metadata_index_path(self) -> Optional[str]:
+        persist_directory = getattr(self, "_persist_directory", None)
+        return os.path.join(persist_directory, "metadata_index.json") if persist_directory else None
+
+    def _stored_index_stamp(self) -> Optional[Tuple[int, int]]:
+        """Fecha de modificación y tamaño del fichero del índice (None si no existe)."""
+        index_path = self._metadata_index_path
+        try:
+            stat = os.stat(index_path) if index_path else None
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size) if stat else None
+
+    def _get_metadata_index(self) -> Dict[str, Dict[str, Set[str]]]:
+        """
+        Devuelve el índice valor -> ids de los campos indexados.
+
+        Se carga del fichero si su número de chunks coincide con el de la
+        colección; si no, se reconstruye con un recorrido paginado de los metadatos.
+        El índice en memoria se descarta si otro proceso ha modificado el fichero.
+        """
+        with self._metadata_index_lock:
+            if self._metadata_index is not None:
+                if self._metadata_index_dirty or self._stored_index_stamp() == self._metadata_index_stamp:
+                    return self._metadata_index
+                logger.info(f"Índice de metadatos de '{self._collection.name}' modificado por otro proceso, se recarga")
+                self._metadata_index = None
+
+            index_path = self._metadata_index_path
+            total = self.count()
+            if index_path and os.path.exists(index_path):
+                try:
+                    stamp = self._stored_index_stamp()
+                    with open(index_path, "r", encoding="utf-8") as index_file:
+                        stored = json.load(index_file)
+                    if stored.get("count") == total:
+                        self._metadata_index = {
+                            field: {value: set(ids) for value, ids in stored.get("fields", {}).get(field, {}).items()}
+                            for field in INDEXED_FIELDS
+                        }
+                        self._metadata_index_stamp = stamp
+                        return self._metadata_index
+                    logger.info(f"Índice de metadatos desactualizado ({stored.get('count')} != {total}), se reconstruye")
+                except (OSError, ValueError) as e:
+                    logger.warning(f"No se pudo leer el índice de metadatos: {e}")
+
+            index: Dict[str, Dict[str, Set[str]]] = {field: {} for field in INDEXED_FIELDS}
+            for chunk_id, metadata, _ in iterate_collection(self, include=["metadatas"]):
+                for field in INDEXED_FIELDS:
+                    if metadata.get(field):
+                        index[field].setdefault(metadata[field], set()).add(chunk_id)
+            self._metadata_index = index
+            self._metadata_index_dirty = True
+            self.persist_metadata_index()
+            logger.info(f"Índice de metadatos de '{self._collection.name}' construido con {total} chunks")
+            return self._metadata_index
+
+    def persist_metadata_index(self):
+        """Guarda de forma atómica el índice de metadatos si tiene cambios pendientes."""
+        with self._metadata_index_lock:
+            index_path = self._metadata_index_path
+            if not index_path or self._metadata_index is None or not self._metadata_index_dirty:
+                return
+            try:
+                tmp_path = index_path + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as index_file:
+                    json.dump({
+                        "count": self.count(),
+                        "fields": {
+                            field: {value: sorted(ids) for value, ids in values.items()}
+                            for field, values in self._metadata_index.items()
+                        },
+                    }, index_file, ensure_ascii=False)
+                os.replace(tmp_path, index_path)
+                self._metadata_index_stamp = self._stored_index_stamp()
+                self._metadata_index_dirty = False
+            except OSError as e:
+                logger.warning(f"No se pudo guardar el índice de metadatos: {e}")
+
+    def _mark_metadata_index_changed(self):
+        """
+        Registra una modificación de la colección (requiere el bloqueo del índice).
+
+        Con el índice cargado, el cambio queda pendiente de persist_metadata_index;
+        sin él, el fichero guardado deja de ser válido y se elimina para que el
+        siguiente uso (en este u otro proceso) lo reconstruya.
+        """
+        if self._metadata_index is not None:
+            self._metadata_index_dirty = True
+            return
+        index_path = self._metadata_index_path
+        if index_path and os.path.exists(index_path):
+            try:
+                os.remove(index_path)
+            except OSError as e:
+                logger.warning(f"No se pudo eliminar el índice de metadatos desactualizado: {e}")
+
+    def invalidate_metadata_index(self):
+        """Descarta el índice de metadatos (tras modificar metadatos fuera de add_texts/delete)."""
+        with self._metadata_index_lock:
+            self._metadata_index = None
+            self._metadata_index_dirty = False
+            index_path = self._metadata_index_path
+            if index_path and os.path.exists(index_path):
+                os.remove(index_path)
+
+    def get_ids_by_metadata(self, field: str, values: Iterable[str]) -> List[str]:
+        """
+        Identificadores de los chunks cuyo campo indexado toma alguno de los valores.
+
+        Args:
+            field: Campo indexado ("source" o "cubo_source")
+            values: Valores buscados
+
+        Returns:
+            List[str]: Identificadores de los chunks
+        """
+        index = self._get_metadata_index()
+        with self._metadata_index_lock:
+            return [chunk_id for value in values for chunk_id in index.get(field, {}).get(value, ())]
+
+    def get_metadata_values(self, field: str) -> Set[str]:
+        """Valores distintos de un campo indexado presentes en la colección."""
+        index = self._get_metadata_index()
+        with self._metadata_index_lock:
+            return {value for value, ids in index.get(field, {}).items() if ids}
+
+    def _get_bm25(self) -> BM25Index:
+        """Devuelve el índice BM25 de la colección, construyéndolo en el primer uso."""
+        with self._bm25_lock:
+            if self._bm25 is None:
+                data = self.get(include=["documents", "metadatas"])
+                index = BM25Index()
+                index.add(zip(data.get("ids", []), data.get("documents", [])))
+                self._bm25_metadata = {}
+                self._bm25_filter_index = {field: {} for field in FILTER_FIELDS}
+                for chunk_id, metadata in zip(data.get("ids", []), data.get("metadatas", [])):
+                    self._set_bm25_metadata(chunk_id, metadata or {})
+                self._bm25 = index
+                logger.info(f"Índice BM25 de '{self._collection.name}' construido con {len(index)} chunks")
+            return self._bm25
+
+    def _set_bm25_metadata(self, chunk_id: str, metadata: Optional[Dict[str, Any]]):
+        """Registra (o sustituye, con None elimina) los metadatos de un chunk en el mapa de filtros (requiere el bloqueo BM25)."""
+        previous = self._bm25_metadata.pop(chunk_id, None)
+        if previous is not None:
+            for field in FILTER_FIELDS:
+                ids = self._bm25_filter_index[field].get(previous.get(field))
+                if ids is not None:
+                    ids.discard(chunk_id)
+                    if not ids:
+                        del self._bm25_filter_index[field][previous.get(field)]
+        if metadata is None:
+            return
+        self._bm25_metadata[chunk_id] = metadata
+        for field in FILTER_FIELDS:
+            if metadata.get(field) is not None:
+                self._bm25_filter_index[field].setdefault(metadata[field], set()).add(chunk_id)
+
+    def _filter_ids(self, where: Dict[str, Any]) -> Set[str]:
+        """
+        Identificadores de los chunks que cumplen una cláusula where (requiere el bloqueo BM25).
+
+        Los campos de FILTER_FIELDS se resuelven con el mapa valor -> ids; el
+        resto de campos recurre a evaluar los metadatos de cada chunk.
+        """
+        allowed: Optional[Set[str]] = None
+        for key, condition in where.items():
+            if key == "$and":
+                ids = set.intersection(*(self._filter_ids(clause) for clause in condition)) if condition else None
+            elif key == "$or":
+                ids = set().union(*(self._filter_ids(clause) for clause in condition))
+            elif key in FILTER_FIELDS:
+                values = self._bm25_filter_index[key]
+                if isinstance(condition, dict):
+                    ids = None
+                    if "$in" in condition:
+                        ids = set().union(*(values.get(value, set()) for value in condition["$in"]))
+                    if "$eq" in condition:
+                        eq_ids = values.get(condition["$eq"], set())
+                        ids = set(eq_ids) if ids is None else ids & eq_ids
+                else:
+                    ids = set(values.get(condition, set()))
+            else:
+                ids = {
+                    chunk_id for chunk_id, metadata in self._bm25_metadata.items()
+                    if metadata_matches(metadata, {key: condition})
+                }
+            if ids is not None:
+                allowed = ids if allowed is None else allowed & ids
+        return set(self._bm25_metadata) if allowed is None else allowed
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        """Añade textos a la colección y, si ya está construido, al índice BM25."""
+        texts = list(texts)
+        added_ids = super().add_texts(texts, metadatas=metadatas, ids=ids, **kwargs)
+        metadatas = metadatas or [{} for _ in texts]
+        with self._bm25_lock:
+            if self._bm25 is not None:
+                self._bm25.add(zip(added_ids, texts))
+                for chunk_id, metadata in zip(added_ids, metadatas):
+                    self._set_bm25_metadata(chunk_id, metadata or {})
+        with self._metadata_index_lock:
+            if self._metadata_index is not None:
+                for chunk_id, metadata in zip(added_ids, metadatas):
+                    for field in INDEXED_FIELDS:
+                        if (metadata or {}).get(field):
+                            self._metadata_index[field].setdefault(metadata[field], set()).add(chunk_id)
+            self._mark_metadata_index_changed()
+        return added_ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> None:
+        """Elimina chunks de la colección y del índice BM25."""
+        super().delete(ids=ids, **kwargs)
+        with self._bm25_lock:
+            if self._bm25 is not None and ids:
+                self._bm25.remove(ids)
+                for chunk_id in ids:
+                    self._set_bm25_metadata(chunk_id, None)
+        with self._metadata_index_lock:
+            if self._metadata_index is not None and ids:
+                removed = set(ids)
+                for values in self._metadata_index.values():
+                    for value in list(values):
+                        values[value] -= removed
+                        if not values[value]:
+                            del values[value]
+            self._mark_metadata_index_changed()
+
+    def update_metadatas(self, ids: List[str], metadatas: List[Dict[str, Any]]):
+        """Sustituye los metadatos de chunks existentes y actualiza los índices BM25 y de metadatos."""
+        batch_size = VECTORSTORE_CONFIG.get("manifest_scan_batch_size", 1000)
+        for i in range(0, len(ids), batch_size):
+            self._collection.update(ids=ids[i:i + batch_size], metadatas=metadatas[i:i + batch_size])
+        with self._bm25_lock:
+            if self._bm25 is not None:
+                for chunk_id, metadata in zip(ids, metadatas):
+                    self._set_bm25_metadata(chunk_id, metadata)
+        with self._metadata_index_lock:
+            if self._metadata_index is not None:
+                updated = set(ids)
+                for values in self._metadata_index.values():
+                    for value in list(values):
+                        values[value] -= updated
+                        if not values[value]:
+                            del values[value]
+                for chunk_id, metadata in zip(ids, metadatas):
+                    for field in INDEXED_FIELDS:
+                        if metadata.get(field):
+                            self._metadata_index[field].setdefault(metadata[field], set()).add(chunk_id)
+            self._mark_metadata_index_changed()
+
+    def _distance(self, query_embedding: List[float], embedding: List[float]) -> float:
+        """Distancia entre dos vectores en el espacio de la colección (l2, cosine o ip), como la devuelve Chroma."""
+        space = ((self._collection.metadata or {}).get("hnsw:space") or "l2").lower()
+        dot = sum(a * b for a, b in zip(query_embedding, embedding))
+        if space == "ip":
+            return 1.0 - dot
+        if space == "cosine":
+            norms = math.sqrt(sum(a * a for a in query_embedding)) * math.sqrt(sum(b * b for b in embedding))
+            return 1.0 - (dot / norms if norms else 0.0)
+        return sum((a - b) ** 2 for a, b in zip(query_embedding, embedding))
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4,
+                                               filter: Optional[Dict[str, Any]] = None,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        """Búsqueda densa con un embedding ya calculado; devuelve la distancia de Chroma."""
+        return self.similarity_search_by_vector_with_relevance_scores(
+            embedding, k=k, filter=to_chroma_where(filter), **kwargs
+        )
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4,
+                                    filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Document]:
+        return super().similarity_search_by_vector(embedding, k=k, filter=to_chroma_where(filter), **kwargs)
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None,
+                                     **kwargs: Any) -> List[Tuple[Document, float]]:
+        """
+        Búsqueda por texto; con búsqueda híbrida combina el ranking denso y el BM25 con RRF.
+
+        La puntuación devuelta es siempre la distancia densa de Chroma, de modo
+        que la normalización de relevancia y los umbrales del workflow no cambian.
+
+        Returns:
+            List[Tuple[Document, float]]: Documentos con su distancia a la consulta
+        """
+        where = to_chroma_where(filter)
+        if not self.use_hybrid_search or self._embedding_function is None:
+            return super().similarity_search_with_score(query, k=k, filter=where, **kwargs)
+
+        query_embedding = self._embedding_function.embed_query(query)
+        candidates = k * VECTORSTORE_CONFIG.get("hybrid_candidates_multiplier", 3)
+        dense = self.similarity_search_by_vector_with_relevance_scores(query_embedding, k=candidates, filter=where)
+        dense_by_id = {doc.id: (doc, score) for doc, score in dense if doc.id}
+
+        bm25 = self._get_bm25()
+        with self._bm25_lock:
+            allowed = None if where is None else self._filter_ids(where)
+        sparse = bm25.search(query, candidates, allowed)
+
+        fused = reciprocal_rank_fusion(
+            [list(dense_by_id), [chunk_id for chunk_id, _ in sparse]],
+            VECTORSTORE_CONFIG.get("hybrid_rrf_k", 60)
+        )[:k]
+
+        # Los chunks que solo ha encontrado BM25 necesitan su distancia densa
+        missing = [chunk_id for chunk_id, _ in fused if chunk_id not in dense_by_id]
+        if missing:
+            data = self.get(ids=missing, include=["documents", "metadatas", "embeddings"])
+            for chunk_id, text, metadata, embedding in zip(data["ids"], data["documents"],
+                                                           data["metadatas"], data["embeddings"]):
+                doc = Document(id=chunk_id, page_content=text, metadata=metadata or {})
+                dense_by_id[chunk_id] = (doc, self._distance(query_embedding, list(embedding)))
+
+        return [dense_by_id[chunk_id] for chunk_id, _ in fused if chunk_id in dense_by_id]
+
 class ChromaVectorStore(VectorStoreBase):
     """Implementación de VectorStoreBase para Chroma."""
     
     def __init__(self):
         """Inicializa la implementación de Chroma Vector Store."""
         self.persist_directory = VECTORSTORE_CONFIG.get("persist_directory", "./vectordb")
+        self.use_hybrid_search = VECTORSTORE_CONFIG.get("use_hybrid_search", False)
         logger.info(f"ChromaVectorStore inicializado con directorio: {self.persist_directory}")
     
     def create_vectorstore(self, documents: List[Document], embeddings: Embeddings, 
@@ -59,19 +518,22 @@ class ChromaVectorStore(VectorStoreBase):
             os.makedirs(persist_dir, exist_ok=True)
             
             # Crear la vectorstore
-            vectorstore = Chroma.from_documents(
-                documents=documents,
+            vectorstore = HybridChroma.from_documents(
+                documents=self.ensure_filter_metadata(documents),
                 embedding=embeddings,
                 persist_directory=persist_dir,
-                collection_name=collection_name
+                collection_name=collection_name,
+                use_hybrid_search=self.use_hybrid_search
             )
             
-            # Verificar que se creó correctamente
+            # Los chunks nuevos ya llevan los metadatos de filtrado
+            self._mark_filter_metadata_backfilled(persist_dir)
+            
+            # Verificar que se creó correctamente (sin búsqueda: construiría el índice BM25)
             try:
-                # Intentar una búsqueda simple para verificar que funciona
-                test_results = vectorstore.similarity_search("test", k=1)
+                doc_count = vectorstore.count()
                 logger.info(f"Vectorstore Chroma creada correctamente con {len(documents)} documentos")
-                logger.info(f"Verificación exitosa - se encontraron {len(test_results)} resultados en búsqueda de prueba")
+                logger.info(f"Verificación exitosa - la colección contiene {doc_count} chunks")
             except Exception as e:
                 logger.warning(f"Vectorstore creada pero falló la verificación: {e}")
             
@@ -109,25 +571,20 @@ class ChromaVectorStore(VectorStoreBase):
         
         try:
             # Cargar la vectorstore
-            vectorstore = Chroma(
+            vectorstore = HybridChroma(
                 persist_directory=persist_dir,
                 embedding_function=embeddings,
-                collection_name=collection_name
+                collection_name=collection_name,
+                use_hybrid_search=self.use_hybrid_search
             )
+            self._backfill_filter_metadata(vectorstore, persist_dir)
             
-            # Verificar que se cargó correctamente contando documentos
+            # Verificar que se cargó correctamente contando documentos. No se lanza una
+            # búsqueda de prueba: con búsqueda híbrida construiría el índice BM25 completo
             try:
-                # Intentar obtener algunos documentos para verificar que hay contenido
-                test_results = vectorstore.similarity_search("test", k=1)
-                doc_count = len(vectorstore.get()['ids']) if hasattr(vectorstore, 'get') else "desconocido"
+                doc_count = vectorstore.count()
                 logger.info(f"Vectorstore Chroma cargada correctamente")
                 logger.info(f"Número de documentos en la colección: {doc_count}")
-                logger.info(f"Búsqueda de prueba devolvió {len(test_results)} resultados")
-                
-                # Log de ejemplo de documento si existe
-                if test_results:
-                    logger.info(f"Ejemplo de documento recuperado: {test_results[0].page_content[:100]}...")
-                
                 return vectorstore
             except Exception as e:
                 logger.error(f"Error al verificar la vectorstore cargada: {e}")
@@ -139,6 +596,57 @@ class ChromaVectorStore(VectorStoreBase):
             logger.error(f"Collection name: {collection_name}")
             return None
     
+    @staticmethod
+    def _filter_metadata_marker(persist_dir: str) -> str:
+        """Ruta del marcador de la migración de metadatos de filtrado de una colección."""
+        return os.path.join(persist_dir, "filter_metadata_backfill.done")
+    
+    def _mark_filter_metadata_backfilled(self, persist_dir: str):
+        """Registra que todos los chunks de la colección tienen los metadatos de filtrado."""
+        try:
+            with open(self._filter_metadata_marker(persist_dir), "w", encoding="utf-8") as marker:
+                marker.write(str(time.time()))
+        except OSError as e:
+            logger.warning(f"No se pudo guardar el marcador de metadatos de filtrado: {e}")
+    
+    def _backfill_filter_metadata(self, vectorstore: Chroma, persist_dir: str):
+        """
+        Completa los metadatos de filtrado (ambito, cubo_source) de colecciones creadas sin ellos.
+
+        Las colecciones Chroma anteriores no guardaban el ámbito; sin él, los
+        filtros del workflow dejarían fuera todos sus chunks. Es una migración
+        de una sola vez: al terminar se deja un marcador en el directorio de la
+        colección, y las altas posteriores ya incluyen estos metadatos.
+
+        Args:
+            vectorstore: Instancia de Chroma vectorstore
+            persist_dir: Directorio de la colección
+        """
+        if os.path.exists(self._filter_metadata_marker(persist_dir)):
+            return
+        
+        try:
+            pending_ids, pending_metadatas = [], []
+            for chunk_id, metadata, _ in iterate_collection(vectorstore, include=["metadatas"]):
+                if metadata.get("ambito") and metadata.get("cubo_source"):
+                    continue
+                doc = Document(page_content="", metadata=dict(metadata))
+                pending_ids.append(chunk_id)
+                pending_metadatas.append(self.ensure_filter_metadata([doc])[0].metadata)
+            
+            if pending_ids:
+                batch_size = VECTORSTORE_CONFIG.get("manifest_scan_batch_size", 1000)
+                for i in range(0, len(pending_ids), batch_size):
+                    vectorstore._collection.update(ids=pending_ids[i:i + batch_size],
+                                                   metadatas=pending_metadatas[i:i + batch_size])
+                if isinstance(vectorstore, HybridChroma):
+                    vectorstore.invalidate_metadata_index()
+                logger.info(f"Metadatos de filtrado completados en {len(pending_ids)} chunks")
+            self._mark_filter_metadata_backfilled(persist_dir)
+        except Exception as e:
+            logger.warning(f"No se pudieron completar los metadatos de filtrado: {e}")
+    
+    @with_retrieval_cache
     def create_retriever(self, vectorstore: Chroma, k: Optional[int] = None, 
                       similarity_threshold: float = 0.7, **kwargs) -> BaseRetriever:
         """
@@ -159,31 +667,17 @@ class ChromaVectorStore(VectorStoreBase):
         # Obtener parámetros de búsqueda desde la configuración o parámetros
         k = k or VECTORSTORE_CONFIG.get("k_retrieval", 4)
         
-        logger.info(f"Creando retriever Chroma con k={k}, threshold={similarity_threshold}")
+        logger.info(f"Creando retriever Chroma con k={k}, threshold={similarity_threshold}, híbrido={self.use_hybrid_search}")
         
         try:
-            # Primero, intentar con similarity search (más compatible)
-            retriever = vectorstore.as_retriever(
-                search_type="similarity",
+            # Búsqueda por similitud conservando la puntuación de cada documento
+            retriever = ScoredRetriever(
+                vectorstore=vectorstore,
                 search_kwargs={
                     "k": k,
                 }
             )
             
-            # Hacer una prueba de recuperación
-            try:
-                test_query = "test"
-                test_docs = retriever.invoke(test_query)
-                logger.info(f"Retriever creado exitosamente - prueba devolvió {len(test_docs)} documentos")
-                
-                if test_docs:
-                    logger.info(f"Ejemplo de documento recuperado: {test_docs[0].page_content[:100]}...")
-                else:
-                    logger.warning("La prueba de retriever no devolvió documentos - posible problema")
-                    
-            except Exception as test_error:
-                logger.error(f"Error en prueba de retriever: {test_error}")
-                
             return retriever
             
         except Exception as e:
@@ -221,17 +715,19 @@ class ChromaVectorStore(VectorStoreBase):
         try:
             # Contar documentos antes
             try:
-                before_count = len(vectorstore.get()['ids']) if hasattr(vectorstore, 'get') else "desconocido"
+                before_count = vectorstore._collection.count()
                 logger.info(f"Documentos antes de añadir: {before_count}")
             except:
                 logger.info("No se pudo contar documentos antes de añadir")
             
-            # Añadir documentos
-            vectorstore.add_documents(documents)
+            # Añadir documentos (HybridChroma actualiza también su índice BM25)
+            vectorstore.add_documents(self.ensure_filter_metadata(documents))
+            if isinstance(vectorstore, HybridChroma):
+                vectorstore.persist_metadata_index()
             
             # Contar documentos después
             try:
-                after_count = len(vectorstore.get()['ids']) if hasattr(vectorstore, 'get') else "desconocido"
+                after_count = vectorstore._collection.count()
                 logger.info(f"Documentos después de añadir: {after_count}")
             except:
                 logger.info("No se pudo contar documentos después de añadir")
@@ -244,7 +740,9 @@ class ChromaVectorStore(VectorStoreBase):
             return False
     
     def load_documents(self, documents: List[Document], embeddings: Embeddings = None, 
-                     source_documents: Dict[str, Document] = None) -> bool:
+                     source_documents: Dict[str, Document] = None,
+                     chunk_size: Optional[int] = None,
+                     collection_name: Optional[str] = None) -> bool:
         """
         Carga documentos en la vectorstore Chroma.
         
@@ -252,6 +750,8 @@ class ChromaVectorStore(VectorStoreBase):
             documents: Lista de documentos a cargar
             embeddings: Modelo de embeddings a utilizar (opcional)
             source_documents: Diccionario con los documentos originales completos (opcional)
+            chunk_size: Tamaño de chunk de la colección (no se usa en Chroma)
+            collection_name: Colección de destino (por defecto, la de la configuración)
             
         Returns:
             bool: True si los documentos se cargaron correctamente
@@ -269,7 +769,7 @@ class ChromaVectorStore(VectorStoreBase):
             return False
             
         # Obtener el nombre de la colección
-        collection_name = VECTORSTORE_CONFIG.get("collection_name", "default_collection")
+        collection_name = collection_name or VECTORSTORE_CONFIG.get("collection_name", "default_collection")
         logger.info(f"Usando colección: {collection_name}")
         
         # Intentar cargar la vectorstore existente
@@ -338,6 +838,125 @@ class ChromaVectorStore(VectorStoreBase):
         
         logger.info("=== FIN DEBUG VECTORSTORE ===")
     
+    def count_chunks(self, vectorstore) -> Optional[int]:
+        """
+        Cuenta los chunks de la colección Chroma sin leer sus registros.
+        
+        Args:
+            vectorstore: Instancia de Chroma vectorstore
+            
+        Returns:
+            Optional[int]: Número de chunks o None si no se pudo contar
+        """
+        try:
+            return vectorstore._collection.count()
+        except Exception as e:
+            logger.warning(f"No se pudo contar los chunks de la colección: {e}")
+            return None
+    
+    def get_collection_manifest(self, vectorstore) -> Optional[Dict[str, Dict[str, Any]]]:
+        """
+        Obtiene el manifiesto exacto de la colección Chroma.
+        
+        Args:
+            vectorstore: Instancia de Chroma vectorstore
+            
+        Returns:
+            Optional[Dict[str, Dict[str, Any]]]: source -> {"chunk_count", "content_hash"} o None si falla
+        """
+        try:
+            records = (
+                (metadata.get("source"), metadata.get("chunk_hash"))
+                for _, metadata, _ in iterate_collection(vectorstore, include=["metadatas"])
+            )
+            manifest = self.build_manifest(records)
+        except Exception as e:
+            logger.warning(f"No se pudo construir el manifiesto de la colección: {e}")
+            return None
+        
+        logger.info(f"Manifiesto de la colección: {len(manifest)} fuentes")
+        return manifest
+    
+    def get_chunk_index(self, vectorstore, cubos: List[str]) -> Optional[Dict[str, Dict[str, List[Any]]]]:
+        """
+        Obtiene los identificadores de los chunks de cada cubo agrupados por hash de contenido.
+        
+        Args:
+            vectorstore: Instancia de Chroma vectorstore
+            cubos: Cubos a consultar
+            
+        Returns:
+            Optional[Dict[str, Dict[str, List[Any]]]]: cubo -> {chunk_hash: [ids]} o None si falla
+        """
+        if not cubos:
+            return None
+        
+        chunk_index: Dict[str, Dict[str, List[Any]]] = {cubo: {} for cubo in cubos}
+        try:
+            for chunk_id, metadata, text in iterate_collection(
+                    vectorstore, where={"cubo_source": {"$in": list(cubos)}}, include=["metadatas", "documents"]):
+                chunk_hash = metadata.get("chunk_hash") or self.compute_chunk_hash(text)
+                chunk_index.setdefault(metadata.get("cubo_source"), {}).setdefault(chunk_hash, []).append(chunk_id)
+        except Exception as e:
+            logger.warning(f"No se pudo obtener el índice de chunks de los cubos {cubos}: {e}")
+            return None
+        
+        return chunk_index
+    
+    def update_chunk_sources(self, vectorstore, sources: Dict[Any, str]) -> Set[Any]:
+        """
+        Actualiza el source de chunks conservados de la colección Chroma.
+        
+        Args:
+            vectorstore: Instancia de Chroma vectorstore
+            sources: Identificador del chunk -> nuevo source
+            
+        Returns:
+            Set[Any]: Identificadores de los chunks actualizados
+        """
+        if not sources or not isinstance(vectorstore, HybridChroma):
+            return set()
+        
+        try:
+            ids = list(sources)
+            data = vectorstore.get(ids=ids, include=["metadatas"])
+            metadatas = [{**(metadata or {}), "source": sources[chunk_id]}
+                         for chunk_id, metadata in zip(data["ids"], data["metadatas"])]
+            vectorstore.update_metadatas(data["ids"], metadatas)
+            vectorstore.persist_metadata_index()
+            logger.info(f"Actualizado el source de {len(metadatas)} chunks sin cambios")
+            return set(data["ids"])
+        except Exception as e:
+            logger.error(f"Error actualizando el source de los chunks: {e}")
+            return set()
+    
+    def remove_documents_by_ids(self, vectorstore, ids: List[Any]) -> bool:
+        """
+        Elimina chunks concretos de la vectorstore Chroma por su identificador.
+        
+        Args:
+            vectorstore: Instancia de Chroma vectorstore
+            ids: Identificadores de los chunks a eliminar
+            
+        Returns:
+            bool: True si se eliminaron correctamente
+        """
+        if not ids:
+            return True
+        
+        try:
+            ids = list(ids)
+            batch_size = VECTORSTORE_CONFIG.get("manifest_scan_batch_size", 1000)
+            for i in range(0, len(ids), batch_size):
+                vectorstore.delete(ids=ids[i:i + batch_size])
+            if isinstance(vectorstore, HybridChroma):
+                vectorstore.persist_metadata_index()
+            logger.info(f"Eliminados {len(ids)} chunks de Chroma")
+            return True
+        except Exception as e:
+            logger.error(f"Error eliminando chunks de Chroma: {e}")
+            return False
+    
     def get_existing_documents_metadata(self, vectorstore, field: str = "source") -> set:
         """
         Obtiene metadatos de documentos existentes para verificar duplicados.
@@ -352,16 +971,16 @@ class ChromaVectorStore(VectorStoreBase):
         existing_values = set()
         
         try:
-            if hasattr(vectorstore, 'get'):
-                # Obtener todos los metadatos de Chroma
-                all_data = vectorstore.get()
-                metadatas = all_data.get('metadatas', [])
-                
-                for metadata in metadatas:
-                    if metadata and field in metadata and metadata[field]:
+            if isinstance(vectorstore, HybridChroma) and field in INDEXED_FIELDS:
+                # Campos indexados: se leen del índice de metadatos
+                existing_values = vectorstore.get_metadata_values(field)
+            else:
+                # Resto de campos: recorrido paginado de los metadatos
+                for _, metadata, _ in iterate_collection(vectorstore, include=["metadatas"]):
+                    if metadata.get(field):
                         existing_values.add(metadata[field])
-                        
-                logger.info(f"Metadatos existentes encontrados para '{field}': {len(existing_values)} valores únicos")
+            
+            logger.info(f"Metadatos existentes encontrados para '{field}': {len(existing_values)} valores únicos")
                         
         except Exception as e:
             logger.warning(f"No se pudieron obtener metadatos existentes: {e}")
@@ -385,22 +1004,19 @@ class ChromaVectorStore(VectorStoreBase):
         logger.info(f"Eliminando documentos de cubos en Chroma: {cubos_to_remove}")
         
         try:
-            # Para Chroma, obtener IDs y eliminar
-            all_data = vectorstore.get()
-            ids_to_delete = []
-            
-            for i, metadata in enumerate(all_data.get('metadatas', [])):
-                if metadata and 'cubo_source' in metadata:
-                    if metadata['cubo_source'] in cubos_to_remove:
-                        ids_to_delete.append(all_data['ids'][i])
-            
-            if ids_to_delete:
-                vectorstore.delete(ids=ids_to_delete)
-                logger.info(f"Eliminados {len(ids_to_delete)} documentos de Chroma")
+            # Obtener solo los IDs de los cubos (índice de metadatos o recorrido filtrado)
+            if isinstance(vectorstore, HybridChroma):
+                ids_to_delete = vectorstore.get_ids_by_metadata("cubo_source", cubos_to_remove)
             else:
-                logger.info("No se encontraron documentos para eliminar")
+                ids_to_delete = [
+                    chunk_id for chunk_id, _, _ in iterate_collection(
+                        vectorstore, where={"cubo_source": {"$in": list(cubos_to_remove)}})
+                ]
             
-            return True
+            if not ids_to_delete:
+                logger.info("No se encontraron documentos para eliminar")
+                return True
+            return self.remove_documents_by_ids(vectorstore, ids_to_delete)
             
         except Exception as e:
             logger.error(f"Error eliminando documentos de Chroma: {e}")
@@ -0,0 +1,162 @@
+"""
+Caché persistente del contexto generado para cada chunk.
+
+La generación de contexto llama al modelo principal una vez por chunk con el
+documento completo, y su resultado solo se guardaba en la propia colección:
+al eliminar o recrear una colección había que repetir todo el trabajo. Esta
+caché guarda en SQLite el contexto de cada chunk bajo la clave
+(hash del documento, hash del chunk, chunk_size), de modo que una
+reconstrucción solo llama al modelo para los chunks nuevos o modificados.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+
+# Usar el sistema de logging centralizado
+from langagent.config.logging_config import get_logger
+logger = get_logger(__name__)
+
+# Máximo de claves por consulta (límite de parámetros de SQLite: 999)
+_SQLITE_BATCH = 300
+
+ContextKey = Tuple[str, str, int]
+
+
+class ContextGenerationCache:
+    """Almacén SQLite de contextos generados por (documento, chunk, chunk_size)."""
+
+    def __init__(self, db_path: str):
+        """
+        Inicializa la caché de contextos y crea la tabla si no existe.
+
+        Args:
+            db_path: Ruta del fichero SQLite
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS contexts (
+                    doc_hash TEXT NOT NULL,
+                    chunk_hash TEXT NOT NULL,
+                    chunk_size INTEGER NOT NULL,
+                    context TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (doc_hash, chunk_hash, chunk_size)
+                )
+                """
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Abre una conexión nueva por operación (las conexiones SQLite no se comparten entre hilos)."""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def hash_text(text: str) -> str:
+        """
+        Calcula el hash de un documento o chunk.
+
+        Args:
+            text: Texto a identificar
+
+        Returns:
+            str: Hash SHA-256 del texto
+        """
+        return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[ContextKey]) -> Dict[ContextKey, str]:
+        """
+        Busca los contextos almacenados para varias claves.
+
+        Args:
+            keys: Claves (doc_hash, chunk_hash, chunk_size)
+
+        Returns:
+            Dict[ContextKey, str]: Contexto de cada clave encontrada
+        """
+        if not keys:
+            return {}
+
+        found: Dict[ContextKey, str] = {}
+        try:
+            with self._connect() as conn:
+                for i in range(0, len(keys), _SQLITE_BATCH):
+                    batch = keys[i:i + _SQLITE_BATCH]
+                    conditions = " OR ".join("(doc_hash = ? AND chunk_hash = ? AND chunk_size = ?)" for _ in batch)
+                    params = [value for key in batch for value in key]
+                    for doc_hash, chunk_hash, chunk_size, context in conn.execute(
+                            f"SELECT doc_hash, chunk_hash, chunk_size, context FROM contexts WHERE {conditions}", params):
+                        found[(doc_hash, chunk_hash, chunk_size)] = context
+        except sqlite3.Error as e:
+            logger.warning(f"No se pudo consultar la caché de contextos: {e}")
+            return {}
+
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(set(keys)) - len(found)
+        return found
+
+    def put_many(self, entries: List[Tuple[ContextKey, str]]):
+        """
+        Guarda contextos generados. Los contextos vacíos (errores de generación) no se guardan.
+
+        Args:
+            entries: Pares (clave, contexto)
+        """
+        now = time.time()
+        rows = [(*key, context, now) for key, context in entries if context and context.strip()]
+        if not rows:
+            return
+
+        try:
+            with self._lock, self._connect() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO contexts (doc_hash, chunk_hash, chunk_size, context, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    rows
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"No se pudieron guardar los contextos en caché: {e}")
+
+    def stats(self) -> Dict[str, object]:
+        """
+        Devuelve los contadores de la caché para monitorización.
+
+        Returns:
+            Dict[str, object]: Aciertos, fallos, tasa de acierto, tamaño y ruta
+        """
+        try:
+            with self._connect() as conn:
+                size = conn.execute("SELECT COUNT(*) FROM contexts").fetchone()[0]
+        except sqlite3.Error:
+            size = None
+
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "size": size,
+                "path": self.db_path,
+            }
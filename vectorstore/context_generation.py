@@ -0,0 +1,384 @@
+"""
+Generación de contexto para chunks con el LLM principal.
+
+ContextGenerationMixin reúne la lógica que comparten los handlers de
+vectorstore que enriquecen cada chunk con una descripción contextual antes de
+indexarlo: configuración del generador, caché persistente de contextos,
+planificación por documento y generación por lotes con vuelta a la
+generación por chunk.
+"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+from tqdm import tqdm
+from langagent.config.config import VECTORSTORE_CONFIG, CACHE_CONFIG, PATHS_CONFIG
+from langagent.vectorstore.context_cache import ContextGenerationCache
+
+# Usar el sistema de logging centralizado
+from langagent.config.logging_config import get_logger
+logger = get_logger(__name__)
+
+
+class ContextGenerationMixin:
+    """Generación de contexto de chunks para handlers de vectorstore."""
+    
+    def _init_context_generation(self):
+        """Inicializa el estado de la generación de contexto a partir de la configuración."""
+        self.use_context_generation = VECTORSTORE_CONFIG.get("use_context_generation", False)
+        self.context_generator = None
+        self.batch_context_generator = None
+        self._context_cache = None
+    
+    def set_context_generator(self, context_generator, batch_context_generator=None):
+        """
+        Establece el generador de contexto para enriquecer los chunks.
+        
+        Args:
+            context_generator: Generador de contexto preconfigurado
+            batch_context_generator: Generador que contextualiza varios chunks de un documento
+                en una sola llamada (opcional; si falla se usa context_generator)
+        """
+        if not self.use_context_generation:
+            logger.warning("La generación de contexto está desactivada en la configuración. No se configurará el generador.")
+            logger.warning("Establece VECTORSTORE_CONFIG['use_context_generation'] = True para activarla.")
+            return
+            
+        if context_generator is None:
+            logger.error("Error: Se proporcionó un generador de contexto nulo")
+            return
+            
+        try:
+            logger.info("Configurando generador de contexto para chunks...")
+            self.context_generator = context_generator
+            self.batch_context_generator = batch_context_generator
+            if batch_context_generator is not None:
+                logger.info(f"Generación de contexto por lotes activada ({VECTORSTORE_CONFIG.get('context_batch_size', 10)} chunks por llamada)")
+            
+            # La prueba hace una llamada al LLM antes de poder atender preguntas
+            if not VECTORSTORE_CONFIG.get("context_generator_self_test", False):
+                logger.info("Generador de contexto configurado (sin llamada de prueba)")
+                return
+            
+            # Verificar el tipo de context_generator
+            logger.info(f"Tipo de context_generator: {type(context_generator)}")
+            
+            # Realizar una pequeña prueba para verificar que funciona
+            logger.info("Iniciando prueba del generador de contexto...")
+            test_input = {
+                "document": "Este es un documento de prueba para verificar que el generador funciona.",
+                "chunk": "Este es un chunk de prueba."
+            }
+            logger.info(f"Enviando entrada de prueba: {test_input}")
+            
+            test_result = None
+            try:
+                test_result = self.context_generator.invoke(test_input)
+                logger.info(f"Tipo de resultado: {type(test_result)}")
+                logger.info(f"Resultado completo: {test_result}")
+            except Exception as invoke_err:
+                logger.error(f"Error al invocar el generador de contexto: {str(invoke_err)}")
+                # Intentar con un formato alternativo
+                try:
+                    logger.info("Intentando formato alternativo...")
+                    test_result = self.context_generator(test_input)
+                    logger.info(f"Resultado con formato alternativo: {test_result}")
+                except Exception as alt_err:
+                    logger.error(f"Error al usar formato alternativo: {str(alt_err)}")
+            
+            # Verificar que el resultado tenga un formato válido (dict con key 'context' o string)
+            if isinstance(test_result, dict) and 'context' in test_result:
+                logger.info("Generador de contexto configurado y probado correctamente.")
+                ejemplo = test_result['context']
+                logger.info(f"Ejemplo de generación (JSON): '{ejemplo}'")
+            elif isinstance(test_result, str) and len(test_result.strip()) > 0:
+                logger.info("Generador de contexto configurado y probado correctamente.")
+                logger.info(f"Ejemplo de generación (string): '{test_result.strip()}'")
+            else:
+                logger.warning("El generador de contexto se configuró pero la prueba no generó texto o el resultado no tiene el formato esperado.")
+                logger.warning(f"Resultado obtenido: {test_result}")
+                logger.warning("Comprueba que el modelo LLM está funcionando correctamente y que el prompt es adecuado.")
+                
+                # Intentar continuar a pesar del error
+                logger.info("Se intentará continuar con el generador de contexto a pesar del error.")
+                
+            # En todos los casos, configuramos el generador si obtuvimos algún resultado
+            if test_result is not None:
+                logger.info("Generador de contexto configurado correctamente")
+                
+        except Exception as e:
+            logger.error(f"Error al configurar el generador de contexto: {str(e)}")
+            import traceback
+            logger.error(f"Traza completa: {traceback.format_exc()}")
+            self.context_generator = None
+    
+    def _get_context_cache(self) -> Optional[ContextGenerationCache]:
+        """
+        Obtiene la caché persistente de contextos generados, creándola la primera vez.
+        
+        Returns:
+            Optional[ContextGenerationCache]: Caché de contextos o None si está desactivada
+        """
+        if not CACHE_CONFIG.get("context_cache_enabled", True):
+            return None
+        
+        if self._context_cache is None:
+            try:
+                self._context_cache = ContextGenerationCache(
+                    os.path.join(PATHS_CONFIG.get("cache_dir", "./cache"),
+                                 CACHE_CONFIG.get("context_cache_file", "context_generation.sqlite"))
+                )
+            except Exception as e:
+                logger.warning(f"No se pudo inicializar la caché de contextos: {e}")
+                return None
+        return self._context_cache
+    
+    def _invoke_context_generator(self, full_document: Document, chunk: Document, chunk_size: int) -> str:
+        """
+        Genera el contexto de un chunk con el LLM.
+        
+        Args:
+            full_document: Documento original completo
+            chunk: Chunk a contextualizar
+            chunk_size: Tamaño de chunk de la colección
+            
+        Returns:
+            str: Contexto generado
+        """
+        context_input = {
+            "document": full_document.page_content,
+            "chunk": chunk.page_content,
+            "chunk_size": chunk_size
+        }
+        
+        context_result = self.context_generator.invoke(context_input)
+        
+        # Procesar resultado
+        if isinstance(context_result, dict) and 'context' in context_result:
+            context = context_result['context']
+        else:
+            context = context_result if isinstance(context_result, dict) else str(context_result)
+        
+        if not isinstance(context, str):
+            context = json.dumps(context, ensure_ascii=False, indent=2)
+        
+        return context.strip()
+    
+    def _invoke_batch_context_generator(self, full_document: Document, chunks: List[Document],
+                                        chunk_size: int) -> Optional[List[str]]:
+        """
+        Genera el contexto de varios chunks de un documento en una sola llamada al LLM.
+        
+        Args:
+            full_document: Documento original completo
+            chunks: Chunks del documento a contextualizar
+            chunk_size: Tamaño de chunk de la colección
+            
+        Returns:
+            Optional[List[str]]: Un contexto por chunk (en el mismo orden) o None si la
+            respuesta no se puede interpretar
+        """
+        try:
+            result = self.batch_context_generator.invoke({
+                "document": full_document.page_content,
+                "chunks": [chunk.page_content for chunk in chunks],
+                "chunk_size": chunk_size
+            })
+        except Exception as e:
+            logger.warning(f"Error en la generación de contexto por lotes: {e}")
+            return None
+        
+        items = result.get("contexts") if isinstance(result, dict) else result
+        if not isinstance(items, list):
+            logger.warning("La respuesta de la generación por lotes no contiene un array de contextos")
+            return None
+        
+        contexts: Dict[int, str] = {}
+        for position, item in enumerate(items, start=1):
+            if isinstance(item, dict):
+                index, context = item.get("chunk", position), item.get("context")
+            else:
+                index, context = position, item
+            try:
+                index = int(index)
+            except (TypeError, ValueError):
+                index = position
+            if isinstance(context, str) and context.strip():
+                contexts[index] = context.strip()
+        
+        if sorted(contexts) != list(range(1, len(chunks) + 1)):
+            logger.warning(f"La generación por lotes devolvió {len(contexts)} contextos válidos para {len(chunks)} chunks")
+            return None
+        
+        return [contexts[index] for index in range(1, len(chunks) + 1)]
+    
+    def _generate_context_for_chunks(self, documents: List[Document], 
+                               source_documents: Dict[str, Document], 
+                               chunk_size: Optional[int] = None) -> List[Document]:
+        """
+        Genera contexto para cada chunk utilizando el documento completo y el LLM.
+        
+        Los contextos ya generados se reutilizan de la caché persistente
+        (hash del documento, hash del chunk, chunk_size). Los chunks pendientes
+        se agrupan por documento y cada grupo se procesa seguido en el mismo
+        hilo, de modo que las peticiones consecutivas comparten el prefijo del
+        prompt (el documento completo) y el servidor puede reutilizar su caché.
+        
+        Args:
+            documents: Lista de chunks (documentos) a enriquecer con contexto
+            source_documents: Diccionario con los documentos originales completos
+            chunk_size: Tamaño de chunk específico de la colección (opcional)
+            
+        Returns:
+            List[Document]: Documentos con contexto generado añadido
+        """
+        if not self.use_context_generation or not self.context_generator:
+            logger.warning("No se puede generar contexto: generador no configurado o función desactivada")
+            return documents
+        
+        if not source_documents or len(source_documents) == 0:
+            logger.warning("No se puede generar contexto: no se proporcionaron documentos originales")
+            return documents
+            
+        logger.info(f"Generando contexto para {len(documents)} chunks...")
+        
+        # Configuración de optimización
+        max_workers = VECTORSTORE_CONFIG.get("context_max_workers", 3)  # Concurrencia limitada
+        skip_existing = VECTORSTORE_CONFIG.get("skip_existing_context", True)
+        
+        # Determinar el chunk_size a usar: parámetro específico o configuración global
+        final_chunk_size = chunk_size if chunk_size is not None else VECTORSTORE_CONFIG.get("chunk_size", 512)
+        
+        # Filtrar documentos que necesitan contexto, agrupados por documento original
+        docs_by_source: Dict[str, List[Tuple[int, Document, Any]]] = {}
+        docs_with_existing_context = 0
+        doc_hashes: Dict[str, str] = {}
+        
+        for i, doc in enumerate(documents):
+            # Saltar documentos que ya tienen contexto si está configurado
+            if skip_existing and doc.metadata.get('context_generation', '').strip():
+                docs_with_existing_context += 1
+                continue
+                
+            source_path = doc.metadata.get('source', '')
+            if source_path and source_path in source_documents:
+                full_document = source_documents[source_path]
+                if source_path not in doc_hashes:
+                    doc_hashes[source_path] = ContextGenerationCache.hash_text(full_document.page_content)
+                chunk_hash = doc.metadata.get('chunk_hash') or ContextGenerationCache.hash_text(doc.page_content)
+                cache_key = (doc_hashes[source_path], chunk_hash, final_chunk_size)
+                docs_by_source.setdefault(source_path, []).append((i, doc, cache_key))
+        
+        if docs_with_existing_context > 0:
+            logger.info(f"Saltando {docs_with_existing_context} documentos que ya tienen contexto")
+        
+        # Reutilizar los contextos de la caché persistente
+        context_cache = self._get_context_cache()
+        cached_count = 0
+        if context_cache is not None and docs_by_source:
+            cached_contexts = context_cache.get_many(
+                [cache_key for group in docs_by_source.values() for _, _, cache_key in group]
+            )
+            for source_path in list(docs_by_source):
+                pending = []
+                for doc_idx, doc, cache_key in docs_by_source[source_path]:
+                    if cache_key in cached_contexts:
+                        documents[doc_idx].metadata['context_generation'] = cached_contexts[cache_key]
+                        cached_count += 1
+                    else:
+                        pending.append((doc_idx, doc, cache_key))
+                if pending:
+                    docs_by_source[source_path] = pending
+                else:
+                    del docs_by_source[source_path]
+            logger.info(f"Contextos reutilizados de la caché: {cached_count}")
+        
+        total_docs = sum(len(group) for group in docs_by_source.values())
+        if total_docs == 0:
+            logger.info("No hay documentos para procesar contexto")
+            return documents
+        
+        logger.info(f"Procesando contexto para {total_docs} chunks de {len(docs_by_source)} documentos")
+        logger.info(f"Usando chunk_size específico de la colección: {final_chunk_size}")
+        
+        # Chunks por llamada en la generación por lotes (1 = una llamada por chunk)
+        batch_size = VECTORSTORE_CONFIG.get("context_batch_size", 10) if self.batch_context_generator else 1
+        
+        # Procesa todos los chunks de un documento seguidos en el mismo hilo
+        def process_document(source_path, group):
+            full_document = source_documents[source_path]
+            group_results = []
+            for start in range(0, len(group), batch_size):
+                batch = group[start:start + batch_size]
+                
+                batch_contexts = None
+                if len(batch) > 1:
+                    batch_contexts = self._invoke_batch_context_generator(
+                        full_document, [doc for _, doc, _ in batch], final_chunk_size)
+                    if batch_contexts is None:
+                        logger.info(f"Usando generación por chunk para {len(batch)} chunks de {source_path}")
+                
+                for position, (doc_idx, doc, cache_key) in enumerate(batch):
+                    if batch_contexts is not None:
+                        context = batch_contexts[position]
+                    else:
+                        try:
+                            context = self._invoke_context_generator(full_document, doc, final_chunk_size)
+                        except Exception as e:
+                            logger.error(f"Error procesando chunk {doc_idx}: {str(e)}")
+                            context = ""
+                    group_results.append((doc_idx, cache_key, context))
+            
+            if context_cache is not None:
+                context_cache.put_many([(cache_key, context) for _, cache_key, context in group_results])
+            return group_results
+        
+        processed_count = 0
+        
+        # Crear barra de progreso
+        progress_bar = tqdm(total=total_docs, desc="Generando contexto", unit="chunk")
+        
+        # Los documentos más largos primero para repartir mejor la carga entre hilos
+        groups = sorted(docs_by_source.items(), key=lambda item: len(item[1]), reverse=True)
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            future_to_group = {
+                executor.submit(process_document, source_path, group): group
+                for source_path, group in groups
+            }
+            
+            for future in as_completed(future_to_group):
+                try:
+                    group_results = future.result()
+                    
+                    # Aplicar resultados al documento original
+                    for doc_idx, _, context in group_results:
+                        documents[doc_idx].metadata['context_generation'] = context
+                        processed_count += 1
+                        
+                        # Actualizar barra de progreso
+                        progress_bar.update(1)
+                        completion_percentage = (processed_count / total_docs) * 100
+                        progress_bar.set_description(f"Generando contexto {completion_percentage:.1f}%")
+                        
+                except Exception as e:
+                    logger.error(f"Error procesando documento: {str(e)}")
+                    # Actualizar progreso incluso si falla el documento
+                    progress_bar.update(len(future_to_group[future]))
+        
+        progress_bar.close()
+        
+        # Contar documentos con contexto final
+        docs_with_context = sum(1 for doc in documents if doc.metadata.get('context_generation', '').strip())
+        
+        logger.info(f"Resumen de generación de contexto:")
+        logger.info(f"  Total de chunks: {len(documents)}")
+        logger.info(f"  Chunks procesados: {processed_count}")
+        logger.info(f"  Chunks reutilizados de la caché: {cached_count}")
+        logger.info(f"  Chunks con contexto final: {docs_with_context}")
+        logger.info(f"  Chunks con contexto previo: {docs_with_existing_context}")
+        
+        return documents
@@ -3,13 +3,17 @@ DocumentUploader para gestionar la carga inteligente de documentos en vectorstor
 Maneja la verificación de documentos existentes y actualizaciones incrementales.
 """
 
+import contextvars
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Dict, Any, Optional, Set, Tuple
 from langchain_core.documents import Document
 from langchain_core.embeddings import Embeddings
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langagent.vectorstore.base import VectorStoreBase
+from langagent.vectorstore.ingestion_stats import IngestionStats, collect_ingestion_stats, track_stage
+from langagent.vectorstore.retrieval_cache import get_retrieval_cache
 from langagent.config.config import VECTORSTORE_CONFIG
 from langagent.models.constants import CUBO_TO_AMBITO
 from tqdm import tqdm
@@ -31,9 +35,12 @@ class DocumentUploader:
         """
         self.vectorstore_handler = vectorstore_handler
         self.embeddings = embeddings
+        # Funciones a notificar cuando cambia el contenido de una colección
+        self._change_listeners = []
         # No inicializar text_splitter aquí - se creará dinámicamente según la colección
     
-    def extract_cubo_and_version(self, source: str) -> Tuple[Optional[str], Optional[int]]:
+    @staticmethod
+    def extract_cubo_and_version(source: str) -> Tuple[Optional[str], Optional[int]]:
         """
         Extrae el nombre del cubo y la versión del source path.
         Es más robusto para manejar paths completos.
@@ -58,10 +65,43 @@ class DocumentUploader:
         logger.debug(f"No se pudo extraer el cubo y la versión de: {source}")
         return None, None
     
+    def get_existing_cubos_manifest(self, vectorstore) -> Optional[Dict[str, Dict[str, Any]]]:
+        """
+        Obtiene el manifiesto de cubos indexados a partir del manifiesto de la colección.
+        
+        Para cada cubo se conserva la versión más alta encontrada junto con su
+        fuente, número de chunks y hash de contenido.
+        
+        Args:
+            vectorstore: Instancia de vectorstore
+            
+        Returns:
+            Optional[Dict[str, Dict[str, Any]]]: cubo -> {"version", "source", "chunk_count", "content_hash"},
+            o None si la vectorstore no soporta manifiestos
+        """
+        collection_manifest = self.vectorstore_handler.get_collection_manifest(vectorstore)
+        if collection_manifest is None:
+            return None
+        
+        cubos_manifest = {}
+        for source, entry in collection_manifest.items():
+            cubo, version = self.extract_cubo_and_version(source)
+            if not cubo or version is None or cubo == "general":
+                continue
+            
+            existing = cubos_manifest.get(cubo)
+            if existing is None or version > existing["version"]:
+                cubos_manifest[cubo] = {"version": version, "source": source, **entry}
+        
+        return cubos_manifest
+    
     def get_existing_cubos_with_versions(self, vectorstore) -> Dict[str, int]:
         """
         Obtiene los cubos existentes con sus versiones.
         
+        Usa el manifiesto de la colección (un único recorrido exacto) y, si la
+        vectorstore no lo soporta, los valores de source existentes.
+        
         Args:
             vectorstore: Instancia de vectorstore
             
@@ -71,18 +111,23 @@ class DocumentUploader:
         existing_cubos = {}
         
         try:
-            # Obtener metadatos existentes
-            existing_metadata = self.vectorstore_handler.get_existing_documents_metadata(vectorstore, "source")
-            
-            logger.info(f"Analizando {len(existing_metadata)} fuentes existentes...")
+            cubos_manifest = self.get_existing_cubos_manifest(vectorstore)
             
-            for source in existing_metadata:
-                cubo, version = self.extract_cubo_and_version(source)
-                if cubo and version is not None and cubo != "general":
-                    # Mantener la versión más alta encontrada para cada cubo
-                    existing_version = existing_cubos.get(cubo)
-                    if existing_version is None or version > existing_version:
-                        existing_cubos[cubo] = version
+            if cubos_manifest is not None:
+                existing_cubos = {cubo: entry["version"] for cubo, entry in cubos_manifest.items()}
+            else:
+                # Obtener metadatos existentes
+                existing_metadata = self.vectorstore_handler.get_existing_documents_metadata(vectorstore, "source")
+                
+                logger.info(f"Analizando {len(existing_metadata)} fuentes existentes...")
+                
+                for source in existing_metadata:
+                    cubo, version = self.extract_cubo_and_version(source)
+                    if cubo and version is not None and cubo != "general":
+                        # Mantener la versión más alta encontrada para cada cubo
+                        existing_version = existing_cubos.get(cubo)
+                        if existing_version is None or version > existing_version:
+                            existing_cubos[cubo] = version
             
             logger.info(f"Cubos existentes con versiones: {existing_cubos}")
             
@@ -173,6 +218,67 @@ class DocumentUploader:
         
         return final_documents, cubos_to_remove
     
+    def split_documents(self, text_splitter: RecursiveCharacterTextSplitter,
+                        documents: List[Document]) -> List[Document]:
+        """
+        Divide los documentos en chunks y guarda el hash de contenido de cada chunk en sus metadatos.
+        
+        Args:
+            text_splitter: Splitter de la colección
+            documents: Documentos a dividir
+            
+        Returns:
+            List[Document]: Chunks con metadata["chunk_hash"]
+        """
+        chunks = text_splitter.split_documents(documents)
+        for chunk in chunks:
+            chunk.metadata["chunk_hash"] = self.vectorstore_handler.compute_chunk_hash(chunk.page_content)
+        return chunks
+    
+    def plan_chunk_updates(self, chunks: List[Document],
+                           chunk_index: Dict[str, Dict[str, List[Any]]]) -> Tuple[List[Document], List[Any], List[Tuple[Any, Document]]]:
+        """
+        Compara los chunks de la nueva versión de los cubos con los almacenados.
+        
+        Los chunks cuyo hash ya está almacenado para el mismo cubo se conservan
+        (no se vuelven a generar embeddings ni contexto); solo se insertan los
+        chunks nuevos o modificados y se eliminan los que han desaparecido. Los
+        conservados se devuelven emparejados con el chunk nuevo para actualizar
+        su source a la nueva versión.
+        
+        Args:
+            chunks: Chunks a cargar (con metadata["chunk_hash"])
+            chunk_index: cubo -> {chunk_hash: [ids]} de los cubos actualizados
+            
+        Returns:
+            Tuple[List[Document], List[Any], List[Tuple[Any, Document]]]:
+                (chunks_a_insertar, ids_a_eliminar, [(id_conservado, chunk_nuevo)])
+        """
+        # Copia de los ids pendientes de emparejar (un chunk repetido consume un id por aparición)
+        remaining = {cubo: {chunk_hash: list(ids) for chunk_hash, ids in hashes.items()}
+                     for cubo, hashes in chunk_index.items()}
+        chunks_to_add = []
+        retained = []
+        
+        for chunk in chunks:
+            cubo, _ = self.extract_cubo_and_version(chunk.metadata.get("source", ""))
+            stored_hashes = remaining.get(cubo)
+            if stored_hashes is None:
+                chunks_to_add.append(chunk)
+                continue
+            
+            stored_ids = stored_hashes.get(chunk.metadata.get("chunk_hash"))
+            if stored_ids:
+                retained.append((stored_ids.pop(), chunk))
+            else:
+                chunks_to_add.append(chunk)
+        
+        ids_to_delete = [chunk_id for hashes in remaining.values() for ids in hashes.values() for chunk_id in ids]
+        
+        logger.info(f"Actualización por chunks de {sorted(chunk_index)}: {len(retained)} sin cambios, "
+                    f"{len(chunks_to_add)} a insertar, {len(ids_to_delete)} a eliminar")
+        return chunks_to_add, ids_to_delete, retained
+    
     def remove_documents_by_cubo(self, vectorstore, cubos_to_remove: List[str]) -> bool:
         """
         Elimina documentos de cubos específicos de la vectorstore.
@@ -200,6 +306,49 @@ class DocumentUploader:
             logger.error(f"Error general eliminando documentos: {e}")
             return False
     
+    def _get_cubos_from_documents(self, documents: List[Document]) -> List[str]:
+        """
+        Obtiene los nombres de cubo de una lista de documentos a partir de su fuente.
+        
+        Args:
+            documents: Lista de documentos
+            
+        Returns:
+            List[str]: Cubos distintos presentes en los documentos
+        """
+        cubos = set()
+        for doc in documents:
+            cubo, _ = self.extract_cubo_and_version(doc.metadata.get("source", ""))
+            if cubo:
+                cubos.add(cubo)
+        return sorted(cubos)
+    
+    def _notify_documents_changed(self, collection_name: str, cubos: List[str]):
+        """
+        Invalida las cachés que dependen del contenido de una colección tras añadir o eliminar cubos.
+        
+        Args:
+            collection_name: Nombre de la colección modificada
+            cubos: Cubos añadidos o eliminados
+        """
+        logger.info(f"Colección '{collection_name}' modificada (cubos: {cubos}) - invalidando cachés")
+        get_retrieval_cache().invalidate(collection_name)
+        
+        for listener in self._change_listeners:
+            try:
+                listener(collection_name, cubos)
+            except Exception as e:
+                logger.error(f"Error notificando cambios de la colección '{collection_name}': {e}")
+    
+    def register_change_listener(self, listener):
+        """
+        Registra una función a la que se notificará cada vez que se añadan o eliminen cubos.
+        
+        Args:
+            listener: Función con firma listener(collection_name, cubos)
+        """
+        self._change_listeners.append(listener)
+    
     def load_documents_intelligently(self, documents: List[Document], 
                                    collection_name: str = None,
                                    force_recreate: bool = False,
@@ -244,28 +393,62 @@ class DocumentUploader:
             if not documents_to_load and not cubos_to_remove:
                 logger.info("No hay cambios que aplicar")
                 return True
-              # Eliminar documentos obsoletos si es necesario
-            if cubos_to_remove:
+            
+            # Chunkar documentos a cargar usando el text_splitter dinámico
+            with track_stage(collection_name, "split", len(documents_to_load)):
+                new_chunks = self.split_documents(text_splitter, documents_to_load) if documents_to_load else []
+            
+            # Índice por hash de los chunks almacenados de los cubos con nueva versión
+            chunk_index = None
+            if cubos_to_remove and VECTORSTORE_CONFIG.get("incremental_chunk_updates", True):
+                chunk_index = self.vectorstore_handler.get_chunk_index(existing_vectorstore, cubos_to_remove)
+            
+            if chunk_index is not None:
+                # Solo se insertan los chunks nuevos o modificados y se eliminan los desaparecidos
+                new_chunks, ids_to_delete, retained = self.plan_chunk_updates(new_chunks, chunk_index)
+                
+                # Los chunks conservados pasan a la nueva versión; los que la vectorstore no
+                # pueda actualizar se sustituyen como si hubieran cambiado
+                retained_sources = {chunk_id: chunk.metadata.get("source") for chunk_id, chunk in retained}
+                updated_ids = set()
+                if retained_sources:
+                    updated_ids = self.vectorstore_handler.update_chunk_sources(existing_vectorstore, retained_sources)
+                not_updated = [(chunk_id, chunk) for chunk_id, chunk in retained if chunk_id not in updated_ids]
+                if not_updated:
+                    logger.warning(f"No se pudo actualizar el source de {len(not_updated)} chunks sin cambios; se vuelven a insertar")
+                    new_chunks.extend(chunk for _, chunk in not_updated)
+                    ids_to_delete.extend(chunk_id for chunk_id, _ in not_updated)
+                if updated_ids:
+                    self._notify_documents_changed(collection_name, cubos_to_remove)
+                if ids_to_delete:
+                    removed = self.vectorstore_handler.remove_documents_by_ids(existing_vectorstore, ids_to_delete)
+                    self._notify_documents_changed(collection_name, cubos_to_remove)
+                    if not removed:
+                        logger.error("Error eliminando chunks obsoletos")
+                        return False
+            elif cubos_to_remove:
+                # Eliminar documentos obsoletos si es necesario
                 logger.info(f"Eliminando documentos obsoletos de cubos: {cubos_to_remove}")
-                if not self.remove_documents_by_cubo(existing_vectorstore, cubos_to_remove):
+                removed = self.remove_documents_by_cubo(existing_vectorstore, cubos_to_remove)
+                self._notify_documents_changed(collection_name, cubos_to_remove)
+                if not removed:
                     logger.error("Error eliminando documentos obsoletos")
                     return False
             
-            if documents_to_load:
-                logger.info(f"Cargando {len(documents_to_load)} documentos actualizados...")
-                
-                # Chunkar documentos a cargar usando el text_splitter dinámico
-                new_chunks = text_splitter.split_documents(documents_to_load)
+            if new_chunks:
+                logger.info(f"Cargando {len(new_chunks)} chunks de {len(documents_to_load)} documentos actualizados...")
                 
                 # Crear diccionario de documentos originales para generación de contexto
                 source_documents = {doc.metadata.get('source', str(i)): doc for i, doc in enumerate(documents_to_load)}
                   # Añadir documentos con generación de contexto, pasando el chunk_size específico
-                return self.vectorstore_handler.add_documents_to_collection(
+                success = self.vectorstore_handler.add_documents_to_collection(
                     existing_vectorstore, 
                     new_chunks, 
                     source_documents,
                     chunk_size=final_chunk_size
                 )
+                self._notify_documents_changed(collection_name, self._get_cubos_from_documents(new_chunks))
+                return success
             
             return True
             
@@ -274,23 +457,31 @@ class DocumentUploader:
             logger.info("Creando nueva vectorstore...")
             
             # Chunkar todos los documentos usando el text_splitter dinámico
-            chunked_documents = text_splitter.split_documents(documents)
+            with track_stage(collection_name, "split", len(documents)):
+                chunked_documents = self.split_documents(text_splitter, documents)
             
             # Crear diccionario de documentos originales para generación de contexto
             source_documents = {doc.metadata.get('source', str(i)): doc for i, doc in enumerate(documents)}
               # Cargar documentos usando el método existente (incluye generación de contexto)
-            return self.vectorstore_handler.load_documents(
+            success = self.vectorstore_handler.load_documents(
                 chunked_documents, 
                 embeddings=self.embeddings,
                 source_documents=source_documents,
-                chunk_size=final_chunk_size
+                chunk_size=final_chunk_size,
+                collection_name=collection_name
             )
+            self._notify_documents_changed(collection_name, self._get_cubos_from_documents(documents))
+            return success
     
     def create_adaptive_collections(self, documents: List[Document]) -> Dict[str, bool]:
         """
         Crea colecciones adaptativas con diferentes tamaños de chunk usando la configuración.
         Incluye lógica de versiones para cada colección.
         
+        Las colecciones se construyen en paralelo con un número acotado de hilos
+        (VECTORSTORE_CONFIG["adaptive_build_workers"]) y al terminar se muestra el
+        rendimiento de cada etapa de la carga.
+        
         Args:
             documents: Lista de documentos a procesar
             
@@ -305,28 +496,45 @@ class DocumentUploader:
             return results
         
         logger.info(f"Creando/actualizando colecciones adaptativas: {list(adaptive_collections.keys())}")
-
+        
+        collections_to_build = []
         for strategy, collection_name in adaptive_collections.items():
             try:
-                chunk_size = int(strategy)
-                logger.info(f"Procesando estrategia '{strategy}' para la colección '{collection_name}' con chunk_size={chunk_size}")
-                
-                # No forzar la recreación completa por defecto, la lógica inteligente se encargará
-                force_recreate = False
-
-                success = self.load_documents_intelligently(
-                    documents,
-                    collection_name=collection_name,
-                    force_recreate=force_recreate,
-                    chunk_size=chunk_size
-                )
-                results[collection_name] = success
+                collections_to_build.append((strategy, collection_name, int(strategy)))
             except ValueError:
                 logger.warning(f"La clave de estrategia '{strategy}' en adaptive_collections no es un entero válido para chunk_size. Saltando...")
-            except Exception as e:
-                logger.error(f"Error al crear la colección adaptativa para la estrategia '{strategy}': {e}", exc_info=True)
-                results[collection_name] = False
-                
+        
+        def build_collection(strategy: str, collection_name: str, chunk_size: int) -> bool:
+            logger.info(f"Procesando estrategia '{strategy}' para la colección '{collection_name}' con chunk_size={chunk_size}")
+            
+            # No forzar la recreación completa por defecto, la lógica inteligente se encargará
+            return self.load_documents_intelligently(
+                documents,
+                collection_name=collection_name,
+                force_recreate=False,
+                chunk_size=chunk_size
+            )
+        
+        max_workers = max(1, min(VECTORSTORE_CONFIG.get("adaptive_build_workers", 3), len(collections_to_build) or 1))
+        stats = IngestionStats()
+        
+        with collect_ingestion_stats(stats), ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Cada hilo recibe una copia del contexto para registrar sus etapas en las estadísticas
+            future_to_collection = {
+                executor.submit(contextvars.copy_context().run, build_collection, strategy, collection_name, chunk_size):
+                    (strategy, collection_name)
+                for strategy, collection_name, chunk_size in collections_to_build
+            }
+            
+            for future in as_completed(future_to_collection):
+                strategy, collection_name = future_to_collection[future]
+                try:
+                    results[collection_name] = future.result()
+                except Exception as e:
+                    logger.error(f"Error al crear la colección adaptativa para la estrategia '{strategy}': {e}", exc_info=True)
+                    results[collection_name] = False
+        
+        logger.info(f"Rendimiento de la carga de colecciones adaptativas:\n{stats.report()}")
         return results
     
     def extract_chunk_size_from_collection(self, collection_name: str) -> int:
@@ -0,0 +1,284 @@
+"""
+Caché persistente en disco de embeddings de documentos.
+
+El mismo corpus se vectoriza una vez por colección adaptativa (con texto
+solapado entre estrategias) y de nuevo cada vez que se recrean las
+colecciones. CachedEmbeddings envuelve el modelo de embeddings y guarda cada
+vector bajo el hash de su texto:
+
+- <namespace>.vectors: matriz de vectores (float16 o float32) que solo crece
+  por el final y se lee mediante un memory map de NumPy
+- <namespace>.sqlite: índice hash -> fila de la matriz
+
+El namespace depende del modelo, de modo que nunca se mezclan vectores de
+modelos distintos. Las escrituras se serializan con un bloqueo de fichero
+(válido entre procesos) y cada fila del índice se confirma después de
+escribir su vector, por lo que los lectores concurrentes nunca ven un vector
+incompleto. Las consultas (embed_query) no se cachean aquí.
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# Usar el sistema de logging centralizado
+from langagent.config.logging_config import get_logger
+logger = get_logger(__name__)
+
+# Máximo de parámetros por consulta SQLite (límite por defecto: 999)
+_SQLITE_BATCH = 900
+
+
+@contextmanager
+def _file_lock(lock_path: str) -> Iterator[None]:
+    """
+    Bloqueo exclusivo entre procesos sobre un fichero auxiliar.
+
+    Args:
+        lock_path: Ruta del fichero de bloqueo
+    """
+    with open(lock_path, "a+b") as lock_file:
+        try:
+            import fcntl
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        except ImportError:
+            # Windows: bloquear el primer byte del fichero
+            import msvcrt
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings con caché en disco de los vectores de documentos por hash de contenido."""
+
+    def __init__(self, underlying: Embeddings, cache_dir: str, namespace: str, dtype: str = "float16"):
+        """
+        Inicializa la caché y crea el índice si no existe.
+
+        Args:
+            underlying: Modelo de embeddings real
+            cache_dir: Directorio de la caché
+            namespace: Identificador del modelo (se usa en el nombre de los ficheros)
+            dtype: Tipo de los vectores almacenados ("float16" o "float32")
+        """
+        self.underlying = underlying
+        self.dtype = np.dtype(dtype)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._mmap: Optional[np.memmap] = None
+        self._dim: Optional[int] = None
+
+        os.makedirs(cache_dir, exist_ok=True)
+        safe_namespace = re.sub(r"[^A-Za-z0-9_.-]+", "_", namespace)
+        base_path = os.path.join(cache_dir, f"{safe_namespace}.{self.dtype.name}")
+        self.vectors_path = f"{base_path}.vectors"
+        self.index_path = f"{base_path}.sqlite"
+        self.lock_path = f"{base_path}.lock"
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS vectors (key TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            row = conn.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+            if row:
+                self._dim = row[0]
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Abre una conexión nueva por operación (las conexiones SQLite no se comparten entre hilos)."""
+        conn = sqlite3.connect(self.index_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(text: str) -> str:
+        """
+        Calcula la clave de un texto.
+
+        Args:
+            text: Texto a vectorizar
+
+        Returns:
+            str: Hash SHA-256 del texto
+        """
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _lookup(self, keys: List[str]) -> Dict[str, int]:
+        """
+        Busca las filas de la matriz de varias claves.
+
+        Args:
+            keys: Claves a buscar
+
+        Returns:
+            Dict[str, int]: clave -> fila de las claves encontradas
+        """
+        rows: Dict[str, int] = {}
+        with self._connect() as conn:
+            for i in range(0, len(keys), _SQLITE_BATCH):
+                batch = keys[i:i + _SQLITE_BATCH]
+                placeholders = ",".join("?" for _ in batch)
+                rows.update(conn.execute(f"SELECT key, row FROM vectors WHERE key IN ({placeholders})", batch).fetchall())
+        return rows
+
+    def _vectors(self, min_rows: int) -> np.ndarray:
+        """
+        Devuelve el memory map de la matriz, reabriéndolo si otro escritor la ha ampliado.
+
+        Args:
+            min_rows: Número mínimo de filas que debe contener el mapa
+
+        Returns:
+            np.ndarray: Matriz (filas x dimensión) de solo lectura
+        """
+        if self._mmap is None or self._mmap.shape[0] < min_rows:
+            if self._dim is None:
+                # La dimensión la pudo registrar otro proceso después de abrir la caché
+                with self._connect() as conn:
+                    self._dim = conn.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()[0]
+            row_bytes = self._dim * self.dtype.itemsize
+            total_rows = os.path.getsize(self.vectors_path) // row_bytes
+            self._mmap = np.memmap(self.vectors_path, dtype=self.dtype, mode="r", shape=(total_rows, self._dim))
+        return self._mmap
+
+    def _store(self, texts_by_key: Dict[str, str], vectors: List[List[float]]):
+        """
+        Añade vectores nuevos al final de la matriz y los registra en el índice.
+
+        Args:
+            texts_by_key: clave -> texto de los vectores calculados (en el mismo orden que vectors)
+            vectors: Vectores calculados
+        """
+        matrix = np.asarray(vectors, dtype=np.float32)
+        keys = list(texts_by_key)
+
+        with _file_lock(self.lock_path):
+            # Otro proceso puede haber guardado algunas claves mientras se calculaban
+            already_stored = self._lookup(keys)
+            new_positions = [idx for idx, key in enumerate(keys) if key not in already_stored]
+            if not new_positions:
+                return
+
+            with self._connect() as conn:
+                row = conn.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+                if row is None:
+                    conn.execute("INSERT INTO meta (name, value) VALUES ('dim', ?)", (matrix.shape[1],))
+                    self._dim = matrix.shape[1]
+                elif row[0] != matrix.shape[1]:
+                    logger.warning(f"Dimensión de embeddings distinta a la de la caché ({matrix.shape[1]} != {row[0]}), no se guardan")
+                    return
+
+            row_bytes = self._dim * self.dtype.itemsize
+            with open(self.vectors_path, "ab") as vectors_file:
+                # Un proceso interrumpido a mitad de escritura deja una fila incompleta al
+                # final (sin entrada en el índice): se descarta para no desalinear las nuevas
+                size = vectors_file.seek(0, os.SEEK_END)
+                first_row = size // row_bytes
+                if size != first_row * row_bytes:
+                    logger.warning(f"Descartados {size - first_row * row_bytes} bytes de una fila incompleta "
+                                   f"en la caché de embeddings")
+                    vectors_file.truncate(first_row * row_bytes)
+                vectors_file.write(matrix[new_positions].astype(self.dtype).tobytes())
+                vectors_file.flush()
+                os.fsync(vectors_file.fileno())
+
+            # El índice se confirma después de escribir los vectores
+            with self._connect() as conn:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO vectors (key, row) VALUES (?, ?)",
+                    [(keys[idx], first_row + offset) for offset, idx in enumerate(new_positions)]
+                )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Devuelve los embeddings de los textos, calculando solo los que no están en la caché.
+
+        Args:
+            texts: Textos a vectorizar
+
+        Returns:
+            List[List[float]]: Embedding de cada texto
+        """
+        if not texts:
+            return []
+
+        keys = [self.make_key(text) for text in texts]
+        try:
+            stored_rows = self._lookup(list(set(keys)))
+        except sqlite3.Error as e:
+            logger.warning(f"No se pudo consultar la caché de embeddings: {e}")
+            return self.underlying.embed_documents(texts)
+
+        # Calcular una sola vez cada texto que falta
+        missing = {key: text for key, text in zip(keys, texts) if key not in stored_rows}
+        computed: Dict[str, List[float]] = {}
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            computed = dict(zip(missing, vectors))
+            try:
+                self._store(missing, vectors)
+            except (OSError, sqlite3.Error) as e:
+                logger.warning(f"No se pudieron guardar los embeddings en caché: {e}")
+
+        with self._lock:
+            self.hits += sum(1 for key in keys if key in stored_rows)
+            self.misses += sum(1 for key in keys if key not in stored_rows)
+            matrix = self._vectors(max(stored_rows.values()) + 1) if stored_rows else None
+
+        results = []
+        for key in keys:
+            if key in computed:
+                results.append([float(value) for value in computed[key]])
+            else:
+                results.append(matrix[stored_rows[key]].astype(np.float32).tolist())
+
+        if stored_rows:
+            logger.debug(f"Caché de embeddings: {len(texts) - len(missing)}/{len(texts)} textos reutilizados")
+        return results
+
+    def embed_query(self, text: str) -> List[float]:
+        """Calcula el embedding de una consulta con el modelo real."""
+        return self.underlying.embed_query(text)
+
+    def stats(self) -> Dict[str, object]:
+        """
+        Devuelve los contadores de la caché para monitorización.
+
+        Returns:
+            Dict[str, object]: Aciertos, fallos, tasa de acierto, tamaño y ruta
+        """
+        try:
+            with self._connect() as conn:
+                size = conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+        except sqlite3.Error:
+            size = None
+
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "size": size,
+                "path": self.vectors_path,
+            }
@@ -3,45 +3,228 @@ Módulo para la configuración de embeddings.
 
 Este módulo proporciona funciones para configurar diferentes modelos de embeddings
 que serán utilizados por las vectorstores.
+
+El backend del modelo se elige en VECTORSTORE_CONFIG["embedding_backend"],
+igual que el del reranker:
+
+- "torch": modelo de sentence-transformers sin modificar
+- "torch_int8": cuantización dinámica int8 de las capas lineales (CPU)
+- "onnx": backend ONNX Runtime de sentence-transformers (requiere optimum[onnxruntime])
 """
 
+import os
+import time
 from typing import Optional, Dict, Any
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_core.embeddings import Embeddings
+from langagent.config.config import CACHE_CONFIG, PATHS_CONFIG, VECTORSTORE_CONFIG
+from langagent.vectorstore.reranker import resolve_device
 
 # Usar el sistema de logging centralizado
 from langagent.config.logging_config import get_logger
 logger = get_logger(__name__)
 
-def create_embeddings(model_name: str = "intfloat/multilingual-e5-large-instruct", 
-                     device: str = "cuda", **kwargs) -> Embeddings:
+EMBEDDING_BACKENDS = ("torch", "torch_int8", "onnx")
+
+
+def _configure_threads(num_threads: int) -> Dict[str, Any]:
+    """
+    Limita los hilos de cálculo del modelo.
+    
+    Args:
+        num_threads (int): Hilos de cálculo (0 = valor por defecto de la librería)
+        
+    Returns:
+        Dict[str, Any]: Argumentos del modelo ONNX con las opciones de sesión (vacío si no aplica)
+    """
+    if not num_threads:
+        return {}
+    
+    try:
+        import torch
+        torch.set_num_threads(num_threads)
+    except ImportError:
+        pass
+    
+    try:
+        import onnxruntime
+        session_options = onnxruntime.SessionOptions()
+        session_options.intra_op_num_threads = num_threads
+        session_options.inter_op_num_threads = 1
+        return {"session_options": session_options}
+    except ImportError:
+        return {}
+
+
+def _quantize_int8(embeddings: Embeddings, model_name: str):
+    """Aplica cuantización dinámica int8 a las capas lineales del modelo (solo CPU)."""
+    import torch
+    
+    embeddings._client = torch.quantization.quantize_dynamic(
+        embeddings._client, {torch.nn.Linear}, dtype=torch.qint8
+    )
+    logger.info(f"Modelo de embeddings {model_name} cuantizado a int8")
+
+
+def _load_model(model_name: str, device: str, backend: str, num_threads: int,
+                batch_size: int, **kwargs) -> Embeddings:
+    """
+    Carga el modelo de sentence-transformers con el backend indicado.
+    
+    Args:
+        model_name (str): Nombre del modelo de embeddings.
+        device (str): Dispositivo del modelo.
+        backend (str): "torch", "torch_int8" u "onnx".
+        num_threads (int): Hilos de cálculo (0 = por defecto).
+        batch_size (int): Textos por lote al calcular embeddings de documentos.
+        **kwargs: Argumentos adicionales para el modelo.
+        
+    Returns:
+        Embeddings: Modelo cargado.
+    """
+    # sentence-transformers y torch se importan solo al crear el modelo
+    from langchain_huggingface import HuggingFaceEmbeddings
+    
+    model_kwargs = {"device": device}
+    onnx_kwargs = _configure_threads(num_threads)
+    
+    if backend == "onnx":
+        onnx_file = VECTORSTORE_CONFIG.get("embedding_onnx_file")
+        if onnx_file:
+            onnx_kwargs["file_name"] = onnx_file
+        model_kwargs["backend"] = "onnx"
+        model_kwargs["model_kwargs"] = onnx_kwargs
+    
+    # Añadir argumentos adicionales si se proporcionan
+    if kwargs:
+        model_kwargs.update(kwargs)
+    
+    embeddings = HuggingFaceEmbeddings(
+        model_name=model_name,
+        model_kwargs=model_kwargs,
+        encode_kwargs={"batch_size": batch_size}
+    )
+    
+    if backend == "torch_int8":
+        if device != "cpu":
+            logger.warning(f"La cuantización int8 solo está disponible en CPU; se mantiene el modelo en {device}")
+        else:
+            _quantize_int8(embeddings, model_name)
+    return embeddings
+
+
+def create_embeddings(model_name: Optional[str] = None, device: Optional[str] = None,
+                      use_cache: Optional[bool] = None, backend: Optional[str] = None,
+                      use_query_cache: Optional[bool] = None, **kwargs) -> Embeddings:
     """
     Crea un modelo de embeddings.
     
+    Los parámetros no indicados se toman de VECTORSTORE_CONFIG.
+    
     Args:
-        model_name (str): Nombre del modelo de embeddings a utilizar.
-        device (str): Dispositivo donde ejecutar el modelo ("cuda" o "cpu").
+        model_name (str, optional): Nombre del modelo de embeddings a utilizar.
+        device (str, optional): Dispositivo donde ejecutar el modelo ("auto", "cuda" o "cpu").
+        use_cache (bool, optional): Envolver el modelo con la caché en disco de embeddings
+            (por defecto, CACHE_CONFIG["embedding_cache_enabled"]).
+        backend (str, optional): "torch", "torch_int8" u "onnx".
+        use_query_cache (bool, optional): Envolver el modelo con la caché LRU de consultas
+            (por defecto, CACHE_CONFIG["query_embedding_cache_enabled"]).
         **kwargs: Argumentos adicionales para el modelo.
         
     Returns:
         Embeddings: Modelo de embeddings configurado.
     """
+    model_name = model_name or VECTORSTORE_CONFIG.get("embedding_model", "intfloat/multilingual-e5-large-instruct")
+    device = resolve_device(device or VECTORSTORE_CONFIG.get("embedding_device", "auto"))
+    backend = backend or VECTORSTORE_CONFIG.get("embedding_backend", "torch")
+    num_threads = VECTORSTORE_CONFIG.get("embedding_num_threads", 0)
+    batch_size = VECTORSTORE_CONFIG.get("embedding_batch_size", 32)
+    
+    if backend not in EMBEDDING_BACKENDS:
+        logger.warning(f"Backend de embeddings desconocido '{backend}', usando 'torch'")
+        backend = "torch"
+    
     try:
-        model_kwargs = {"device": device}
-        
-        # Añadir argumentos adicionales si se proporcionan
-        if kwargs:
-            model_kwargs.update(kwargs)
-        
-        logger.info(f"Creando modelo de embeddings {model_name} en dispositivo {device}")
-        embeddings = HuggingFaceEmbeddings(model_name=model_name, model_kwargs=model_kwargs)
-        
-        return embeddings
+        logger.info(f"Creando modelo de embeddings {model_name} en dispositivo {device} (backend: {backend})")
+        embeddings = _load_model(model_name, device, backend, num_threads, batch_size, **kwargs)
     except Exception as e:
         # Si falla con cuda, intentar con CPU
         if device == "cuda":
             logger.warning(f"Error al crear embeddings con CUDA: {str(e)}. Intentando con CPU...")
-            return create_embeddings(model_name=model_name, device="cpu", **kwargs)
-        else:
-            logger.error(f"Error al crear embeddings: {str(e)}")
-            raise 
\ No newline at end of file
+            return create_embeddings(model_name=model_name, device="cpu", use_cache=use_cache,
+                                     backend=backend, use_query_cache=use_query_cache, **kwargs)
+        if backend != "torch":
+            # El backend optimizado depende de paquetes opcionales (optimum, onnxruntime)
+            logger.warning(f"No se pudo cargar el backend de embeddings '{backend}' ({e}); usando 'torch'")
+            return create_embeddings(model_name=model_name, device=device, use_cache=use_cache,
+                                     backend="torch", use_query_cache=use_query_cache, **kwargs)
+        logger.error(f"Error al crear embeddings: {str(e)}")
+        raise
+    
+    if use_cache is None:
+        use_cache = CACHE_CONFIG.get("embedding_cache_enabled", False)
+    if use_cache:
+        # Los vectores de un modelo cuantizado no son intercambiables con los del original
+        namespace = model_name if backend == "torch" else f"{model_name}.{backend}"
+        embeddings = _with_disk_cache(embeddings, namespace)
+    
+    if use_query_cache is None:
+        use_query_cache = CACHE_CONFIG.get("query_embedding_cache_enabled", True)
+    if use_query_cache:
+        from langagent.vectorstore.query_embedding_cache import QueryEmbeddingCache
+        embeddings = QueryEmbeddingCache(embeddings, max_entries=CACHE_CONFIG.get("query_embedding_cache_size", 512))
+    return embeddings
+
+def warmup_embeddings(embeddings: Embeddings, batch_size: Optional[int] = None) -> float:
+    """
+    Ejecuta una pasada de calentamiento del modelo (carga de pesos, grafos ONNX, reserva de memoria).
+    
+    Se llama directamente al modelo envuelto, sin pasar por las cachés, para no
+    guardar en ellas los textos de calentamiento.
+    
+    Args:
+        embeddings (Embeddings): Modelo de embeddings (con o sin cachés).
+        batch_size (int, optional): Textos del lote de calentamiento (por defecto, embedding_batch_size).
+        
+    Returns:
+        float: Segundos empleados en el calentamiento.
+    """
+    model = embeddings
+    while getattr(model, "underlying", None) is not None:
+        model = model.underlying
+    
+    batch_size = batch_size or VECTORSTORE_CONFIG.get("embedding_batch_size", 32)
+    start_time = time.time()
+    try:
+        model.embed_query("query: calentamiento del modelo de embeddings")
+        model.embed_documents(["Texto de calentamiento del modelo de embeddings."] * batch_size)
+    except Exception as e:
+        logger.warning(f"Error en el calentamiento del modelo de embeddings: {e}")
+    elapsed = time.time() - start_time
+    logger.info(f"Modelo de embeddings calentado en {elapsed:.2f}s")
+    return elapsed
+
+def _with_disk_cache(embeddings: Embeddings, namespace: str) -> Embeddings:
+    """
+    Envuelve el modelo con la caché en disco de embeddings de documentos.
+    
+    Args:
+        embeddings (Embeddings): Modelo de embeddings.
+        namespace (str): Identificador del modelo y backend (namespace de la caché).
+        
+    Returns:
+        Embeddings: Modelo con caché o el modelo original si la caché no se puede abrir.
+    """
+    try:
+        from langagent.vectorstore.embedding_cache import CachedEmbeddings
+        cache_dir = os.path.join(PATHS_CONFIG.get("cache_dir", "./cache"), CACHE_CONFIG.get("embedding_cache_dir", "embeddings"))
+        cached_embeddings = CachedEmbeddings(
+            embeddings,
+            cache_dir=cache_dir,
+            namespace=namespace,
+            dtype=CACHE_CONFIG.get("embedding_cache_dtype", "float16")
+        )
+        logger.info(f"Caché de embeddings en disco activada: {cached_embeddings.vectors_path}")
+        return cached_embeddings
+    except Exception as e:
+        logger.warning(f"No se pudo inicializar la caché de embeddings, se usará el modelo sin caché: {e}")
+        return embeddings
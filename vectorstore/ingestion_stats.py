@@ -0,0 +1,105 @@
+"""
+Estadísticas de rendimiento de la carga de documentos.
+
+IngestionStats acumula, por colección y etapa (split, context, embed,
+insert), el número de elementos procesados y el tiempo empleado, y genera
+un informe de rendimiento al terminar la construcción de las colecciones.
+La instancia activa se guarda en una ContextVar para que los handlers de
+vectorstore registren sus etapas sin cambiar sus firmas.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Usar el sistema de logging centralizado
+from langagent.config.logging_config import get_logger
+logger = get_logger(__name__)
+
+# Orden de las etapas en el informe
+STAGES = ("split", "context", "embed", "insert")
+
+_active_stats: ContextVar[Optional["IngestionStats"]] = ContextVar("ingestion_stats", default=None)
+
+
+class IngestionStats:
+    """Acumulador de elementos y tiempo por (colección, etapa)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[Tuple[str, str], List[float]] = {}
+        self._start_time = time.time()
+
+    def record(self, collection: str, stage: str, items: int, seconds: float):
+        """
+        Registra una ejecución de una etapa.
+
+        Args:
+            collection: Colección a la que pertenece la etapa
+            stage: Nombre de la etapa
+            items: Elementos procesados (documentos en split, chunks en el resto)
+            seconds: Tiempo empleado
+        """
+        with self._lock:
+            entry = self._stages.setdefault((collection, stage), [0, 0.0])
+            entry[0] += items
+            entry[1] += seconds
+
+    def report(self) -> str:
+        """
+        Genera el informe de rendimiento por colección y etapa.
+
+        Returns:
+            str: Tabla con elementos, tiempo y elementos por segundo (la etapa insert incluye
+            el cálculo de embeddings cuando no se han precalculado)
+        """
+        with self._lock:
+            stages = dict(self._stages)
+
+        stage_order = {stage: idx for idx, stage in enumerate(STAGES)}
+        lines = [f"{'Colección':<28} {'Etapa':<8} {'Elementos':>9} {'Tiempo (s)':>11} {'Elem./s':>9}"]
+        for (collection, stage), (items, seconds) in sorted(
+                stages.items(), key=lambda item: (item[0][0], stage_order.get(item[0][1], len(STAGES)))):
+            throughput = items / seconds if seconds > 0 else 0.0
+            lines.append(f"{collection:<28} {stage:<8} {int(items):>9} {seconds:>11.2f} {throughput:>9.1f}")
+        lines.append(f"Tiempo total: {time.time() - self._start_time:.2f}s")
+        return "\n".join(lines)
+
+
+@contextmanager
+def collect_ingestion_stats(stats: IngestionStats) -> Iterator[IngestionStats]:
+    """
+    Activa un acumulador de estadísticas en el contexto actual.
+
+    Args:
+        stats: Acumulador a activar
+
+    Yields:
+        IngestionStats: El acumulador activo
+    """
+    token = _active_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _active_stats.reset(token)
+
+
+@contextmanager
+def track_stage(collection: Optional[str], stage: str, items: int) -> Iterator[None]:
+    """
+    Mide el tiempo de una etapa y lo registra en el acumulador activo (si hay uno).
+
+    Args:
+        collection: Colección a la que pertenece la etapa
+        stage: Nombre de la etapa
+        items: Elementos procesados en la etapa
+    """
+    stats = _active_stats.get()
+    start_time = time.time()
+    try:
+        yield
+    finally:
+        if stats is not None:
+            stats.record(collection or "desconocida", stage, items, time.time() - start_time)
@@ -0,0 +1,653 @@
+"""
+Implementación de VectorStoreBase que se ejecuta dentro del proceso.
+
+Cada colección se guarda en un directorio propio:
+
+- vectors.npy: matriz de embeddings normalizados (float32) que se abre como
+  memory map de solo lectura
+- records.json: identificadores, textos y metadatos de los chunks
+
+La búsqueda densa es exacta con NumPy (producto escalar sobre los vectores
+normalizados) o aproximada con HNSW si está instalado hnswlib. Los campos de
+filtrado (ámbito, cubo_source, is_consulta) se guardan además como columnas
+NumPy para aplicar los filtros sin recorrer los metadatos. La búsqueda
+híbrida combina el resultado denso con un índice BM25 en memoria mediante
+Reciprocal Rank Fusion. Pensada para despliegues de un solo nodo y pruebas,
+sin la latencia de red de Milvus.
+"""
+
+import json
+import os
+import shutil
+import threading
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+from langagent.vectorstore.base import VectorStoreBase
+from langagent.vectorstore.bm25 import BM25Index, reciprocal_rank_fusion
+from langagent.vectorstore.context_generation import ContextGenerationMixin
+from langagent.vectorstore.ingestion_stats import track_stage
+from langagent.vectorstore.reranker import get_cross_encoder
+from langagent.vectorstore.retrieval_cache import with_retrieval_cache
+from langagent.vectorstore.scored_retriever import ScoredRetriever
+from langagent.config.config import VECTORSTORE_CONFIG
+
+# Usar el sistema de logging centralizado
+from langagent.config.logging_config import get_logger
+logger = get_logger(__name__)
+
+# Campos de metadatos que se guardan como columnas para filtrar
+FILTER_FIELDS = ("ambito", "cubo_source", "is_consulta")
+
+
+class LocalVectorIndex(VectorStore):
+    """Vectorstore de LangChain persistida en disco con búsqueda densa, filtros y BM25."""
+
+    def __init__(self, embedding: Embeddings, collection_name: str, persist_directory: str,
+                 use_hybrid_search: bool = True, index_type: str = "exact"):
+        """
+        Abre (o prepara) una colección local.
+
+        Args:
+            embedding: Modelo de embeddings
+            collection_name: Nombre de la colección
+            persist_directory: Directorio base de las colecciones locales
+            use_hybrid_search: Combinar la búsqueda densa con BM25
+            index_type: "exact" (NumPy) o "hnsw" (requiere hnswlib)
+        """
+        self.embedding_func = embedding
+        self.collection_name = collection_name
+        self.path = os.path.join(persist_directory, collection_name)
+        self.use_hybrid_search = use_hybrid_search
+        self.index_type = index_type
+        self._lock = threading.RLock()
+
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._vectors: np.ndarray = np.zeros((0, 0), dtype=np.float32)
+        self._columns: Dict[str, np.ndarray] = {}
+        self._bm25: Optional[BM25Index] = None
+        self._hnsw = None
+
+        if self.exists():
+            self._load()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding_func
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.path, "vectors.npy")
+
+    @property
+    def _records_path(self) -> str:
+        return os.path.join(self.path, "records.json")
+
+    def exists(self) -> bool:
+        """Indica si la colección está persistida en disco."""
+        return os.path.exists(self._records_path) and os.path.exists(self._vectors_path)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    # ------------------------------------------------------------------
+    # Persistencia
+    # ------------------------------------------------------------------
+
+    def _load(self):
+        """Carga los registros y abre la matriz de vectores como memory map."""
+        with open(self._records_path, "r", encoding="utf-8") as records_file:
+            records = json.load(records_file)
+        self._ids = records["ids"]
+        self._texts = records["texts"]
+        self._metadatas = records["metadatas"]
+        self._vectors = np.load(self._vectors_path, mmap_mode="r")
+        self._rebuild_indexes()
+        logger.info(f"Colección local '{self.collection_name}' cargada: {len(self._ids)} chunks")
+
+    def _persist(self, vectors: np.ndarray):
+        """
+        Escribe la colección de forma atómica y vuelve a abrir el memory map.
+
+        Args:
+            vectors: Matriz completa de vectores normalizados
+        """
+        os.makedirs(self.path, exist_ok=True)
+
+        tmp_vectors = self._vectors_path + ".tmp.npy"
+        np.save(tmp_vectors, np.ascontiguousarray(vectors, dtype=np.float32))
+        os.replace(tmp_vectors, self._vectors_path)
+
+        self._persist_records()
+
+        self._vectors = np.load(self._vectors_path, mmap_mode="r")
+        self._rebuild_indexes()
+
+    def _persist_records(self):
+        """Escribe los textos y metadatos de forma atómica (los vectores no cambian)."""
+        tmp_records = self._records_path + ".tmp"
+        with open(tmp_records, "w", encoding="utf-8") as records_file:
+            json.dump({"ids": self._ids, "texts": self._texts, "metadatas": self._metadatas},
+                      records_file, ensure_ascii=False)
+        os.replace(tmp_records, self._records_path)
+
+    def _rebuild_indexes(self):
+        """Reconstruye las columnas de filtrado y el índice BM25 a partir de los registros."""
+        self._rebuild_columns()
+        if self.use_hybrid_search:
+            self._bm25 = BM25Index()
+            self._bm25.add(zip(self._ids, self._texts))
+        # El índice HNSW se construye de nuevo en la siguiente búsqueda
+        self._hnsw = None
+
+    def _rebuild_columns(self):
+        """Reconstruye las columnas NumPy de los campos de filtrado."""
+        self._columns = {
+            field: np.array([str(metadata.get(field, "")) for metadata in self._metadatas], dtype=object)
+            for field in FILTER_FIELDS
+        }
+
+    # ------------------------------------------------------------------
+    # Altas, bajas y consultas de registros
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        """Normaliza las filas a norma 1 para usar el producto escalar como similitud coseno."""
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        """
+        Calcula los embeddings de los textos y los añade a la colección.
+
+        Args:
+            texts: Textos de los chunks
+            metadatas: Metadatos de cada chunk
+            ids: Identificadores (por defecto, UUID aleatorios)
+
+        Returns:
+            List[str]: Identificadores de los chunks añadidos
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        ids = list(ids) if ids else [uuid.uuid4().hex for _ in texts]
+
+        embeddings = self._normalize(np.asarray(self.embedding_func.embed_documents(texts), dtype=np.float32))
+
+        with self._lock:
+            current = np.asarray(self._vectors) if len(self._ids) else np.zeros((0, embeddings.shape[1]), dtype=np.float32)
+            self._ids.extend(ids)
+            self._texts.extend(texts)
+            self._metadatas.extend(dict(metadata) for metadata in metadatas)
+            self._persist(np.vstack([current, embeddings]))
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """
+        Elimina chunks por identificador.
+
+        Args:
+            ids: Identificadores a eliminar
+
+        Returns:
+            Optional[bool]: True si se completó la eliminación
+        """
+        if not ids:
+            return True
+        to_delete = set(ids)
+
+        with self._lock:
+            keep = [row for row, chunk_id in enumerate(self._ids) if chunk_id not in to_delete]
+            if len(keep) == len(self._ids):
+                return True
+            vectors = np.asarray(self._vectors)[keep] if keep else np.zeros((0, self._vectors.shape[1]), dtype=np.float32)
+            self._ids = [self._ids[row] for row in keep]
+            self._texts = [self._texts[row] for row in keep]
+            self._metadatas = [self._metadatas[row] for row in keep]
+            self._persist(vectors)
+        return True
+
+    def update_metadata(self, updates: Dict[str, Dict[str, Any]]):
+        """
+        Modifica campos de metadatos de chunks existentes sin tocar sus vectores.
+
+        Args:
+            updates: Identificador -> campos a sustituir
+        """
+        if not updates:
+            return
+        with self._lock:
+            for row, chunk_id in enumerate(self._ids):
+                if chunk_id in updates:
+                    self._metadatas[row] = {**self._metadatas[row], **updates[chunk_id]}
+            self._persist_records()
+            self._rebuild_columns()
+
+    def _filter_mask(self, filter: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """
+        Calcula la máscara de filas que cumplen un filtro de metadatos.
+
+        Admite igualdad ({"ambito": "academico"}) y pertenencia
+        ({"cubo_source": {"$in": [...]}}), combinados con AND.
+
+        Args:
+            filter: Filtro de metadatos
+
+        Returns:
+            Optional[np.ndarray]: Máscara booleana o None si no hay filtro
+        """
+        if not filter:
+            return None
+
+        mask = np.ones(len(self._ids), dtype=bool)
+        for field, condition in filter.items():
+            if isinstance(condition, dict) and "$in" in condition:
+                allowed = [str(value) for value in condition["$in"]]
+            else:
+                allowed = [str(condition)]
+
+            column = self._columns.get(field)
+            if column is None:
+                column = np.array([str(metadata.get(field, "")) for metadata in self._metadatas], dtype=object)
+            mask &= np.isin(column, allowed)
+        return mask
+
+    def get(self, where: Optional[Dict[str, Any]] = None) -> Dict[str, List[Any]]:
+        """
+        Devuelve los registros de la colección, opcionalmente filtrados.
+
+        Args:
+            where: Filtro de metadatos (mismo formato que en las búsquedas)
+
+        Returns:
+            Dict[str, List]: "ids", "documents" y "metadatas"
+        """
+        with self._lock:
+            mask = self._filter_mask(where)
+            rows = range(len(self._ids)) if mask is None else np.flatnonzero(mask)
+            return {
+                "ids": [self._ids[row] for row in rows],
+                "documents": [self._texts[row] for row in rows],
+                "metadatas": [dict(self._metadatas[row]) for row in rows],
+            }
+
+    # ------------------------------------------------------------------
+    # Búsqueda
+    # ------------------------------------------------------------------
+
+    def _get_hnsw(self):
+        """Construye el índice HNSW de la colección si hnswlib está disponible."""
+        if self._hnsw is None and len(self._ids):
+            try:
+                import hnswlib
+            except ImportError:
+                logger.warning("hnswlib no está instalado; se usará la búsqueda exacta")
+                self.index_type = "exact"
+                return None
+
+            index = hnswlib.Index(space="ip", dim=self._vectors.shape[1])
+            index.init_index(max_elements=len(self._ids), M=VECTORSTORE_CONFIG.get("local_hnsw_m", 16),
+                             ef_construction=VECTORSTORE_CONFIG.get("local_hnsw_ef_construction", 200))
+            index.add_items(np.asarray(self._vectors), np.arange(len(self._ids)))
+            index.set_ef(VECTORSTORE_CONFIG.get("local_hnsw_ef_search", 64))
+            self._hnsw = index
+        return self._hnsw
+
+    def _dense_search(self, query_vector: np.ndarray, k: int,
+                      mask: Optional[np.ndarray]) -> List[Tuple[int, float]]:
+        """
+        Busca las filas más similares a un vector de consulta normalizado.
+
+        Args:
+            query_vector: Vector de consulta normalizado
+            k: Número de resultados
+            mask: Filas permitidas (None = todas)
+
+        Returns:
+            List[Tuple[int, float]]: Pares (fila, similitud coseno) de mayor a menor
+        """
+        total_rows = len(self._ids)
+        if total_rows == 0 or k <= 0:
+            return []
+
+        if self.index_type == "hnsw" and self._get_hnsw() is not None:
+            allowed_count = total_rows if mask is None else int(mask.sum())
+            k = min(k, allowed_count)
+            if k == 0:
+                return []
+            row_filter = None if mask is None else (lambda row: bool(mask[row]))
+            labels, distances = self._hnsw.knn_query(query_vector, k=k, filter=row_filter)
+            # En el espacio "ip" la distancia es 1 - producto escalar
+            return [(int(row), float(1.0 - distance)) for row, distance in zip(labels[0], distances[0])]
+
+        scores = np.asarray(self._vectors) @ query_vector
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+        k = min(k, total_rows)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(row), float(scores[row])) for row in top if np.isfinite(scores[row])]
+
+    def _to_documents(self, rows_and_scores: List[Tuple[int, float]]) -> List[Tuple[Document, float]]:
+        """Convierte pares (fila, puntuación) en pares (Document, puntuación)."""
+        return [
+            (Document(page_content=self._texts[row], metadata={**self._metadatas[row], "pk": self._ids[row]}), score)
+            for row, score in rows_and_scores
+        ]
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4,
+                                               filter: Optional[Dict[str, Any]] = None,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        """
+        Búsqueda densa con un embedding ya calculado.
+
+        Returns:
+            List[Tuple[Document, float]]: Documentos con su similitud coseno
+        """
+        query_vector = self._normalize(np.asarray([embedding], dtype=np.float32))[0]
+        with self._lock:
+            return self._to_documents(self._dense_search(query_vector, k, self._filter_mask(filter)))
+
+    def similarity_search_with_score(self, query: str, k: int = 4,
+                                     filter: Optional[Dict[str, Any]] = None,
+                                     **kwargs: Any) -> List[Tuple[Document, float]]:
+        """
+        Búsqueda por texto; con búsqueda híbrida combina el ranking denso y el BM25 con RRF.
+
+        La puntuación devuelta es siempre la similitud coseno con la consulta, de
+        modo que los umbrales de prefiltrado del workflow mantienen su significado.
+
+        Returns:
+            List[Tuple[Document, float]]: Documentos con su similitud coseno
+        """
+        query_vector = self._normalize(np.asarray([self.embedding_func.embed_query(query)], dtype=np.float32))[0]
+
+        with self._lock:
+            mask = self._filter_mask(filter)
+            if not self.use_hybrid_search or self._bm25 is None:
+                return self._to_documents(self._dense_search(query_vector, k, mask))
+
+            candidates = k * VECTORSTORE_CONFIG.get("hybrid_candidates_multiplier", 3)
+            dense = self._dense_search(query_vector, candidates, mask)
+            allowed = None if mask is None else {self._ids[row] for row in np.flatnonzero(mask)}
+            sparse = self._bm25.search(query, candidates, allowed)
+
+            row_by_id = {chunk_id: row for row, chunk_id in enumerate(self._ids)}
+            fused = reciprocal_rank_fusion(
+                [[self._ids[row] for row, _ in dense], [chunk_id for chunk_id, _ in sparse]],
+                VECTORSTORE_CONFIG.get("hybrid_rrf_k", 60)
+            )
+            top_rows = [row_by_id[chunk_id] for chunk_id, _ in fused[:k]]
+            similarities = np.asarray(self._vectors[top_rows]) @ query_vector if top_rows else []
+            return self._to_documents([(row, float(score)) for row, score in zip(top_rows, similarities)])
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None,
+                          **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter, **kwargs)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4,
+                                    filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k=k, filter=filter, **kwargs)]
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        # Las puntuaciones ya son similitudes coseno; se acotan a [0, 1]
+        return lambda score: max(0.0, min(1.0, score))
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   collection_name: str = "default_collection", persist_directory: str = "./vectordb/local",
+                   **kwargs: Any) -> "LocalVectorIndex":
+        index = cls(embedding, collection_name, persist_directory, **kwargs)
+        index.add_texts(texts, metadatas)
+        return index
+
+
+class LocalVectorStore(ContextGenerationMixin, VectorStoreBase):
+    """Implementación de VectorStoreBase en proceso, sin servicios externos."""
+
+    def __init__(self):
+        """Inicializa la implementación local."""
+        self.persist_directory = VECTORSTORE_CONFIG.get("local_persist_directory", "./vectordb/local")
+        self.use_hybrid_search = VECTORSTORE_CONFIG.get("use_hybrid_search", False)
+        self.index_type = VECTORSTORE_CONFIG.get("local_index_type", "exact")
+        self._init_context_generation()
+
+    def _open(self, embeddings: Embeddings, collection_name: str) -> LocalVectorIndex:
+        """Abre una colección local con la configuración del handler."""
+        return LocalVectorIndex(embeddings, collection_name, self.persist_directory,
+                                use_hybrid_search=self.use_hybrid_search, index_type=self.index_type)
+
+    def create_vectorstore(self, documents: List[Document], embeddings: Embeddings,
+                           collection_name: str, **kwargs) -> Optional[LocalVectorIndex]:
+        """
+        Crea una colección local con los documentos proporcionados.
+
+        Args:
+            documents: Lista de documentos a indexar
+            embeddings: Modelo de embeddings a utilizar
+            collection_name: Nombre de la colección
+            **kwargs: drop_old (bool, por defecto True) para eliminar la colección existente
+
+        Returns:
+            LocalVectorIndex: Colección creada o None si falla
+        """
+        if not documents:
+            logger.error("No se pueden crear vectorstores sin documentos.")
+            return None
+
+        try:
+            collection_path = os.path.join(self.persist_directory, collection_name)
+            if kwargs.get("drop_old", True) and os.path.exists(collection_path):
+                logger.info(f"Eliminando colección local existente: {collection_name}")
+                shutil.rmtree(collection_path)
+
+            vectorstore = self._open(embeddings, collection_name)
+            with track_stage(collection_name, "insert", len(documents)):
+                vectorstore.add_documents(self.ensure_filter_metadata(documents))
+            logger.info(f"Colección local '{collection_name}' creada con {len(documents)} documentos")
+            return vectorstore
+        except Exception as e:
+            logger.error(f"Error al crear la colección local: {e}")
+            return None
+
+    def load_vectorstore(self, embeddings: Embeddings, collection_name: str,
+                         **kwargs) -> Optional[LocalVectorIndex]:
+        """
+        Carga una colección local existente.
+
+        Args:
+            embeddings: Modelo de embeddings a utilizar
+            collection_name: Nombre de la colección
+
+        Returns:
+            LocalVectorIndex: Colección cargada o None si no existe
+        """
+        try:
+            vectorstore = self._open(embeddings, collection_name)
+        except Exception as e:
+            logger.error(f"Error al cargar la colección local: {e}")
+            return None
+
+        if not vectorstore.exists():
+            logger.info(f"La colección local {collection_name} no existe")
+            return None
+        return vectorstore
+
+    @with_retrieval_cache
+    def create_retriever(self, vectorstore: LocalVectorIndex, k: Optional[int] = None,
+                         similarity_threshold: float = 0.7, **kwargs) -> Optional[BaseRetriever]:
+        """
+        Crea un retriever para una colección local, con compresión contextual opcional.
+
+        Args:
+            vectorstore: Colección local
+            k: Número de documentos a recuperar
+            similarity_threshold: No se usa (el prefiltrado por puntuación se hace en el workflow)
+
+        Returns:
+            BaseRetriever: Retriever configurado o None si la colección no existe
+        """
+        if vectorstore is None:
+            logger.error("No se puede crear un retriever con una vectorstore None")
+            return None
+
+        k = k or VECTORSTORE_CONFIG.get("k_retrieval", 4)
+        use_compression = VECTORSTORE_CONFIG.get("use_contextual_compression", False)
+        multiplier = VECTORSTORE_CONFIG.get("compression_top_k_multiplier", 3)
+
+        base_retriever = ScoredRetriever(vectorstore=vectorstore,
+                                         search_kwargs={"k": k * multiplier if use_compression else k})
+        if not use_compression:
+            return base_retriever
+
+        try:
+            from langchain.retrievers.contextual_compression import ContextualCompressionRetriever
+            from langchain.retrievers.document_compressors import CrossEncoderReranker
+            compressor = CrossEncoderReranker(model=get_cross_encoder(), top_n=k)
+            return ContextualCompressionRetriever(base_compressor=compressor, base_retriever=base_retriever)
+        except Exception as e:
+            logger.warning(f"Error con compresión contextual, se usa el retriever sin compresión: {e}")
+            return ScoredRetriever(vectorstore=vectorstore, search_kwargs={"k": k})
+
+    def add_documents_to_collection(self, vectorstore: LocalVectorIndex, documents: List[Document],
+                                    source_documents: Dict[str, Document] = None,
+                                    chunk_size: Optional[int] = None) -> bool:
+        """
+        Añade documentos a una colección local, generando su contexto si está activado.
+
+        Args:
+            vectorstore: Colección local
+            documents: Lista de documentos a añadir
+            source_documents: Documentos originales completos (para la generación de contexto)
+            chunk_size: Tamaño de chunk de la colección
+
+        Returns:
+            bool: True si los documentos se añadieron correctamente
+        """
+        if not documents:
+            logger.warning("No hay documentos para añadir a la colección")
+            return False
+
+        if self.use_context_generation and self.context_generator and source_documents:
+            with track_stage(vectorstore.collection_name, "context", len(documents)):
+                documents = self._generate_context_for_chunks(documents, source_documents, chunk_size)
+
+        try:
+            with track_stage(vectorstore.collection_name, "insert", len(documents)):
+                vectorstore.add_documents(self.ensure_filter_metadata(documents))
+            logger.info(f"Se han añadido {len(documents)} documentos a la colección local '{vectorstore.collection_name}'")
+            return True
+        except Exception as e:
+            logger.error(f"Error al añadir documentos a la colección local: {e}")
+            return False
+
+    def load_documents(self, documents: List[Document], embeddings: Embeddings = None,
+                       source_documents: Dict[str, Document] = None,
+                       chunk_size: Optional[int] = None,
+                       collection_name: Optional[str] = None) -> bool:
+        """
+        Carga documentos en una colección local, creándola si no existe.
+
+        Args:
+            documents: Lista de documentos a cargar
+            embeddings: Modelo de embeddings a utilizar
+            source_documents: Documentos originales completos (para la generación de contexto)
+            chunk_size: Tamaño de chunk de la colección
+            collection_name: Colección de destino (por defecto, la de la configuración)
+
+        Returns:
+            bool: True si los documentos se cargaron correctamente
+        """
+        if not documents:
+            logger.warning("No hay documentos para cargar")
+            return False
+        if embeddings is None:
+            logger.error("No se pueden cargar documentos sin embeddings")
+            return False
+
+        collection_name = collection_name or VECTORSTORE_CONFIG.get("collection_name", "default_collection")
+        vectorstore = self.load_vectorstore(embeddings, collection_name) or self._open(embeddings, collection_name)
+        return self.add_documents_to_collection(vectorstore, documents, source_documents, chunk_size)
+
+    def count_chunks(self, vectorstore: LocalVectorIndex) -> Optional[int]:
+        """Cuenta los chunks de la colección local."""
+        return len(vectorstore)
+
+    def get_collection_manifest(self, vectorstore: LocalVectorIndex) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Manifiesto exacto de la colección local (source -> chunk_count, content_hash)."""
+        data = vectorstore.get()
+        return self.build_manifest(
+            (metadata.get("source"), metadata.get("chunk_hash")) for metadata in data["metadatas"]
+        )
+
+    def get_chunk_index(self, vectorstore: LocalVectorIndex, cubos: List[str]) -> Optional[Dict[str, Dict[str, List[Any]]]]:
+        """Identificadores de los chunks de cada cubo agrupados por hash de contenido."""
+        if not cubos:
+            return None
+        data = vectorstore.get(where={"cubo_source": {"$in": list(cubos)}})
+        chunk_index: Dict[str, Dict[str, List[Any]]] = {cubo: {} for cubo in cubos}
+        for chunk_id, metadata, text in zip(data["ids"], data["metadatas"], data["documents"]):
+            chunk_hash = metadata.get("chunk_hash") or self.compute_chunk_hash(text)
+            chunk_index.setdefault(metadata.get("cubo_source"), {}).setdefault(chunk_hash, []).append(chunk_id)
+        return chunk_index
+
+    def update_chunk_sources(self, vectorstore: LocalVectorIndex, sources: Dict[Any, str]) -> Set[Any]:
+        """Actualiza el source de chunks conservados de la colección local."""
+        try:
+            vectorstore.update_metadata({chunk_id: {"source": source} for chunk_id, source in sources.items()})
+            return set(sources)
+        except Exception as e:
+            logger.error(f"Error actualizando el source de los chunks: {e}")
+            return set()
+
+    def remove_documents_by_ids(self, vectorstore: LocalVectorIndex, ids: List[Any]) -> bool:
+        """Elimina chunks concretos de la colección local."""
+        try:
+            vectorstore.delete(ids=list(ids))
+            logger.info(f"Eliminados {len(ids)} chunks de la colección local")
+            return True
+        except Exception as e:
+            logger.error(f"Error eliminando chunks de la colección local: {e}")
+            return False
+
+    def get_existing_documents_metadata(self, vectorstore: LocalVectorIndex, field: str = "source") -> set:
+        """
+        Obtiene los valores distintos de un campo de metadatos en la colección.
+
+        Args:
+            vectorstore: Colección local
+            field: Campo de metadata a verificar
+
+        Returns:
+            set: Conjunto de valores únicos del campo especificado
+        """
+        return {metadata[field] for metadata in vectorstore.get()["metadatas"] if metadata.get(field)}
+
+    def remove_documents_by_cubo(self, vectorstore: LocalVectorIndex, cubos_to_remove: List[str]) -> bool:
+        """
+        Elimina todos los chunks de los cubos indicados.
+
+        Args:
+            vectorstore: Colección local
+            cubos_to_remove: Lista de cubos a eliminar
+
+        Returns:
+            bool: True si se eliminaron correctamente
+        """
+        if not cubos_to_remove:
+            return True
+        ids = vectorstore.get(where={"cubo_source": {"$in": list(cubos_to_remove)}})["ids"]
+        logger.info(f"Eliminando {len(ids)} chunks de los cubos {cubos_to_remove} de la colección local")
+        return self.remove_documents_by_ids(vectorstore, ids)
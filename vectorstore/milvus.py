@@ -4,12 +4,22 @@ Implementación de VectorStoreBase para Milvus/Zilliz.
 Este módulo proporciona una implementación concreta de la interfaz VectorStoreBase
 para la base de datos vectorial Milvus/Zilliz, aprovechando sus capacidades avanzadas
 como filtrado por metadatos y búsqueda híbrida.
+
+Con use_partitioning la colección se crea con el ámbito como partition key:
+Milvus reparte los chunks en particiones por el hash del ámbito al insertarlos
+y, cuando la expresión de búsqueda fija el ámbito (ambito == "x"), solo busca
+en la partición correspondiente en lugar de filtrar la colección completa.
+La partition key forma parte del esquema: las colecciones creadas antes sin
+ella siguen filtrando la colección completa hasta que se recrean.
 """
 
+import math
 import os
 import time
 import re
-from typing import List, Dict, Any, Optional, Union, Tuple
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Set, Union, Tuple
 from langchain_core.documents import Document
 from langchain_core.embeddings import Embeddings
 from langchain_core.retrievers import BaseRetriever
@@ -18,19 +28,191 @@ from langchain_milvus import Milvus, BM25BuiltInFunction
 from langchain_milvus.retrievers import MilvusCollectionHybridSearchRetriever
 from pymilvus import WeightedRanker
 from langagent.vectorstore.base import VectorStoreBase
+from langagent.vectorstore.context_generation import ContextGenerationMixin
+from langagent.vectorstore.embedding_cache import CachedEmbeddings
+from langagent.vectorstore.ingestion_stats import track_stage
+from langagent.vectorstore.retrieval_cache import get_collection_name, with_retrieval_cache
+from langagent.vectorstore.scored_retriever import ScoredRetriever
 from langagent.config.config import VECTORSTORE_CONFIG
 from langagent.models.constants import CUBO_TO_AMBITO, AMBITOS_CUBOS
-from langagent.models.llm import create_context_generator
 from tqdm import tqdm  # Añadir importación de tqdm para barra de progreso
-from langchain.retrievers.contextual_compression import ContextualCompressionRetriever
-from langchain_community.cross_encoders import HuggingFaceCrossEncoder
-from langchain.retrievers.document_compressors import CrossEncoderReranker
-import torch
+from langagent.vectorstore.reranker import get_cross_encoder
 # Usar el sistema de logging centralizado
 from langagent.config.logging_config import get_logger
 logger = get_logger(__name__)
 
-class MilvusVectorStore(VectorStoreBase):
+
+def _expr_literal(value: Any) -> str:
+    """Convierte un valor de filtro en un literal de expresión de Milvus."""
+    if isinstance(value, bool):
+        # Los booleanos de los metadatos se guardan como texto ("true"/"false")
+        value = str(value).lower()
+    if isinstance(value, (int, float)):
+        return str(value)
+    escaped = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
+
+
+def filter_to_expr(filter: Optional[Dict[str, Any]], fields: Optional[set] = None) -> Optional[str]:
+    """
+    Traduce un filtro de metadatos del workflow a una expresión booleana de Milvus.
+
+    Args:
+        filter: Filtro campo -> valor (o campo -> {"$in": [...]})
+        fields: Campos del esquema; si se indican, se ignoran los campos que no existen
+
+    Returns:
+        Optional[str]: Expresión (p. ej. 'ambito == "academico" and is_consulta == "true"') o None
+    """
+    if not filter:
+        return None
+
+    clauses = []
+    for field, condition in filter.items():
+        if fields is not None and field not in fields:
+            logger.debug(f"Campo de filtro '{field}' no existe en la colección, se ignora")
+            continue
+        if isinstance(condition, dict) and "$in" in condition:
+            values = ", ".join(_expr_literal(value) for value in condition["$in"])
+            clauses.append(f"{field} in [{values}]")
+        else:
+            clauses.append(f"{field} == {_expr_literal(condition)}")
+    return " and ".join(clauses) or None
+
+
+class FilteredMilvus(Milvus):
+    """Milvus que acepta los filtros de metadatos del workflow (filter=dict) en todas las búsquedas."""
+
+    def _schema_fields(self) -> Optional[set]:
+        """Campos escalares de la colección (None si admite campos dinámicos o no se conoce el esquema)."""
+        try:
+            if self.col is None or getattr(self.col.schema, "enable_dynamic_field", False):
+                return None
+            return {field.name for field in self.col.schema.fields}
+        except Exception:
+            return None
+
+    def _merge_filter(self, expr: Optional[str], filter: Optional[Dict[str, Any]]) -> Optional[str]:
+        """Combina la expresión explícita con la traducción del filtro."""
+        filter_expr = filter_to_expr(filter, self._schema_fields())
+        if expr and filter_expr:
+            return f"({expr}) and ({filter_expr})"
+        return expr or filter_expr
+
+    def similarity_search_with_score(self, query: str, k: int = 4, param: Optional[dict] = None,
+                                     expr: Optional[str] = None, timeout: Optional[float] = None,
+                                     filter: Optional[Dict[str, Any]] = None,
+                                     **kwargs: Any) -> List[Tuple[Document, float]]:
+        return super().similarity_search_with_score(
+            query, k=k, param=param, expr=self._merge_filter(expr, filter), timeout=timeout, **kwargs
+        )
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4,
+                                               param: Optional[dict] = None, expr: Optional[str] = None,
+                                               timeout: Optional[float] = None,
+                                               filter: Optional[Dict[str, Any]] = None,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        docs_and_scores = super().similarity_search_with_score_by_vector(
+            embedding, k=k, param=param, expr=self._merge_filter(expr, filter), timeout=timeout, **kwargs
+        )
+        if not self._uses_dense_scores():
+            return docs_and_scores
+        return self._with_dense_scores(docs_and_scores, embedding)
+
+    def _dense_field(self) -> Optional[str]:
+        """Campo vectorial denso de las colecciones híbridas (None si la colección tiene un único vector)."""
+        vector_fields = getattr(self, "_vector_field", None)
+        if not isinstance(vector_fields, list) or len(vector_fields) < 2:
+            return None
+        return vector_fields[0]
+
+    def _uses_dense_scores(self) -> bool:
+        """
+        Indica si los resultados híbridos se puntúan con la similitud densa.
+
+        Leer los vectores y recalcular la similitud solo es necesario para el
+        prefiltrado por puntuación; con el prefiltrado desactivado se conserva
+        la puntuación fusionada y los documentos se marcan como "raw".
+        """
+        return self._dense_field() is not None and VECTORSTORE_CONFIG.get("score_prefilter_enabled", False)
+
+    def _dense_embeddings(self) -> Optional[Embeddings]:
+        """Modelo de embeddings del campo denso (BM25 es una función integrada de Milvus)."""
+        embedding_func = getattr(self, "embedding_func", None)
+        candidates = embedding_func if isinstance(embedding_func, list) else [embedding_func]
+        return next((candidate for candidate in candidates if isinstance(candidate, Embeddings)), None)
+
+    def _with_dense_scores(self, docs_and_scores: List[Tuple[Document, float]],
+                           query_embedding: List[float]) -> List[Tuple[Document, float]]:
+        """
+        Sustituye la puntuación de cada resultado por su similitud coseno densa con la consulta.
+
+        Los vectores se leen de la colección por clave primaria; los chunks sin
+        vector almacenado se vectorizan de nuevo. El orden de los resultados no cambia.
+
+        Args:
+            docs_and_scores: Resultados de la búsqueda (fusionados o densos)
+            query_embedding: Embedding de la consulta
+
+        Returns:
+            List[Tuple[Document, float]]: Documentos con su similitud coseno
+        """
+        dense_field = self._dense_field()
+        primary_field = getattr(self, "_primary_field", "pk")
+        ids = [doc.metadata.get(primary_field) for doc, _ in docs_and_scores]
+        vectors: Dict[Any, List[float]] = {}
+
+        known_ids = [chunk_id for chunk_id in ids if chunk_id is not None]
+        if known_ids:
+            ids_expr = ", ".join(_expr_literal(chunk_id) for chunk_id in known_ids)
+            for record in self.col.query(expr=f"{primary_field} in [{ids_expr}]",
+                                         output_fields=[primary_field, dense_field]):
+                vectors[record[primary_field]] = list(record[dense_field])
+
+        missing = [doc for (doc, _), chunk_id in zip(docs_and_scores, ids) if chunk_id not in vectors]
+        if missing:
+            embedded = self._dense_embeddings().embed_documents([doc.page_content for doc in missing])
+            missing_vectors = {id(doc): vector for doc, vector in zip(missing, embedded)}
+        else:
+            missing_vectors = {}
+
+        query_norm = math.sqrt(sum(a * a for a in query_embedding))
+        rescored = []
+        for (doc, _), chunk_id in zip(docs_and_scores, ids):
+            vector = vectors[chunk_id] if chunk_id in vectors else missing_vectors[id(doc)]
+            norms = query_norm * math.sqrt(sum(b * b for b in vector))
+            dot = sum(a * b for a, b in zip(query_embedding, vector))
+            rescored.append((doc, dot / norms if norms else 0.0))
+        return rescored
+
+    def _similarity_search_with_relevance_scores(self, query: str, k: int = 4,
+                                                 **kwargs: Any) -> List[Tuple[Document, float]]:
+        """
+        Búsqueda con puntuaciones de relevancia en [0, 1].
+
+        Con búsqueda híbrida, la puntuación fusionada (RRF o ponderada) no es
+        comparable entre consultas: se mantiene el ranking híbrido y se devuelve
+        la similitud coseno densa de cada resultado, como en el backend Chroma.
+        """
+        if not self._uses_dense_scores():
+            return super()._similarity_search_with_relevance_scores(query, k=k, **kwargs)
+
+        relevance_fn = self._select_relevance_score_fn()
+        fused = self.similarity_search_with_score(query, k=k, **kwargs)
+        query_embedding = self._dense_embeddings().embed_query(query)
+        return [(doc, relevance_fn(score)) for doc, score in self._with_dense_scores(fused, query_embedding)]
+
+    def _select_relevance_score_fn(self):
+        if self._dense_field() is None:
+            return super()._select_relevance_score_fn()
+        if not self._uses_dense_scores():
+            # La puntuación fusionada no se puede normalizar: ScoredRetriever la guarda como "raw"
+            raise NotImplementedError("Las puntuaciones híbridas sin prefiltrado no están normalizadas")
+        # En colecciones híbridas las puntuaciones ya son similitudes coseno; se acotan a [0, 1]
+        return lambda score: max(0.0, min(1.0, score))
+
+
+class MilvusVectorStore(ContextGenerationMixin, VectorStoreBase):
     """Implementación de VectorStoreBase para Milvus/Zilliz con soporte para búsqueda híbrida."""
     
     def __init__(self):
@@ -38,86 +220,13 @@ class MilvusVectorStore(VectorStoreBase):
         self.use_hybrid_search = VECTORSTORE_CONFIG.get("use_hybrid_search", False)
         self.collection_name = VECTORSTORE_CONFIG.get("collection_name", "unified")
         self.partition_key_field = VECTORSTORE_CONFIG.get("partition_key_field", "ambito")
-        self.use_context_generation = VECTORSTORE_CONFIG.get("use_context_generation", False)
-        self.context_generator = None
+        self._init_context_generation()
         self.host = VECTORSTORE_CONFIG.get("milvus_host", "localhost")
         self.port = VECTORSTORE_CONFIG.get("milvus_port", "19530")
         self.user = VECTORSTORE_CONFIG.get("milvus_user", "")
         self.password = VECTORSTORE_CONFIG.get("milvus_password", "")
         self.secure = VECTORSTORE_CONFIG.get("milvus_secure", False)
     
-    def set_context_generator(self, context_generator):
-        """
-        Establece el generador de contexto para enriquecer los chunks.
-        
-        Args:
-            context_generator: Generador de contexto preconfigurado
-        """
-        if not self.use_context_generation:
-            logger.warning("La generación de contexto está desactivada en la configuración. No se configurará el generador.")
-            logger.warning("Establece VECTORSTORE_CONFIG['use_context_generation'] = True para activarla.")
-            return
-            
-        if context_generator is None:
-            logger.error("Error: Se proporcionó un generador de contexto nulo")
-            return
-            
-        try:
-            logger.info("Configurando generador de contexto para chunks...")
-            self.context_generator = context_generator
-            
-            # Verificar el tipo de context_generator
-            logger.info(f"Tipo de context_generator: {type(context_generator)}")
-            
-            # Realizar una pequeña prueba para verificar que funciona
-            logger.info("Iniciando prueba del generador de contexto...")
-            test_input = {
-                "document": "Este es un documento de prueba para verificar que el generador funciona.",
-                "chunk": "Este es un chunk de prueba."
-            }
-            logger.info(f"Enviando entrada de prueba: {test_input}")
-            
-            test_result = None
-            try:
-                test_result = self.context_generator.invoke(test_input)
-                logger.info(f"Tipo de resultado: {type(test_result)}")
-                logger.info(f"Resultado completo: {test_result}")
-            except Exception as invoke_err:
-                logger.error(f"Error al invocar el generador de contexto: {str(invoke_err)}")
-                # Intentar con un formato alternativo
-                try:
-                    logger.info("Intentando formato alternativo...")
-                    test_result = self.context_generator(test_input)
-                    logger.info(f"Resultado con formato alternativo: {test_result}")
-                except Exception as alt_err:
-                    logger.error(f"Error al usar formato alternativo: {str(alt_err)}")
-            
-            # Verificar que el resultado tenga un formato válido (dict con key 'context' o string)
-            if isinstance(test_result, dict) and 'context' in test_result:
-                logger.info("Generador de contexto configurado y probado correctamente.")
-                ejemplo = test_result['context']
-                logger.info(f"Ejemplo de generación (JSON): '{ejemplo}'")
-            elif isinstance(test_result, str) and len(test_result.strip()) > 0:
-                logger.info("Generador de contexto configurado y probado correctamente.")
-                logger.info(f"Ejemplo de generación (string): '{test_result.strip()}'")
-            else:
-                logger.warning("El generador de contexto se configuró pero la prueba no generó texto o el resultado no tiene el formato esperado.")
-                logger.warning(f"Resultado obtenido: {test_result}")
-                logger.warning("Comprueba que el modelo LLM está funcionando correctamente y que el prompt es adecuado.")
-                
-                # Intentar continuar a pesar del error
-                logger.info("Se intentará continuar con el generador de contexto a pesar del error.")
-                
-            # En todos los casos, configuramos el generador si obtuvimos algún resultado
-            if test_result is not None:
-                logger.info("Generador de contexto configurado correctamente")
-                
-        except Exception as e:
-            logger.error(f"Error al configurar el generador de contexto: {str(e)}")
-            import traceback
-            logger.error(f"Traza completa: {traceback.format_exc()}")
-            self.context_generator = None
-    
     def _get_connection_args(self) -> Dict[str, Any]:
         """
         Obtiene los argumentos de conexión para Milvus.
@@ -286,7 +395,7 @@ class MilvusVectorStore(VectorStoreBase):
         
         # Determinar si queremos usar búsqueda híbrida
         use_hybrid_search = kwargs.get("use_hybrid_search", self.use_hybrid_search)
-        use_partition_key = VECTORSTORE_CONFIG.get("use_partitioning", False)
+        use_partition_key = kwargs.get("use_partitioning", VECTORSTORE_CONFIG.get("use_partitioning", False))
         partition_key_field = kwargs.get("partition_key_field", self.partition_key_field) if use_partition_key else None
         
         # Si se solicita verificar si la colección existe antes de crearla
@@ -308,7 +417,7 @@ class MilvusVectorStore(VectorStoreBase):
                     check_kwargs["vector_field"] = ["dense", "sparse"]
                 
                 # Intentar cargar la colección
-                existing_db = Milvus(**check_kwargs)
+                existing_db = FilteredMilvus(**check_kwargs)
                 
                 # Verificar si la colección se cargó correctamente
                 if hasattr(existing_db, 'col') and existing_db.col is not None:
@@ -342,6 +451,7 @@ class MilvusVectorStore(VectorStoreBase):
             if partition_key_field and use_partition_key:
                 logger.info(f"Configurando particionamiento por campo: {partition_key_field}")
                 vs_kwargs["partition_key_field"] = partition_key_field
+                vs_kwargs["num_partitions"] = VECTORSTORE_CONFIG.get("partition_key_num_partitions", 16)
             
             # Si queremos usar búsqueda híbrida (denso + sparse)
             if use_hybrid_search:
@@ -349,7 +459,7 @@ class MilvusVectorStore(VectorStoreBase):
                 vs_kwargs["builtin_function"] = BM25BuiltInFunction()
                 vs_kwargs["vector_field"] = ["dense", "sparse"]  # 'dense' para embeddings, 'sparse' para BM25
               # Crear la vectorstore
-            vectorstore = Milvus.from_documents(
+            vectorstore = FilteredMilvus.from_documents(
                 documents=documents,
                 **vs_kwargs
             )
@@ -364,18 +474,19 @@ class MilvusVectorStore(VectorStoreBase):
             return vectorstore
         except Exception as e:
             logger.error(f"Error al crear la vectorstore: {e}")
+            error = e
 
         # Intentar sin partition_key_field si el error es sobre ese campo
-        if "PartitionKeyException" in str(e) and "partition key field" in str(e) and partition_key_field:
+        if "PartitionKeyException" in str(error) and "partition key field" in str(error) and partition_key_field:
             logger.warning("Error con campo de partición. Intentando sin particionamiento...")
             # Eliminar partition_key_field y reintentar
-            if "partition_key_field" in vs_kwargs:
-                del vs_kwargs["partition_key_field"]
+            vs_kwargs.pop("partition_key_field", None)
+            vs_kwargs.pop("num_partitions", None)
             
             try:
                 # Asegurar que auto_id sigue siendo True
                 vs_kwargs["auto_id"] = True
-                vectorstore = Milvus.from_documents(
+                vectorstore = FilteredMilvus.from_documents(
                     documents=documents,
                     **vs_kwargs
                 )
@@ -385,8 +496,8 @@ class MilvusVectorStore(VectorStoreBase):
                 logger.error(f"Error en segundo intento sin particionamiento: {e2}")
 
         # Si el error es sobre un campo faltante, verificar y asegurar que todos los documentos lo tienen
-        if "Insert missed an field" in str(e):
-            field_match = re.search(r"Insert missed an field `([^`]+)`", str(e))
+        if "Insert missed an field" in str(error):
+            field_match = re.search(r"Insert missed an field `([^`]+)`", str(error))
             if field_match:
                 missing_field = field_match.group(1)
                 logger.warning(f"Error por campo faltante: {missing_field}. Asegurando que todos los documentos lo tienen.")
@@ -400,7 +511,7 @@ class MilvusVectorStore(VectorStoreBase):
                 try:
                     # Asegurar que auto_id sigue siendo True
                     vs_kwargs["auto_id"] = True
-                    vectorstore = Milvus.from_documents(
+                    vectorstore = FilteredMilvus.from_documents(
                         documents=documents,
                         **vs_kwargs
                     )
@@ -438,6 +549,10 @@ class MilvusVectorStore(VectorStoreBase):
                 "auto_id": True
             }
             
+            # Colecciones particionadas por ámbito
+            if VECTORSTORE_CONFIG.get("use_partitioning", False):
+                vs_kwargs["partition_key_field"] = self.partition_key_field
+            
             # Si queremos usar búsqueda híbrida
             if use_hybrid_search:
                 logger.info("Configurando función BM25 para búsqueda híbrida")
@@ -445,11 +560,15 @@ class MilvusVectorStore(VectorStoreBase):
                 vs_kwargs["vector_field"] = ["dense", "sparse"]  # 'dense' para embeddings, 'sparse' para BM25
             
             # Intentar cargar la vectorstore
-            milvus_db = Milvus(**vs_kwargs)
+            milvus_db = FilteredMilvus(**vs_kwargs)
             
             # Verificar si la colección existe realmente
             if hasattr(milvus_db, 'col') and milvus_db.col is not None:
                 logger.info(f"Colección {collection_name} cargada correctamente")
+                if VECTORSTORE_CONFIG.get("use_partitioning", False) and not any(
+                        getattr(field, "is_partition_key", False) for field in milvus_db.col.schema.fields):
+                    logger.warning(f"La colección {collection_name} se creó sin partition key: los filtros por ámbito "
+                                   f"recorren toda la colección hasta que se recree")
                 return milvus_db
             else:
                 logger.error(f"La colección {collection_name} no existe")
@@ -459,6 +578,7 @@ class MilvusVectorStore(VectorStoreBase):
             logger.error(f"Error al cargar la vectorstore Milvus: {str(e)}")
             return None
     
+    @with_retrieval_cache
     def create_retriever(self, vectorstore: Milvus, k: Optional[int] = None, 
                       similarity_threshold: float = 0.7, **kwargs) -> BaseRetriever:
         """
@@ -486,11 +606,11 @@ class MilvusVectorStore(VectorStoreBase):
         
         try:
             # Crear el retriever base con búsqueda híbrida
-            base_retriever = vectorstore.as_retriever(
-                search_type="similarity",
+            # ScoredRetriever guarda la puntuación de cada documento para el prefiltrado del workflow
+            base_retriever = ScoredRetriever(
+                vectorstore=vectorstore,
                 search_kwargs={
-                    "k": k * VECTORSTORE_CONFIG.get("compression_top_k_multiplier", 2) if use_compression else k,
-                    "score_threshold": similarity_threshold
+                    "k": k * VECTORSTORE_CONFIG.get("compression_top_k_multiplier", 2) if use_compression else k
                 }
             )
             
@@ -498,23 +618,13 @@ class MilvusVectorStore(VectorStoreBase):
             if use_compression:
                 
                 logger.info("Configurando compresión contextual con BGE reranker")
+                from langchain.retrievers.contextual_compression import ContextualCompressionRetriever
+                from langchain.retrievers.document_compressors import CrossEncoderReranker
                 
-                # Configuración del modelo
-                model_name = VECTORSTORE_CONFIG.get("bge_reranker_model", "BAAI/bge-reranker-v2-m3")
-                device = VECTORSTORE_CONFIG.get("bge_device", "cpu")
-                max_length = VECTORSTORE_CONFIG.get("bge_max_length", 512)
-                
-                # Detectar automáticamente si CUDA está disponible
-                if device == "auto":
-                    device = "cuda" if torch.cuda.is_available() else "cpu"
-                
-                logger.info(f"Cargando modelo BGE: {model_name} en dispositivo: {device}")
-                
-                # Crear el cross encoder con configuración específica
-                cross_encoder = HuggingFaceCrossEncoder(
-                    model_name=model_name,
-                    model_kwargs={"device": device}
-                )
+                # Cross encoder compartido entre todas las colecciones (se carga una sola vez)
+                cross_encoder = get_cross_encoder()
+                model_name = cross_encoder.model_name
+                device = cross_encoder.device
                 
                 # Crear el compresor reranker
                 compressor = CrossEncoderReranker(
@@ -531,6 +641,7 @@ class MilvusVectorStore(VectorStoreBase):
                 logger.info(f"Retriever con compresión contextual BGE creado correctamente")
                 logger.info(f"  Modelo: {model_name}")
                 logger.info(f"  Dispositivo: {device}")
+                logger.info(f"  Backend: {cross_encoder.backend} (lotes de {cross_encoder.batch_size})")
                 logger.info(f"  Top-k final: {k}")
                 logger.info(f"  Documentos iniciales: {k * VECTORSTORE_CONFIG.get('compression_top_k_multiplier', 3)}")
                 
@@ -547,12 +658,9 @@ class MilvusVectorStore(VectorStoreBase):
             if use_compression:
                 logger.warning("Error con compresión contextual, intentando sin compresión como fallback")
                 try:
-                    fallback_retriever = vectorstore.as_retriever(
-                        search_type="similarity",
-                        search_kwargs={
-                            "k": k,
-                            "score_threshold": similarity_threshold
-                        }
+                    fallback_retriever = ScoredRetriever(
+                        vectorstore=vectorstore,
+                        search_kwargs={"k": k}
                     )
                     logger.info("Retriever fallback (sin compresión) creado correctamente")
                     return fallback_retriever
@@ -631,7 +739,8 @@ class MilvusVectorStore(VectorStoreBase):
             logger.info("🤖 INICIANDO GENERACIÓN DE CONTEXTO CON LLM")
             logger.info("=" * 70)
             
-            documents = self._generate_context_for_chunks(documents, source_documents, chunk_size)
+            with track_stage(get_collection_name(vectorstore), "context", len(documents)):
+                documents = self._generate_context_for_chunks(documents, source_documents, chunk_size)
             
             logger.info("=" * 70)
             logger.info("✅ GENERACIÓN DE CONTEXTO COMPLETADA")
@@ -706,8 +815,10 @@ class MilvusVectorStore(VectorStoreBase):
         # Reemplazar los documentos originales con los actualizados
         documents = updated_documents
             
+        collection_name = get_collection_name(vectorstore)
+        
         try:            # Para colecciones grandes, dividir en lotes
-            batch_size = 50  # Reducir aún más para evitar problemas
+            batch_size = VECTORSTORE_CONFIG.get("insert_batch_size", 50)
             total_docs = len(documents)
             
             if total_docs <= batch_size:
@@ -722,7 +833,8 @@ class MilvusVectorStore(VectorStoreBase):
                 
                 # Intentar añadir directamente sin especificar IDs
                 # Para Milvus con auto_id=True, NO pasamos ids
-                ids = vectorstore.add_documents(documents)
+                with track_stage(collection_name, "insert", total_docs):
+                    ids = vectorstore.add_documents(documents)
                 logger.info(f"Se han añadido {total_docs} documentos correctamente")
                 logger.info(f"IDs generados: {len(ids) if ids else 0}")
             else:
@@ -731,18 +843,35 @@ class MilvusVectorStore(VectorStoreBase):
                 
                 # Crear barra de progreso para el proceso de adición por lotes
                 total_batches = (total_docs + batch_size - 1) // batch_size
-                with tqdm(total=total_batches, desc="Añadiendo documentos", unit="lote") as progress_bar:
+                
+                # Los embeddings del lote siguiente se calculan mientras se inserta el actual
+                prefetch = self._can_prefetch_embeddings(vectorstore)
+                with tqdm(total=total_batches, desc="Añadiendo documentos", unit="lote") as progress_bar, \
+                        ThreadPoolExecutor(max_workers=1) as prefetch_executor:
                     all_ids = []
+                    prefetch_future = None
+                    if prefetch:
+                        prefetch_future = self._submit_embedding_prefetch(
+                            prefetch_executor, vectorstore, documents[:batch_size], collection_name)
+                    
                     for i in range(0, total_docs, batch_size):
                         end_idx = min(i + batch_size, total_docs)
                         batch = documents[i:end_idx]                        # Actualizar la descripción con información del lote actual
                         current_batch = i // batch_size + 1
                         progress_bar.set_description(f"Añadiendo lote {current_batch}/{total_batches} ({len(batch)} docs)")
                         
+                        if prefetch_future is not None:
+                            prefetch_future.result()
+                            prefetch_future = None
+                            if end_idx < total_docs:
+                                prefetch_future = self._submit_embedding_prefetch(
+                                    prefetch_executor, vectorstore, documents[end_idx:end_idx + batch_size], collection_name)
+                        
                         try:
                             # Añadir el lote sin especificar IDs explícitamente
                             # Para Milvus con auto_id=True, no pasar el parámetro ids
-                            batch_ids = vectorstore.add_documents(batch)
+                            with track_stage(collection_name, "insert", len(batch)):
+                                batch_ids = vectorstore.add_documents(batch)
                             if batch_ids:
                                 all_ids.extend(batch_ids)
                             
@@ -859,156 +988,60 @@ class MilvusVectorStore(VectorStoreBase):
                     logger.error(f"Error en diagnóstico: {diag_error}")
             return False
     
-    def _generate_context_for_chunks(self, documents: List[Document], 
-                               source_documents: Dict[str, Document], 
-                               chunk_size: Optional[int] = None) -> List[Document]:
+    @staticmethod
+    def _can_prefetch_embeddings(vectorstore: Milvus) -> bool:
         """
-        Genera contexto para cada chunk utilizando el documento completo y el LLM.
-        Optimizado para procesamiento en lotes y concurrencia.
+        Indica si se pueden precalcular los embeddings de un lote mientras se inserta el anterior.
+        
+        Solo tiene sentido con la caché de embeddings: el precálculo la rellena y
+        la inserción posterior reutiliza los vectores en lugar de recalcularlos.
         
         Args:
-            documents: Lista de chunks (documentos) a enriquecer con contexto
-            source_documents: Diccionario con los documentos originales completos
-            chunk_size: Tamaño de chunk específico de la colección (opcional)
+            vectorstore: Instancia de Milvus vectorstore
             
         Returns:
-            List[Document]: Documentos con contexto generado añadido
+            bool: True si el precálculo está activado y los embeddings usan caché
         """
-        if not self.use_context_generation or not self.context_generator:
-            logger.warning("No se puede generar contexto: generador no configurado o función desactivada")
-            return documents
-        
-        if not source_documents or len(source_documents) == 0:
-            logger.warning("No se puede generar contexto: no se proporcionaron documentos originales")
-            return documents
-            
-        logger.info(f"Generando contexto para {len(documents)} chunks...")
-        
-        # Configuración de optimización
-        batch_size = VECTORSTORE_CONFIG.get("context_batch_size", 10)  # Procesar en lotes
-        max_workers = VECTORSTORE_CONFIG.get("context_max_workers", 3)  # Concurrencia limitada
-        skip_existing = VECTORSTORE_CONFIG.get("skip_existing_context", True)
-          # Filtrar documentos que necesitan contexto
-        docs_to_process = []
-        docs_with_existing_context = 0
-        
-        for i, doc in enumerate(documents):
-            # Saltar documentos que ya tienen contexto si está configurado
-            if skip_existing and doc.metadata.get('context_generation', '').strip():
-                docs_with_existing_context += 1
-                continue
-                
-            source_path = doc.metadata.get('source', '')
-            if source_path and source_path in source_documents:
-                docs_to_process.append((i, doc, source_documents[source_path]))
-        
-        if docs_with_existing_context > 0:
-            logger.info(f"Saltando {docs_with_existing_context} documentos que ya tienen contexto")
-        
-        if not docs_to_process:
-            logger.info("No hay documentos para procesar contexto")
-            return documents
-          # Determinar el chunk_size a usar: parámetro específico o configuración global
-        final_chunk_size = chunk_size if chunk_size is not None else VECTORSTORE_CONFIG.get("chunk_size", 512)
-        
-        logger.info(f"Procesando contexto para {len(docs_to_process)} chunks en lotes de {batch_size}")
-        logger.info(f"Usando chunk_size específico de la colección: {final_chunk_size}")
-        
-        # Función para procesar un lote de documentos
-        def process_batch(batch):
-            batch_results = []
-            for doc_idx, doc, full_document in batch:
-                try:
-                    # Usar el chunk_size específico determinado
-                    
-                    # Preparar input para el generador
-                    context_input = {
-                        "document": full_document.page_content,
-                        "chunk": doc.page_content,
-                        "chunk_size": final_chunk_size
-                    }
-                    
-                    # Generar contexto
-                    context_result = self.context_generator.invoke(context_input)
-                    
-                    # Procesar resultado
-                    if isinstance(context_result, dict) and 'context' in context_result:
-                        context = context_result['context']
-                        if isinstance(context, dict):
-                            import json
-                            context = json.dumps(context, ensure_ascii=False, indent=2)
-                    else:
-                        if isinstance(context_result, dict):
-                            import json
-                            context = json.dumps(context_result, ensure_ascii=False, indent=2)
-                        else:
-                            context = str(context_result)
-                    
-                    if not isinstance(context, str):
-                        import json
-                        context = json.dumps(context, ensure_ascii=False, indent=2)
-                    
-                    batch_results.append((doc_idx, context.strip()))
-                    
-                except Exception as e:
-                    logger.error(f"Error procesando chunk {doc_idx}: {str(e)}")
-                    batch_results.append((doc_idx, ""))
-            
-            return batch_results
-        
-        # Procesar en lotes con ThreadPoolExecutor para I/O concurrente
-        from concurrent.futures import ThreadPoolExecutor, as_completed
-        import threading
-        
-        processed_count = 0
-        total_docs = len(docs_to_process)
-        
-        # Crear barra de progreso
-        progress_bar = tqdm(total=total_docs, desc="Generando contexto", unit="chunk")
-        
-        # Dividir en lotes
-        batches = [docs_to_process[i:i + batch_size] for i in range(0, len(docs_to_process), batch_size)]
+        if not VECTORSTORE_CONFIG.get("pipeline_embeddings", True):
+            return False
+        # Los embeddings pueden estar envueltos (p. ej. por la caché de consultas)
+        embeddings = getattr(vectorstore, "embeddings", None)
+        while embeddings is not None:
+            if isinstance(embeddings, CachedEmbeddings):
+                return True
+            embeddings = getattr(embeddings, "underlying", None)
+        return False
+    
+    @staticmethod
+    def _submit_embedding_prefetch(executor: ThreadPoolExecutor, vectorstore: Milvus,
+                                   batch: List[Document], collection_name: str) -> Future:
+        """
+        Calcula en segundo plano los embeddings de un lote para que queden en la caché.
         
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # Enviar todos los lotes
-            future_to_batch = {executor.submit(process_batch, batch): batch for batch in batches}
+        Args:
+            executor: Executor de precálculo
+            vectorstore: Instancia de Milvus vectorstore
+            batch: Lote de documentos
+            collection_name: Colección (para las estadísticas de carga)
             
-            for future in as_completed(future_to_batch):
-                try:
-                    batch_results = future.result()
-                    
-                    # Aplicar resultados al documento original
-                    for doc_idx, context in batch_results:
-                        documents[doc_idx].metadata['context_generation'] = context
-                        processed_count += 1
-                        
-                        # Actualizar barra de progreso
-                        progress_bar.update(1)
-                        completion_percentage = (processed_count / total_docs) * 100
-                        progress_bar.set_description(f"Generando contexto {completion_percentage:.1f}%")
-                        
-                except Exception as e:
-                    logger.error(f"Error procesando lote: {str(e)}")
-                    # Actualizar progreso incluso si falla el lote
-                    batch = future_to_batch[future]
-                    progress_bar.update(len(batch))
-        
-        progress_bar.close()
-        
-        # Contar documentos con contexto final
-        docs_with_context = sum(1 for doc in documents if doc.metadata.get('context_generation', '').strip())
-        
-        logger.info(f"Resumen de generación de contexto:")
-        logger.info(f"  Total de chunks: {len(documents)}")
-        logger.info(f"  Chunks procesados: {processed_count}")
-        logger.info(f"  Chunks con contexto final: {docs_with_context}")
-        logger.info(f"  Chunks con contexto previo: {docs_with_existing_context}")
+        Returns:
+            Future: Tarea de precálculo
+        """
+        def prefetch():
+            try:
+                with track_stage(collection_name, "embed", len(batch)):
+                    vectorstore.embeddings.embed_documents([doc.page_content for doc in batch])
+            except Exception as e:
+                # La inserción calculará los embeddings que falten
+                logger.warning(f"Error precalculando embeddings del lote: {e}")
         
-        return documents 
-
+        # Copiar el contexto para que el hilo registre las etapas en las estadísticas activas
+        return executor.submit(contextvars.copy_context().run, prefetch)
+    
     def load_documents(self, documents: List[Document], embeddings: Embeddings = None, 
                      source_documents: Dict[str, Document] = None, 
-                     chunk_size: Optional[int] = None) -> bool:
+                     chunk_size: Optional[int] = None,
+                     collection_name: Optional[str] = None) -> bool:
         """
         Carga documentos en la vectorstore.
         Si la colección no existe, la crea.
@@ -1019,6 +1052,7 @@ class MilvusVectorStore(VectorStoreBase):
             embeddings: Modelo de embeddings a utilizar (opcional)
             source_documents: Diccionario con los documentos originales completos (opcional)
             chunk_size: Tamaño de chunk específico de la colección (opcional)
+            collection_name: Colección de destino (por defecto, la de la configuración)
             
         Returns:
             bool: True si los documentos se cargaron correctamente
@@ -1034,7 +1068,7 @@ class MilvusVectorStore(VectorStoreBase):
             return False
             
         # Obtener el nombre de la colección
-        collection_name = VECTORSTORE_CONFIG.get("collection_name", "default_collection")
+        collection_name = collection_name or VECTORSTORE_CONFIG.get("collection_name", "default_collection")
         
         # Intentar cargar la vectorstore existente
         vectorstore = self.load_vectorstore(embeddings, collection_name)
@@ -1058,7 +1092,8 @@ class MilvusVectorStore(VectorStoreBase):
                 return self.add_documents_to_collection(vectorstore, documents, source_documents, chunk_size)
             else:
                 # Sin generación de contexto, crear directamente
-                vectorstore = self.create_vectorstore(documents, embeddings, collection_name)
+                with track_stage(collection_name, "insert", len(documents)):
+                    vectorstore = self.create_vectorstore(documents, embeddings, collection_name)
                 if vectorstore is None:
                     logger.error("No se pudo crear la vectorstore")
                     return False
@@ -1067,10 +1102,227 @@ class MilvusVectorStore(VectorStoreBase):
             logger.info("Vectorstore existente encontrado - añadiendo documentos...")
             return self.add_documents_to_collection(vectorstore, documents, source_documents, chunk_size)
     
+    def _iterate_field_values(self, vectorstore, output_fields: List[str], expr: str):
+        """
+        Recorre todos los registros de la colección devolviendo los campos indicados.
+        
+        Usa query_iterator de pymilvus (consulta escalar por lotes), sin embeddings
+        ni búsquedas de similitud.
+        
+        Args:
+            vectorstore: Instancia de Milvus vectorstore
+            output_fields: Campos a devolver
+            expr: Expresión de filtro escalar
+            
+        Yields:
+            Dict[str, Any]: Registro con los campos solicitados
+        """
+        batch_size = VECTORSTORE_CONFIG.get("manifest_scan_batch_size", 1000)
+        iterator = vectorstore.col.query_iterator(batch_size=batch_size, expr=expr, output_fields=output_fields)
+        try:
+            while True:
+                batch = iterator.next()
+                if not batch:
+                    break
+                yield from batch
+        finally:
+            iterator.close()
+    
+    def count_chunks(self, vectorstore) -> Optional[int]:
+        """
+        Cuenta los chunks de la colección Milvus con una consulta count(*).
+        
+        A diferencia de num_entities, count(*) no incluye los registros eliminados
+        pendientes de compactación.
+        
+        Args:
+            vectorstore: Instancia de Milvus vectorstore
+            
+        Returns:
+            Optional[int]: Número de chunks o None si no se pudo contar
+        """
+        if getattr(vectorstore, "col", None) is None:
+            return None
+        try:
+            return vectorstore.col.query(expr="", output_fields=["count(*)"])[0]["count(*)"]
+        except Exception as e:
+            logger.warning(f"No se pudo contar los chunks de la colección Milvus: {e}")
+            return None
+    
+    def get_collection_manifest(self, vectorstore) -> Optional[Dict[str, Dict[str, Any]]]:
+        """
+        Obtiene el manifiesto exacto de la colección Milvus recorriendo el campo source.
+        
+        Solo lee source y, si la colección lo tiene, el campo chunk_hash; el texto
+        de los chunks no se recupera.
+        
+        Args:
+            vectorstore: Instancia de Milvus vectorstore
+            
+        Returns:
+            Optional[Dict[str, Dict[str, Any]]]: source -> {"chunk_count", "content_hash"} o None si falla
+        """
+        if getattr(vectorstore, "col", None) is None:
+            return None
+        
+        has_hash_field = "chunk_hash" in (getattr(vectorstore, "fields", None) or [])
+        output_fields = ["source", "chunk_hash"] if has_hash_field else ["source"]
+        start_time = time.time()
+        
+        try:
+            records = (
+                (record.get("source"), record.get("chunk_hash"))
+                for record in self._iterate_field_values(vectorstore, output_fields, 'source != ""')
+            )
+            manifest = self.build_manifest(records)
+        except Exception as e:
+            logger.warning(f"No se pudo construir el manifiesto de la colección: {e}")
+            return None
+        
+        total_chunks = sum(entry["chunk_count"] for entry in manifest.values())
+        logger.info(f"Manifiesto de la colección: {len(manifest)} fuentes, {total_chunks} chunks "
+                    f"({time.time() - start_time:.2f}s)")
+        return manifest
+    
+    def get_chunk_index(self, vectorstore, cubos: List[str]) -> Optional[Dict[str, Dict[str, List[Any]]]]:
+        """
+        Obtiene los identificadores de los chunks de cada cubo agrupados por hash de contenido.
+        
+        Usa el campo chunk_hash si la colección lo tiene y, en colecciones creadas
+        antes de guardarlo, calcula el hash a partir del texto almacenado.
+        
+        Args:
+            vectorstore: Instancia de Milvus vectorstore
+            cubos: Cubos a consultar
+            
+        Returns:
+            Optional[Dict[str, Dict[str, List[Any]]]]: cubo -> {chunk_hash: [ids]} o None si falla
+        """
+        if getattr(vectorstore, "col", None) is None or not cubos:
+            return None
+        
+        primary_field = getattr(vectorstore, "_primary_field", "pk")
+        text_field = getattr(vectorstore, "_text_field", "text")
+        has_hash_field = "chunk_hash" in (getattr(vectorstore, "fields", None) or [])
+        output_fields = [primary_field, "cubo_source", "chunk_hash" if has_hash_field else text_field]
+        cubos_expr = ", ".join(f'"{cubo}"' for cubo in cubos)
+        
+        chunk_index: Dict[str, Dict[str, List[Any]]] = {cubo: {} for cubo in cubos}
+        try:
+            for record in self._iterate_field_values(vectorstore, output_fields, f"cubo_source in [{cubos_expr}]"):
+                chunk_hash = record.get("chunk_hash") or self.compute_chunk_hash(record.get(text_field))
+                chunk_index.setdefault(record.get("cubo_source"), {}).setdefault(chunk_hash, []).append(record[primary_field])
+        except Exception as e:
+            logger.warning(f"No se pudo obtener el índice de chunks de los cubos {cubos}: {e}")
+            return None
+        
+        return chunk_index
+    
+    def update_chunk_sources(self, vectorstore, sources: Dict[Any, str]) -> Set[Any]:
+        """
+        Actualiza el source de chunks conservados de la colección Milvus.
+        
+        Milvus no modifica campos escalares en el sitio: los registros se leen
+        con sus vectores almacenados, se insertan de nuevo con el source nuevo
+        (sin recalcular embeddings ni contexto) y se eliminan los originales.
+        Los campos calculados por funciones (BM25) los vuelve a generar Milvus.
+        
+        Cada lote se procesa por separado. Si no se pueden eliminar los
+        originales de un lote, se eliminan las copias recién insertadas y el
+        lote se da por no actualizado, de modo que no quedan duplicados.
+        
+        Args:
+            vectorstore: Instancia de Milvus vectorstore
+            sources: Clave primaria del chunk -> nuevo source
+            
+        Returns:
+            Set[Any]: Claves primarias de los chunks actualizados
+        """
+        updated = set()
+        if not sources or getattr(vectorstore, "col", None) is None:
+            return updated
+        
+        schema = vectorstore.col.schema
+        function_outputs = {name for function in (getattr(schema, "functions", None) or [])
+                            for name in function.output_field_names}
+        primary_field = getattr(vectorstore, "_primary_field", "pk")
+        if not any(field.is_primary and field.auto_id for field in schema.fields):
+            # Las copias tendrían la misma clave que los originales y se borrarían con ellos
+            logger.warning("La colección no usa auto_id; los chunks sin cambios se vuelven a insertar")
+            return updated
+        output_fields = [field.name for field in schema.fields if field.name not in function_outputs]
+        if getattr(schema, "enable_dynamic_field", False):
+            output_fields.append("*")
+        
+        ids = list(sources)
+        batch_size = VECTORSTORE_CONFIG.get("manifest_scan_batch_size", 1000)
+        for i in range(0, len(ids), batch_size):
+            batch = ids[i:i + batch_size]
+            ids_expr = ", ".join(_expr_literal(chunk_id) for chunk_id in batch)
+            try:
+                records = vectorstore.col.query(expr=f"{primary_field} in [{ids_expr}]", output_fields=output_fields)
+                if not records:
+                    continue
+                rows = []
+                for record in records:
+                    row = {key: value for key, value in record.items() if key not in function_outputs}
+                    row["source"] = sources[record[primary_field]]
+                    row.pop(primary_field, None)
+                    rows.append(row)
+                inserted = vectorstore.col.insert(rows)
+            except Exception as e:
+                logger.error(f"Error copiando chunks con el source nuevo en Milvus: {e}")
+                continue
+            
+            record_ids = [record[primary_field] for record in records]
+            if self.remove_documents_by_ids(vectorstore, record_ids):
+                updated.update(record_ids)
+            elif not self.remove_documents_by_ids(vectorstore, list(inserted.primary_keys)):
+                logger.error(f"No se pudieron eliminar ni los originales ni las copias de {len(record_ids)} chunks; "
+                             f"quedan duplicados con el source anterior y el nuevo")
+        
+        logger.info(f"Actualizado el source de {len(updated)} de {len(ids)} chunks sin cambios")
+        return updated
+    
+    def remove_documents_by_ids(self, vectorstore, ids: List[Any]) -> bool:
+        """
+        Elimina chunks concretos de la colección Milvus por su clave primaria.
+        
+        Args:
+            vectorstore: Instancia de Milvus vectorstore
+            ids: Claves primarias de los chunks a eliminar
+            
+        Returns:
+            bool: True si se eliminaron correctamente
+        """
+        if not ids:
+            return True
+        
+        if getattr(vectorstore, "col", None) is None:
+            logger.warning("No se pudo acceder a la colección para eliminar chunks")
+            return False
+        
+        primary_field = getattr(vectorstore, "_primary_field", "pk")
+        batch_size = VECTORSTORE_CONFIG.get("manifest_scan_batch_size", 1000)
+        
+        try:
+            for i in range(0, len(ids), batch_size):
+                batch = ids[i:i + batch_size]
+                ids_expr = ", ".join(f'"{chunk_id}"' if isinstance(chunk_id, str) else str(chunk_id) for chunk_id in batch)
+                vectorstore.col.delete(expr=f"{primary_field} in [{ids_expr}]")
+            logger.info(f"Eliminados {len(ids)} chunks de Milvus")
+            return True
+        except Exception as e:
+            logger.error(f"Error eliminando chunks de Milvus: {e}")
+            return False
+    
     def get_existing_documents_metadata(self, vectorstore, field: str = "source") -> set:
         """
         Obtiene metadatos de documentos existentes para verificar duplicados.
         
+        Recorre la colección completa con una consulta escalar en lugar de
+        búsquedas de similitud, por lo que el resultado es exacto.
+        
         Args:
             vectorstore: Instancia de Milvus vectorstore
             field: Campo de metadata a verificar
@@ -1081,24 +1333,10 @@ class MilvusVectorStore(VectorStoreBase):
         existing_values = set()
         
         try:
-            if hasattr(vectorstore, 'similarity_search'):
-                # Hacer múltiples búsquedas para obtener más documentos
-                search_terms = ["cubo", "información", "datos", "consulta", 
-                                "docencia", "convocatoria", "puesto", "estudios propios",
-                                "solicitud convocatoria", "solicitud puesto", "puesto docente"
-                                "proyectos", "proyecto", "proyectos de investigación",
-                                "cargo", "rendimiento", "tasa", "evaluación docente", "estudiantesIN",
-                                "grupos", "egresados", "estudiantesOUT"]
-                
-                for term in search_terms:
-                    try:
-                        docs = vectorstore.similarity_search(term, k=50)
-                        for doc in docs:
-                            if field in doc.metadata and doc.metadata[field]:
-                                existing_values.add(doc.metadata[field])
-                    except Exception as e:
-                        logger.debug(f"Error en búsqueda con término '{term}': {e}")
-                        continue
+            if getattr(vectorstore, "col", None) is not None:
+                for record in self._iterate_field_values(vectorstore, [field], f'{field} != ""'):
+                    if record.get(field):
+                        existing_values.add(record[field])
                         
                 logger.info(f"Metadatos existentes encontrados para '{field}': {len(existing_values)} valores únicos")
                         
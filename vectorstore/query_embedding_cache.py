@@ -0,0 +1,93 @@
+"""
+Caché LRU en memoria de embeddings de consultas.
+
+Una misma ejecución del agente vectoriza varias veces la misma pregunta: el
+agente de ámbito la busca para identificar el ámbito, el nodo retrieve la
+vuelve a buscar (quizá reescrita) y cada reintento la busca en otra
+colección. Todas las vectorstores del agente comparten el mismo objeto de
+embeddings, así que envolverlo con QueryEmbeddingCache evita repetir esas
+pasadas del modelo. Los embeddings de documentos se delegan sin cambios (los
+cachea en disco CachedEmbeddings).
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Dict, List
+
+from langchain_core.embeddings import Embeddings
+
+# Usar el sistema de logging centralizado
+from langagent.config.logging_config import get_logger
+logger = get_logger(__name__)
+
+
+class QueryEmbeddingCache(Embeddings):
+    """Embeddings con caché LRU thread-safe de embed_query."""
+
+    def __init__(self, underlying: Embeddings, max_entries: int = 512):
+        """
+        Inicializa la caché.
+
+        Args:
+            underlying: Modelo de embeddings (puede ser a su vez un CachedEmbeddings)
+            max_entries: Número máximo de consultas almacenadas
+        """
+        self.underlying = underlying
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Devuelve el embedding de una consulta, calculándolo solo si no está en la caché.
+
+        Args:
+            text: Consulta a vectorizar
+
+        Returns:
+            List[float]: Embedding de la consulta
+        """
+        with self._lock:
+            embedding = self._entries.get(text)
+            if embedding is not None:
+                self._entries.move_to_end(text)
+                self.hits += 1
+                return list(embedding)
+            self.misses += 1
+
+        # El modelo se ejecuta fuera del bloqueo para no serializar consultas distintas
+        embedding = self.underlying.embed_query(text)
+
+        with self._lock:
+            self._entries[text] = list(embedding)
+            self._entries.move_to_end(text)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return embedding
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Calcula los embeddings de documentos con el modelo envuelto."""
+        return self.underlying.embed_documents(texts)
+
+    def clear(self):
+        """Vacía la caché."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, object]:
+        """
+        Devuelve los contadores de la caché para monitorización.
+
+        Returns:
+            Dict[str, object]: Aciertos, fallos, tasa de acierto y tamaño
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "size": len(self._entries),
+            }
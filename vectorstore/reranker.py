@@ -0,0 +1,178 @@
+"""
+Registro compartido de modelos cross-encoder para el reranking.
+
+Los retrievers con compresión contextual de todas las colecciones (principal y
+adaptativas) comparten una única instancia de cada modelo cross-encoder, que
+se carga la primera vez que se solicita. Los pares (consulta, documento) se
+puntúan en lotes de tamaño configurable y se puede elegir un backend
+optimizado para CPU:
+
+- "torch": modelo de sentence-transformers sin modificar
+- "torch_int8": cuantización dinámica int8 de las capas lineales (CPU)
+- "onnx": backend ONNX Runtime de sentence-transformers
+"""
+
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_community.cross_encoders import BaseCrossEncoder
+from langagent.config.config import VECTORSTORE_CONFIG
+
+# Usar el sistema de logging centralizado
+from langagent.config.logging_config import get_logger
+logger = get_logger(__name__)
+
+RERANKER_BACKENDS = ("torch", "torch_int8", "onnx")
+
+
+def resolve_device(device: str) -> str:
+    """
+    Resuelve el dispositivo del modelo, detectando CUDA si se indica "auto".
+
+    Args:
+        device (str): Dispositivo configurado ("auto", "cpu", "cuda"...)
+
+    Returns:
+        str: Dispositivo a utilizar
+    """
+    if device != "auto":
+        return device
+    try:
+        import torch
+        return "cuda" if torch.cuda.is_available() else "cpu"
+    except ImportError:
+        return "cpu"
+
+
+class BatchedCrossEncoder(BaseCrossEncoder):
+    """Cross-encoder de sentence-transformers que puntúa los pares por lotes."""
+
+    def __init__(self, model_name: str, device: str = "cpu", backend: str = "torch",
+                 max_length: Optional[int] = None, batch_size: int = 32,
+                 onnx_file_name: Optional[str] = None):
+        """
+        Carga el modelo cross-encoder con el backend indicado.
+
+        Args:
+            model_name (str): Modelo de Hugging Face (por ejemplo, BAAI/bge-reranker-v2-m3)
+            device (str): Dispositivo del modelo
+            backend (str): "torch", "torch_int8" u "onnx"
+            max_length (int, optional): Longitud máxima de la secuencia (consulta + documento)
+            batch_size (int): Pares por lote en cada llamada al modelo
+            onnx_file_name (str, optional): Fichero ONNX concreto del repositorio (por ejemplo, uno cuantizado)
+        """
+        from sentence_transformers import CrossEncoder
+
+        self.model_name = model_name
+        self.device = device
+        self.backend = backend
+        self.batch_size = batch_size
+        # Las llamadas concurrentes de varios retrievers se serializan sobre el mismo modelo
+        self._lock = threading.Lock()
+
+        if backend == "onnx":
+            model_kwargs = {"file_name": onnx_file_name} if onnx_file_name else {}
+            self.client = CrossEncoder(model_name, device=device, max_length=max_length,
+                                       backend="onnx", model_kwargs=model_kwargs)
+        else:
+            self.client = CrossEncoder(model_name, device=device, max_length=max_length)
+            if backend == "torch_int8":
+                self._quantize_int8()
+
+    def _quantize_int8(self):
+        """Aplica cuantización dinámica int8 a las capas lineales del modelo (solo CPU)."""
+        import torch
+
+        if self.device != "cpu":
+            logger.warning(f"La cuantización int8 solo está disponible en CPU; se mantiene el modelo en {self.device}")
+            return
+
+        self.client.model = torch.quantization.quantize_dynamic(
+            self.client.model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+        logger.info(f"Modelo {self.model_name} cuantizado a int8")
+
+    def score(self, text_pairs: List[Tuple[str, str]]) -> List[float]:
+        """
+        Puntúa pares (consulta, documento) en lotes.
+
+        Args:
+            text_pairs: Pares de textos a puntuar
+
+        Returns:
+            List[float]: Puntuación de cada par
+        """
+        if not text_pairs:
+            return []
+
+        with self._lock:
+            scores = self.client.predict(
+                text_pairs,
+                batch_size=self.batch_size,
+                show_progress_bar=False,
+                convert_to_numpy=True
+            )
+
+        # Los modelos con dos etiquetas devuelven [no relevante, relevante] por par
+        if getattr(scores, "ndim", 1) > 1:
+            scores = scores[:, 1]
+        return [float(score) for score in scores]
+
+
+_cross_encoders: Dict[Tuple[Any, ...], BatchedCrossEncoder] = {}
+_cross_encoders_lock = threading.Lock()
+
+
+def get_cross_encoder(model_name: Optional[str] = None, device: Optional[str] = None,
+                      backend: Optional[str] = None, max_length: Optional[int] = None,
+                      batch_size: Optional[int] = None) -> BatchedCrossEncoder:
+    """
+    Obtiene el cross-encoder compartido para una configuración, cargándolo una sola vez por proceso.
+
+    Los parámetros no indicados se toman de VECTORSTORE_CONFIG.
+
+    Args:
+        model_name (str, optional): Modelo de Hugging Face
+        device (str, optional): Dispositivo ("auto", "cpu", "cuda"...)
+        backend (str, optional): "torch", "torch_int8" u "onnx"
+        max_length (int, optional): Longitud máxima de la secuencia
+        batch_size (int, optional): Pares por lote
+
+    Returns:
+        BatchedCrossEncoder: Instancia compartida del modelo
+    """
+    model_name = model_name or VECTORSTORE_CONFIG.get("bge_reranker_model", "BAAI/bge-reranker-v2-m3")
+    device = resolve_device(device or VECTORSTORE_CONFIG.get("bge_device", "cpu"))
+    backend = backend or VECTORSTORE_CONFIG.get("reranker_backend", "torch")
+    max_length = max_length or VECTORSTORE_CONFIG.get("bge_max_length")
+    batch_size = batch_size or VECTORSTORE_CONFIG.get("reranker_batch_size", 32)
+
+    if backend not in RERANKER_BACKENDS:
+        logger.warning(f"Backend de reranker desconocido '{backend}', usando 'torch'")
+        backend = "torch"
+
+    key = (model_name, device, backend, max_length)
+    with _cross_encoders_lock:
+        cross_encoder = _cross_encoders.get(key)
+        if cross_encoder is None:
+            logger.info(f"Cargando cross-encoder compartido: {model_name} (dispositivo: {device}, backend: {backend})")
+            try:
+                cross_encoder = BatchedCrossEncoder(
+                    model_name,
+                    device=device,
+                    backend=backend,
+                    max_length=max_length,
+                    batch_size=batch_size,
+                    onnx_file_name=VECTORSTORE_CONFIG.get("reranker_onnx_file")
+                )
+            except Exception as e:
+                if backend == "torch":
+                    raise
+                # El backend optimizado depende de paquetes opcionales (optimum, onnxruntime)
+                logger.warning(f"No se pudo cargar el backend '{backend}' ({e}); usando 'torch'")
+                cross_encoder = BatchedCrossEncoder(model_name, device=device, backend="torch",
+                                                    max_length=max_length, batch_size=batch_size)
+            _cross_encoders[key] = cross_encoder
+        else:
+            logger.debug(f"Reutilizando cross-encoder compartido: {model_name} ({backend})")
+        return cross_encoder
@@ -0,0 +1,277 @@
+"""
+Caché de recuperación en memoria para los retrievers de las vectorstores.
+
+Este módulo implementa una caché LRU con expiración (TTL) que se coloca delante
+de los retrievers creados por las implementaciones de VectorStoreBase. Las
+entradas se indexan por (pregunta normalizada, colección, k, filtros) y se
+invalidan por colección cuando se añaden o eliminan cubos.
+"""
+
+import copy
+import functools
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langagent.config.config import CACHE_CONFIG, VECTORSTORE_CONFIG
+
+# Usar el sistema de logging centralizado
+from langagent.config.logging_config import get_logger
+logger = get_logger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normaliza una pregunta para usarla como clave de caché.
+
+    Args:
+        query (str): Pregunta original
+
+    Returns:
+        str: Pregunta en minúsculas, sin espacios redundantes ni puntuación final
+    """
+    normalized = re.sub(r"\s+", " ", (query or "").strip().lower())
+    return normalized.rstrip("?¿!¡.,;: ").lstrip("¿¡ ")
+
+
+def get_collection_name(vectorstore) -> str:
+    """
+    Obtiene el nombre de la colección de una vectorstore de LangChain.
+
+    Args:
+        vectorstore: Instancia de vectorstore (Milvus, Chroma...)
+
+    Returns:
+        str: Nombre de la colección o "unknown" si no se puede determinar
+    """
+    name = getattr(vectorstore, "collection_name", None)
+    if not name:
+        collection = getattr(vectorstore, "_collection", None)
+        name = getattr(collection, "name", None)
+    return name or "unknown"
+
+
+class RetrievalCache:
+    """Caché LRU con TTL para resultados de recuperación, segura entre hilos."""
+
+    def __init__(self, max_size: int = 512, ttl_seconds: float = 3600):
+        """
+        Inicializa la caché de recuperación.
+
+        Args:
+            max_size (int): Número máximo de entradas
+            ttl_seconds (float): Tiempo de vida de cada entrada en segundos
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple, Tuple[float, str, List[Document]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(query: str, collection_name: str, k: int, filters: Optional[Dict[str, Any]]) -> Tuple:
+        """
+        Construye la clave de caché para una búsqueda.
+
+        Args:
+            query (str): Pregunta (se normaliza)
+            collection_name (str): Nombre de la colección
+            k (int): Número de documentos solicitados
+            filters (dict): Filtros de metadatos aplicados
+
+        Returns:
+            Tuple: Clave hashable
+        """
+        filters_key = json.dumps(filters or {}, sort_keys=True, default=str)
+        return (normalize_query(query), collection_name, k, filters_key)
+
+    def get(self, key: Tuple) -> Optional[List[Document]]:
+        """
+        Obtiene los documentos cacheados para una clave si existen y no han expirado.
+
+        Args:
+            key (Tuple): Clave de la búsqueda
+
+        Returns:
+            Optional[List[Document]]: Copia de los documentos o None si no hay entrada válida
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            created_at, _, docs = entry
+            if self.ttl_seconds and time.time() - created_at > self.ttl_seconds:
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        # Devolver copias para que los nodos del grafo no modifiquen la entrada cacheada
+        return [Document(page_content=doc.page_content, metadata=copy.deepcopy(doc.metadata)) for doc in docs]
+
+    def put(self, key: Tuple, collection_name: str, docs: List[Document]):
+        """
+        Guarda los documentos recuperados para una clave.
+
+        Args:
+            key (Tuple): Clave de la búsqueda
+            collection_name (str): Colección a la que pertenece la entrada
+            docs (List[Document]): Documentos recuperados
+        """
+        stored = [Document(page_content=doc.page_content, metadata=copy.deepcopy(doc.metadata)) for doc in docs]
+        with self._lock:
+            self._entries[key] = (time.time(), collection_name, stored)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, collection_name: Optional[str] = None) -> int:
+        """
+        Elimina las entradas de una colección, o todas si no se indica colección.
+
+        Args:
+            collection_name (str): Colección a invalidar (None = todas)
+
+        Returns:
+            int: Número de entradas eliminadas
+        """
+        with self._lock:
+            if collection_name is None:
+                removed = len(self._entries)
+                self._entries.clear()
+            else:
+                keys = [key for key, entry in self._entries.items() if entry[1] == collection_name]
+                for key in keys:
+                    del self._entries[key]
+                removed = len(keys)
+            self.invalidations += 1
+
+        if removed:
+            logger.info(f"Caché de recuperación invalidada ({collection_name or 'todas'}): {removed} entradas eliminadas")
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Devuelve los contadores de la caché para monitorización.
+
+        Returns:
+            Dict[str, Any]: Aciertos, fallos, tasa de acierto, tamaño, expulsiones e invalidaciones
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+_retrieval_cache: Optional[RetrievalCache] = None
+_retrieval_cache_lock = threading.Lock()
+
+
+def get_retrieval_cache() -> RetrievalCache:
+    """
+    Obtiene la caché de recuperación compartida por todo el proceso.
+
+    Returns:
+        RetrievalCache: Instancia única de la caché
+    """
+    global _retrieval_cache
+    with _retrieval_cache_lock:
+        if _retrieval_cache is None:
+            _retrieval_cache = RetrievalCache(
+                max_size=CACHE_CONFIG.get("retrieval_cache_max_size", 512),
+                ttl_seconds=CACHE_CONFIG.get("retrieval_cache_ttl", 3600)
+            )
+        return _retrieval_cache
+
+
+class CachedRetriever(BaseRetriever):
+    """Retriever que consulta la caché de recuperación antes de delegar en el retriever real."""
+
+    retriever: BaseRetriever
+    collection_name: str
+    k: int
+
+    def get_or_compute(self, query: str, filters: Optional[Dict[str, Any]],
+                       compute: Callable[[], List[Document]]) -> List[Document]:
+        """
+        Devuelve el resultado cacheado o lo calcula con la función indicada y lo guarda.
+
+        Args:
+            query (str): Pregunta de búsqueda
+            filters (dict): Filtros de metadatos aplicados
+            compute (Callable): Función que realiza la búsqueda real
+
+        Returns:
+            List[Document]: Documentos recuperados
+        """
+        cache = get_retrieval_cache()
+        key = cache.make_key(query, self.collection_name, self.k, filters)
+
+        docs = cache.get(key)
+        if docs is not None:
+            logger.debug(f"Acierto de caché de recuperación en '{self.collection_name}'")
+            return docs
+
+        docs = compute()
+        cache.put(key, self.collection_name, docs)
+        return docs
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun,
+                                **kwargs: Any) -> List[Document]:
+        return self.get_or_compute(
+            query,
+            kwargs.get("filter"),
+            lambda: self.retriever.invoke(query, config={"callbacks": run_manager.get_child()}, **kwargs)
+        )
+
+
+def with_retrieval_cache(create_retriever):
+    """
+    Decorador para los métodos create_retriever de VectorStoreBase.
+
+    Envuelve el retriever devuelto en un CachedRetriever cuando la caché de
+    recuperación está habilitada en CACHE_CONFIG.
+
+    Args:
+        create_retriever: Método create_retriever original
+
+    Returns:
+        Callable: Método decorado
+    """
+    @functools.wraps(create_retriever)
+    def wrapper(self, vectorstore, k: Optional[int] = None, similarity_threshold: float = 0.7, **kwargs):
+        retriever = create_retriever(self, vectorstore, k, similarity_threshold, **kwargs)
+
+        if retriever is None or not CACHE_CONFIG.get("retrieval_cache_enabled", True):
+            return retriever
+
+        collection_name = get_collection_name(vectorstore)
+        logger.info(f"Caché de recuperación activada para la colección '{collection_name}'")
+        return CachedRetriever(
+            retriever=retriever,
+            collection_name=collection_name,
+            k=k or VECTORSTORE_CONFIG.get("k_retrieval", 4)
+        )
+
+    return wrapper
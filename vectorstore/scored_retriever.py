@@ -0,0 +1,127 @@
+"""
+Retriever vectorial que conserva la puntuación de similitud de cada documento.
+
+Los retrievers estándar de LangChain con search_type="similarity" descartan la
+puntuación de la búsqueda. ScoredRetriever la guarda en los metadatos del
+documento para que el workflow pueda aceptar o rechazar documentos por
+puntuación antes de llamar al evaluador de relevancia:
+
+- metadata["retrieval_score"]: puntuación devuelta por la vectorstore
+- metadata["retrieval_score_type"]: "relevance" si está normalizada a [0, 1]
+  (mayor es mejor) o "raw" si es la distancia/puntuación sin normalizar
+- metadata["retrieval_collection"]: colección de la que procede el documento
+- metadata["retrieval_rank"]: posición del documento en el resultado de la búsqueda
+- metadata["retrieval_order"]: "score" si la búsqueda ordena por esa misma
+  puntuación (densa pura) o "rank" si el orden es otro (fusión híbrida)
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+from langagent.vectorstore.retrieval_cache import get_collection_name
+
+# Usar el sistema de logging centralizado
+from langagent.config.logging_config import get_logger
+logger = get_logger(__name__)
+
+
+class ScoredRetriever(BaseRetriever):
+    """Retriever que guarda la puntuación de similitud en los metadatos de cada documento."""
+
+    vectorstore: VectorStore
+    search_kwargs: Dict[str, Any]
+
+    def _relevance_fn(self) -> Optional[Callable[[float], float]]:
+        """
+        Obtiene la función de normalización de puntuaciones de la vectorstore.
+
+        Returns:
+            Optional[Callable]: Función distancia -> relevancia o None si no está disponible
+        """
+        try:
+            return self.vectorstore._select_relevance_score_fn()
+        except Exception:
+            return None
+
+    def _ranks_by_score(self) -> bool:
+        """Indica si la vectorstore ordena los resultados por la puntuación densa (sin fusión híbrida)."""
+        if getattr(self.vectorstore, "use_hybrid_search", False):
+            return False
+        dense_field = getattr(self.vectorstore, "_dense_field", None)
+        return dense_field is None or dense_field() is None
+
+    def _annotate(self, docs_and_scores: List[Tuple[Document, float]], score_type: str) -> List[Document]:
+        """
+        Copia la puntuación, la posición y la colección de cada resultado en los metadatos del documento.
+
+        Args:
+            docs_and_scores: Pares (documento, puntuación)
+            score_type: "relevance" o "raw"
+
+        Returns:
+            List[Document]: Documentos con la puntuación en sus metadatos
+        """
+        collection_name = get_collection_name(self.vectorstore)
+        order = "score" if self._ranks_by_score() else "rank"
+        docs = []
+        for rank, (doc, score) in enumerate(docs_and_scores):
+            doc.metadata["retrieval_score"] = float(score)
+            doc.metadata["retrieval_score_type"] = score_type
+            doc.metadata["retrieval_rank"] = rank
+            doc.metadata["retrieval_order"] = order
+            doc.metadata["retrieval_collection"] = collection_name
+            docs.append(doc)
+        return docs
+
+    def search(self, query: str, **kwargs: Any) -> List[Document]:
+        """
+        Busca documentos por texto devolviendo puntuaciones normalizadas cuando es posible.
+
+        Args:
+            query: Consulta de búsqueda
+            **kwargs: Parámetros adicionales de búsqueda (por ejemplo, filter)
+
+        Returns:
+            List[Document]: Documentos con su puntuación en los metadatos
+        """
+        search_kwargs = {**self.search_kwargs, **kwargs}
+        k = search_kwargs.pop("k", 4)
+
+        if self._relevance_fn() is not None:
+            try:
+                return self._annotate(
+                    self.vectorstore.similarity_search_with_relevance_scores(query, k=k, **search_kwargs),
+                    "relevance"
+                )
+            except Exception as e:
+                logger.debug(f"Puntuaciones de relevancia no disponibles, usando puntuación sin normalizar: {e}")
+
+        return self._annotate(self.vectorstore.similarity_search_with_score(query, k=k, **search_kwargs), "raw")
+
+    def search_by_vector(self, embedding: List[float], **kwargs: Any) -> List[Document]:
+        """
+        Busca documentos con un embedding de consulta ya calculado.
+
+        Args:
+            embedding: Embedding de la consulta
+            **kwargs: Parámetros adicionales de búsqueda (por ejemplo, filter)
+
+        Returns:
+            List[Document]: Documentos con su puntuación en los metadatos
+        """
+        search_kwargs = {**self.search_kwargs, **kwargs}
+        k = search_kwargs.pop("k", 4)
+
+        docs_and_scores = self.vectorstore.similarity_search_with_score_by_vector(embedding, k=k, **search_kwargs)
+
+        relevance_fn = self._relevance_fn()
+        if relevance_fn is None:
+            return self._annotate(docs_and_scores, "raw")
+        return self._annotate([(doc, relevance_fn(score)) for doc, score in docs_and_scores], "relevance")
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun,
+                                **kwargs: Any) -> List[Document]:
+        return self.search(query, **kwargs)